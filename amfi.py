@@ -0,0 +1,261 @@
+"""Compact in-memory form of the AMFI NAV file.
+
+The file lists ~15k schemes under fund-house and scheme-category heading lines.
+`NavTable` keeps one row per scheme in NumPy columns instead of a frame of
+Python strings:
+
+- scheme codes as int64, with a sorted copy for binary-search lookups
+- NAV as float64 plus the number of decimals the file used, so the original
+  text can be rebuilt exactly for the API (texts that do not round-trip, such
+  as "N.A.", are kept verbatim in a small side table)
+- dates packed as YYYYMMDD int32
+- fund house, scheme category, sector and industry as small integer codes
+  into lists of distinct labels
+- ISINs as fixed-width bytes, with a sorted index over both ISIN columns
+- scheme names joined into one string with an offsets array, so a name
+  search is a single regex pass
+
+Rows come back as dicts with the same keys and string values the endpoints
+have always returned.
+"""
+import re
+import sys
+
+import numpy as np
+
+import classification
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+MONTH_NUMBERS = {name.lower(): i + 1 for i, name in enumerate(MONTHS)}
+
+
+def parse_nav(text):
+    """(value, decimals) when `text` is a number that formats back to itself, else None."""
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    _, dot, fraction = text.partition('.')
+    places = len(fraction) if dot else 0
+    return (value, places) if f"{value:.{places}f}" == text else None
+
+
+def pack_date(text):
+    """'17-Oct-2026' -> 20261017, or None when the text is not in that form."""
+    try:
+        day, month, year = text.split('-')
+        packed = int(year) * 10000 + MONTH_NUMBERS[month.lower()] * 100 + int(day)
+    except (ValueError, KeyError):
+        return None
+    return packed if format_date(packed) == text else None
+
+
+def format_date(packed):
+    year, rest = divmod(int(packed), 10000)
+    month, day = divmod(rest, 100)
+    return f"{day:02d}-{MONTHS[month - 1]}-{year}"
+
+
+def is_category_heading(line):
+    # e.g. "Open Ended Schemes(Debt Scheme - Banking and PSU Fund)"; fund houses are plain names
+    return 'Schemes' in line and '(' in line
+
+
+class Labels:
+    """Distinct strings and the small integer code of each."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class NavTable:
+    def __init__(self, codes, names, isins, navs, dates, houses, categories, raw, sectors, industries):
+        n = len(codes)
+        self.codes = np.array(codes, dtype=np.int64)
+        self.nav = np.array([v for v, _ in navs], dtype=np.float64)
+        self.nav_places = np.array([p for _, p in navs], dtype=np.int8)
+        self.dates = np.array(dates, dtype=np.int32)
+        self.house = np.array(houses[0], dtype=np.int16)
+        self.house_labels = houses[1]
+        self.category = np.array(categories[0], dtype=np.int16)
+        self.category_labels = categories[1]
+        self.sector = np.array(sectors[0], dtype=np.int8)
+        self.sector_labels = sectors[1]
+        self.industry = np.array(industries[0], dtype=np.int8)
+        self.industry_labels = industries[1]
+        self.isin_payout = np.array([i.encode() for i in isins[0]], dtype=bytes)
+        self.isin_reinvest = np.array([i.encode() for i in isins[1]], dtype=bytes)
+        self.raw = raw  # (row, column) -> original text for values that do not round-trip
+        # "\n" never occurs inside a line, so it separates names safely
+        self.names = "\n".join(names) + "\n"
+        self.name_starts = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(name) + 1 for name in names], out=self.name_starts[1:])
+        # Sorted copies for lookups; stable sorts keep the first row for duplicates
+        self._code_order = np.argsort(self.codes, kind='stable')
+        self._sorted_codes = self.codes[self._code_order]
+        isin_keys = np.concatenate((np.char.upper(self.isin_payout), np.char.upper(self.isin_reinvest)))
+        isin_rows = np.concatenate((np.arange(n), np.arange(n)))
+        valid = np.char.str_len(isin_keys) == 12
+        order = np.argsort(isin_keys[valid], kind='stable')
+        self._sorted_isins = isin_keys[valid][order]
+        self._isin_rows = isin_rows[valid][order]
+
+    @classmethod
+    def parse(cls, text):
+        codes, names, payouts, reinvests, navs, dates = [], [], [], [], [], []
+        house_codes, category_codes = [], []
+        houses, categories = Labels(), Labels()
+        house = houses.code(None)
+        category = categories.code(None)
+        raw = {}
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('Scheme Code'):
+                continue
+            if ';' not in line:
+                if is_category_heading(line):
+                    category = categories.code(line)
+                else:
+                    house = houses.code(line)
+                continue
+            fields = line.split(';')
+            if len(fields) < 6 or not fields[0].strip().isdigit():
+                continue
+            row = len(codes)
+            code, payout, reinvest, name, nav, date = (f.strip() for f in fields[:6])
+            codes.append(int(code))
+            if str(int(code)) != code:
+                raw[(row, 0)] = code
+            payouts.append(payout)
+            reinvests.append(reinvest)
+            names.append(name)
+            # Empty fields become NaN / 0 (missing); other unparsable text is kept as is
+            parsed = parse_nav(nav) if nav else (float('nan'), 0)
+            if parsed is None:
+                parsed = (float('nan'), 0)
+                raw[(row, 4)] = nav
+            navs.append(parsed)
+            packed = pack_date(date) if date else 0
+            if packed is None:
+                packed = 0
+                raw[(row, 5)] = date
+            dates.append(packed)
+            house_codes.append(house)
+            category_codes.append(category)
+        sector_taxonomy = classification.MUTUAL_FUND_SECTOR_TAXONOMY
+        industry_taxonomy = classification.MUTUAL_FUND_INDUSTRY_TAXONOMY
+        return cls(codes, names, (payouts, reinvests), navs, dates,
+                   (house_codes, houses.values), (category_codes, categories.values), raw,
+                   (sector_taxonomy.label_indexes(names), sector_taxonomy.labels + [sector_taxonomy.default]),
+                   (industry_taxonomy.label_indexes(names), industry_taxonomy.labels + [industry_taxonomy.default]))
+
+    def __len__(self):
+        return len(self.codes)
+
+    # --- column access ---
+    def name(self, row):
+        return self.names[self.name_starts[row]:self.name_starts[row + 1] - 1]
+
+    def code_text(self, row):
+        return self.raw.get((row, 0)) or str(int(self.codes[row]))
+
+    def nav_text(self, row):
+        raw = self.raw.get((row, 4))
+        if raw is not None:
+            return raw
+        value = self.nav[row]
+        return None if value != value else f"{value:.{self.nav_places[row]}f}"
+
+    def nav_value(self, row):
+        """NAV as a float, or None where the file has no number."""
+        value = float(self.nav[row])
+        return None if value != value else value
+
+    def date_text(self, row):
+        raw = self.raw.get((row, 5))
+        if raw is not None:
+            return raw
+        return format_date(self.dates[row]) if self.dates[row] else None
+
+    def row(self, row):
+        """One scheme with the keys and string values of the NAV file, plus its classification."""
+        payout = self.isin_payout[row].decode()
+        reinvest = self.isin_reinvest[row].decode()
+        return {
+            'Scheme Code': self.code_text(row),
+            'ISIN Div Payout/ ISIN Growth': payout or None,
+            'ISIN Div Reinvestment': reinvest or None,
+            'Scheme Name': self.name(row) or None,
+            'Net Asset Value': self.nav_text(row),
+            'Date': self.date_text(row),
+            'Fund House': self.house_labels[self.house[row]],
+            'Scheme Category': self.category_labels[self.category[row]],
+            'Sector': self.sector_labels[self.sector[row]],
+            'Industry': self.industry_labels[self.industry[row]],
+        }
+
+    # --- lookups ---
+    def find_code(self, code):
+        """Row of a scheme code (int or digit string), or None."""
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            return None
+        i = np.searchsorted(self._sorted_codes, code)
+        if i < len(self._sorted_codes) and self._sorted_codes[i] == code:
+            return int(self._code_order[i])
+        return None
+
+    def find_isin(self, isin):
+        key = isin.upper().encode()
+        i = np.searchsorted(self._sorted_isins, key)
+        if i < len(self._sorted_isins) and self._sorted_isins[i] == key:
+            return int(self._isin_rows[i])
+        return None
+
+    def find(self, key):
+        """Row for a scheme code or ISIN."""
+        return self.find_code(key) if key.isdigit() else self.find_isin(key)
+
+    def find_name(self, pattern):
+        """First row whose name matches `pattern` (a case-insensitive regex), or None."""
+        regex = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+        pos = 0
+        while True:
+            match = regex.search(self.names, pos)
+            if match is None:
+                return None
+            row = int(np.searchsorted(self.name_starts, match.start(), side='right')) - 1
+            if row >= len(self):
+                return None
+            # A match could run across the separator; confirm it within the name itself
+            if regex.search(self.name(row)):
+                return row
+            pos = int(self.name_starts[row + 1])
+
+    def listing(self):
+        """Code, name, NAV and date of every named scheme, as the list endpoint returns them."""
+        codes = [self.code_text(i) for i in range(len(self))] if self.raw else [str(c) for c in self.codes.tolist()]
+        names = self.names.split("\n")
+        return [
+            {'Scheme Code': code, 'Scheme Name': name, 'Net Asset Value': self.nav_text(i), 'Date': self.date_text(i)}
+            for i, (code, name) in enumerate(zip(codes, names)) if name
+        ]
+
+    def memory_bytes(self):
+        """Approximate resident size of the table, indexes included."""
+        arrays = (self.codes, self.nav, self.nav_places, self.dates, self.house, self.category, self.sector,
+                  self.industry, self.isin_payout, self.isin_reinvest, self.name_starts, self._code_order,
+                  self._sorted_codes, self._sorted_isins, self._isin_rows)
+        labels = self.house_labels + self.category_labels + self.sector_labels + self.industry_labels
+        return (sum(a.nbytes for a in arrays) + sys.getsizeof(self.names)
+                + sum(sys.getsizeof(label) for label in labels if label is not None)
+                + sys.getsizeof(self.raw) + sum(sys.getsizeof(v) for v in self.raw.values()))
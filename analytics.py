@@ -0,0 +1,103 @@
+"""Portfolio analytics over daily closes, run as background jobs.
+
+Everything here values the current holdings at today's quantities on each
+past day, so a series answers "what would this portfolio have been worth",
+not the historical account balance. Values are summed across currencies,
+like the /portfolio totals. Functions that loop take a `progress(fraction)`
+callable, which is where a cancelled job stops.
+"""
+import numpy as np
+
+from valuation import round_half_up
+
+TRADING_DAYS = 252
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def align(histories):
+    """(dates, symbols, closes) from {symbol: [(date, close), ...]}.
+
+    One row per date any symbol has a close, one column per symbol with any
+    history. Gaps carry the previous close forward; days before a symbol's
+    first close use that first close.
+    """
+    symbols = [symbol for symbol, rows in histories.items() if rows]
+    dates = sorted({day for symbol in symbols for day, _ in histories[symbol]})
+    row = {day: i for i, day in enumerate(dates)}
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        for day, close in histories[symbol]:
+            closes[row[day], j] = close
+    if closes.size:
+        rows = np.arange(len(dates))[:, None]
+        known = ~np.isnan(closes)
+        last = np.maximum.accumulate(np.where(known, rows, 0), axis=0)
+        closes = closes[last, np.arange(len(symbols))]
+        first = known.argmax(axis=0)
+        closes = np.where(np.isnan(closes), closes[first, np.arange(len(symbols))], closes)
+    return dates, symbols, closes
+
+
+def daily_returns(values):
+    values = np.asarray(values, dtype=float)
+    return values[1:] / values[:-1] - 1
+
+
+def value_history(dates, closes, quantities):
+    values = closes @ np.asarray(quantities, dtype=float)
+    return {'dates': dates, 'values': round_half_up(values, 2).tolist()}
+
+
+def risk(dates, symbols, closes, quantities, confidence):
+    """Annualised volatility, one-day historical VaR and CVaR at `confidence` and the worst drawdown
+    of the portfolio, plus each position's weight and volatility."""
+    quantities = np.asarray(quantities, dtype=float)
+    values = closes @ quantities
+    if len(values) < 3 or not (values > 0).all():
+        raise ValueError("Not enough price history to measure risk")
+    returns = daily_returns(values)
+    cutoff = np.quantile(returns, 1 - confidence)
+    tail = returns[returns <= cutoff]
+    drawdown = values / np.maximum.accumulate(values) - 1
+    trough = int(drawdown.argmin())
+    weights = closes[-1] * quantities / values[-1]
+    volatilities = (closes[1:] / closes[:-1] - 1).std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    return {
+        'value': float(round_half_up(values[-1], 2)),
+        'volatility_annual': round(float(returns.std(ddof=1) * np.sqrt(TRADING_DAYS)), 6),
+        'confidence': confidence,
+        'var_1d': float(round_half_up(-cutoff * values[-1], 2)),
+        'cvar_1d': float(round_half_up(-tail.mean() * values[-1], 2)),
+        'max_drawdown': round(float(drawdown[trough]), 6),
+        'max_drawdown_date': dates[trough],
+        'positions': [{'symbol': symbol, 'weight': round(float(weight), 6), 'volatility_annual': round(float(volatility), 6)}
+                      for symbol, weight, volatility in zip(symbols, weights, volatilities)],
+    }
+
+
+def simulate(closes, quantities, horizon, paths, seed, progress, batch=2000):
+    """Monte Carlo of the portfolio value `horizon` trading days out, bootstrapping its past daily returns.
+
+    Seeded, so the same inputs give the same answer (results are cached by input).
+    """
+    values = closes @ np.asarray(quantities, dtype=float)
+    if len(values) < 3 or not (values > 0).all():
+        raise ValueError("Not enough price history to simulate")
+    returns = daily_returns(values)
+    growth = np.log1p(returns)
+    rng = np.random.default_rng(seed)
+    terminal = np.empty(paths)
+    for start in range(0, paths, batch):
+        n = min(batch, paths - start)
+        # Compounding as a sum of log returns: one pass over an n x horizon draw per batch
+        picks = rng.integers(0, len(growth), size=(n, horizon))
+        terminal[start:start + n] = values[-1] * np.exp(growth[picks].sum(axis=1))
+        progress((start + n) / paths)
+    return {
+        'value': float(round_half_up(values[-1], 2)),
+        'horizon_days': horizon,
+        'paths': paths,
+        'percentiles': {str(p): float(v) for p, v in zip(PERCENTILES, round_half_up(np.percentile(terminal, PERCENTILES), 2))},
+        'mean': float(round_half_up(terminal.mean(), 2)),
+        'probability_of_loss': round(float((terminal < values[-1]).mean()), 6),
+    }
@@ -0,0 +1,104 @@
+"""AMFI NAV table benchmark.
+
+Loads the same NAV file into the previous representation (a pandas DataFrame
+of strings, plus the code/ISIN lookup dict) and into `amfi.NavTable`, then
+reports the memory each holds and the time to parse, look up codes and build
+the fund list.
+
+    python benchmarks/bench_amfi.py --schemes 16000
+    python benchmarks/bench_amfi.py --file NAVAll.txt   # a real download from amfiindia.com
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from io import StringIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import amfi  # noqa: E402
+import classification  # noqa: E402
+import providers  # noqa: E402
+
+COLUMNS = ['Scheme Code', 'ISIN Div Payout/ ISIN Growth', 'ISIN Div Reinvestment', 'Scheme Name', 'Net Asset Value', 'Date']
+
+
+def dataframe_load(text):
+    """The DataFrame the server used to keep, built the way it used to build it."""
+    import pandas as pd
+    lines = [line for line in text.splitlines() if line.strip() and not line.startswith('Open Ended') and not line.startswith('Scheme Code')]
+    df = pd.read_csv(StringIO('\n'.join(lines)), sep=';', header=None, names=COLUMNS, dtype=str)
+    names = df['Scheme Name'].fillna('')
+    df['Sector'] = [classification.MUTUAL_FUND_SECTOR_TAXONOMY.classify(n) for n in names]
+    df['Industry'] = [classification.MUTUAL_FUND_INDUSTRY_TAXONOMY.classify(n) for n in names]
+    schemes = df[df['Scheme Code'].str.isdigit() & df['Scheme Name'].notnull()]
+    lookup = {}
+    for code, payout, reinvest, name in zip(schemes['Scheme Code'], schemes[COLUMNS[1]], schemes[COLUMNS[2]], schemes['Scheme Name']):
+        lookup[code] = (code, name)
+        for isin in (payout, reinvest):
+            if isinstance(isin, str) and len(isin) == 12:
+                lookup[isin.upper()] = (code, name)
+    return df, lookup
+
+
+def dict_bytes(d):
+    return sys.getsizeof(d) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in d.items())
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schemes", type=int, default=16000, help="fake schemes when no --file is given")
+    parser.add_argument("--file", default=None, help="AMFI NAVAll.txt to load instead of the fake file")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    else:
+        text = providers.FakeProvider(universe_size=args.schemes).amfi_nav_text()
+
+    (df, lookup), df_ms = timed(dataframe_load, text)
+    table, table_ms = timed(amfi.NavTable.parse, text)
+    codes = random.Random(7).sample([str(c) for c in table.codes.tolist()], min(args.lookups, len(table)))
+
+    def df_lookups():
+        for code in codes:
+            nav = df[df['Scheme Code'].astype(str) == code].iloc[0]['Net Asset Value']
+            try:
+                float(nav)
+            except (TypeError, ValueError):
+                pass
+
+    def table_lookups():
+        for code in codes:
+            table.nav_value(table.find_code(code))
+
+    def df_listing():
+        schemes = df[df['Scheme Code'].str.isdigit() & df['Scheme Name'].notnull()]
+        return schemes[['Scheme Code', 'Scheme Name', 'Net Asset Value', 'Date']].to_dict(orient='records')
+
+    _, df_lookup_ms = timed(df_lookups)
+    _, table_lookup_ms = timed(table_lookups)
+    _, df_list_ms = timed(df_listing)
+    _, table_list_ms = timed(table.listing)
+
+    df_bytes = int(df.memory_usage(deep=True).sum()) + dict_bytes(lookup)
+    table_bytes = table.memory_bytes()
+    print(f"{len(table)} schemes ({len(text) / 1e6:.1f} MB of text)")
+    print(f"  memory   DataFrame + lookup {df_bytes / 1e6:7.2f} MB   NavTable {table_bytes / 1e6:7.2f} MB   ({df_bytes / table_bytes:.1f}x smaller)")
+    print(f"  parse    DataFrame {df_ms:8.1f} ms   NavTable {table_ms:8.1f} ms")
+    print(f"  {len(codes)} code lookups   DataFrame {df_lookup_ms:8.1f} ms   NavTable {table_lookup_ms:8.1f} ms")
+    print(f"  fund list   DataFrame {df_list_ms:8.1f} ms   NavTable {table_list_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Offline API benchmark.
+
+Runs the FastAPI app in-process against the fake market data provider and a
+throwaway SQLite database, then reports throughput and p50/p95/p99 latency for
+the main endpoints at several portfolio sizes.
+
+    python benchmarks/bench_api.py --sizes 10,100,1000 --latency-ms 20 --output bench.json
+
+Compare two runs with --compare old.json.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples, wall):
+    ms = [s * 1000 for s in samples]
+    return {
+        'requests': len(ms),
+        'throughput_rps': round(len(ms) / wall, 2) if wall else None,
+        'mean_ms': round(statistics.mean(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'max_ms': round(max(ms), 3),
+    }
+
+
+def timed(client, method, url, setup=None, **kwargs):
+    if setup:
+        setup()
+    start = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 500:
+        raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+    return elapsed
+
+
+def run_scenario(client, iterations, make_request):
+    samples = []
+    wall_start = time.perf_counter()
+    for i in range(iterations):
+        samples.append(make_request(i))
+    return summarize(samples, time.perf_counter() - wall_start)
+
+
+def seed_portfolio(main, provider, size, rng):
+    db = main.SessionLocal()
+    try:
+        db.query(main.AssetDB).delete()
+        db.query(main.TransactionDB).delete()
+        symbols = provider.symbols()
+        codes = provider.scheme_codes()
+        now = datetime.now()
+        for i in range(size):
+            mutual_fund = i % 5 == 4
+            symbol = codes[i] if mutual_fund else symbols[i]
+            asset_type = "mutual_fund" if mutual_fund else ("crypto" if symbol.endswith('-USD') else "stock")
+            quantity = round(rng.uniform(1, 500), 3)
+            price = round(rng.uniform(5, 1000), 2)
+            db.add(main.AssetDB(
+                symbol=symbol, asset_type=asset_type, quantity=quantity, buy_price=price,
+                currency="INR" if mutual_fund else "USD", precision=main.get_precision(asset_type),
+                buy_date=(now - timedelta(days=rng.randint(1, 900))).isoformat(), name=f"Holding {i}",
+            ))
+            for t in range(10):
+                db.add(main.TransactionDB(
+                    datetime=(now - timedelta(days=900 - t * 30, minutes=i)).isoformat(),
+                    action="BUY", symbol=symbol, name=f"Holding {i}", asset_type=asset_type,
+                    quantity=quantity / 10, price=price, value=quantity / 10 * price, pl=None,
+                    notes=None, balance_after=0,
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def clear_caches(main):
+    main._quote_cache.clear()
+    main.shared.clear("quote:")
+    main._snapshot_cache.clear()
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="portfolio-bench-")
+    os.chdir(workdir)  # main.py keeps portfolio.db in the working directory
+    os.environ["MARKET_DATA_PROVIDER"] = "fake"
+    os.environ["FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_FAILURE_RATE"] = str(args.failure_rate)
+    os.environ["FAKE_UNIVERSE_SIZE"] = str(max(args.universe, max(args.sizes)))
+    sys.path.insert(0, ROOT)
+    import main
+    import providers
+    from fastapi.testclient import TestClient
+
+    provider = providers.get_provider()
+    rng = random.Random(args.seed)
+    results = {}
+    with TestClient(main.app) as client:
+        client.get("/mutualfund/list")  # load AMFI once, like a warm server
+        for size in args.sizes:
+            seed_portfolio(main, provider, size, rng)
+            n = args.iterations
+            symbols = provider.symbols()
+            scenarios = {
+                'portfolio_cold': lambda i: timed(client, "GET", "/portfolio", setup=lambda: clear_caches(main)),
+                'portfolio_warm': lambda i: timed(client, "GET", "/portfolio"),
+                'price': lambda i: timed(client, "GET", f"/price/{symbols[rng.randrange(len(symbols))]}"),
+                'history': lambda i: timed(client, "GET", "/history"),
+                'mutualfund_list': lambda i: timed(client, "GET", "/mutualfund/list"),
+                'portfolio_add': lambda i: timed(client, "POST", "/portfolio/add", json={
+                    'symbol': symbols[(size + i) % len(symbols)], 'asset_type': 'stock',
+                    'quantity': 1, 'buy_price': 10}),
+            }
+            results[str(size)] = {}
+            for name, make_request in scenarios.items():
+                if args.only and name not in args.only:
+                    continue
+                iterations = max(1, n // 5) if name == 'portfolio_cold' else n
+                results[str(size)][name] = run_scenario(client, iterations, make_request)
+                print(f"{size:>6} holdings  {name:<16} {results[str(size)][name]}")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs {baseline_path} (p50 / p95):")
+    for size, scenarios in current.items():
+        for name, stats in scenarios.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            deltas = [f"{(stats[k] - old[k]) / old[k] * 100:+.1f}%" if old[k] else "n/a" for k in ('p50_ms', 'p95_ms')]
+            print(f"{size:>6} holdings  {name:<16} {deltas[0]} / {deltas[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated holding counts")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake upstream latency per call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fake upstream failure probability")
+    parser.add_argument("--universe", type=int, default=2000, help="fake symbol universe size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--only", default=None, help="comma-separated scenario names")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to diff against")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(',') if s]
+    args.only = set(args.only.split(',')) if args.only else None
+    # run() moves into a scratch directory, so pin paths to where we were started
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    results = run(args)
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'params': {k: (sorted(v) if isinstance(v, set) else v) for k, v in vars(args).items()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
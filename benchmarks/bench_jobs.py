@@ -0,0 +1,100 @@
+"""Analytics job queue benchmark.
+
+Seeds one portfolio in a scratch database and times the analytics jobs
+against the fake provider:
+
+- inline: each job kind run directly, as long as a request would block if it computed the result itself
+- queued: POST /jobs latency and time until the job is done, while GET /portfolio keeps being served
+- cached: resubmitting the same input, which returns the finished job
+
+    python benchmarks/bench_jobs.py --holdings 100 --paths 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_api import summarize  # noqa: E402
+from bench_portfolios import seed_portfolios  # noqa: E402
+
+
+def time_portfolio_reads(client, seconds):
+    samples = []
+    wall = time.perf_counter()
+    while time.perf_counter() - wall < seconds:
+        start = time.perf_counter()
+        client.get("/portfolio")
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, time.perf_counter() - wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365, help="days of daily closes per job")
+    parser.add_argument("--paths", type=int, default=50000, help="Monte Carlo paths for the simulation job")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake upstream latency per call")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="portfolio-bench-"))  # main.py keeps portfolio.db in the working directory
+    os.environ["MARKET_DATA_PROVIDER"] = "fake"
+    os.environ["FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["WARMUP"] = "0"
+    sys.path.insert(0, ROOT)
+    import main as app_main
+    import jobs
+    import providers
+    from fastapi.testclient import TestClient
+
+    kinds = {
+        "valuation_history": {"days": args.days},
+        "risk": {"days": args.days},
+        "simulation": {"days": args.days, "paths": args.paths},
+    }
+    provider = providers.get_provider()
+    with TestClient(app_main.app) as client:
+        seed_portfolios(app_main, provider, 1, args.holdings, args.holdings * 2, random.Random(args.seed))
+        client.get("/portfolio")
+        idle = time_portfolio_reads(client, 1.0)
+        print(f"idle            GET /portfolio {idle}")
+
+        for kind, params in kinds.items():
+            app_main._closes_cache.clear()
+            app_main.shared.clear("closes:")
+            job = jobs.Job(kind, app_main.job_params(kind, params), app_main.DEFAULT_PORTFOLIO)
+            start = time.perf_counter()
+            app_main.JOB_KINDS[kind][0](job)
+            print(f"inline {kind:<18} {(time.perf_counter() - start) * 1000:8.1f} ms (cold history)")
+
+        app_main._closes_cache.clear()
+        app_main.shared.clear("closes:")
+        submitted = {}
+        start = time.perf_counter()
+        for kind, params in kinds.items():
+            submitted[kind] = client.post("/jobs", json={"kind": kind, "params": params}).json()["id"]
+        print(f"queued          3 POST /jobs in {(time.perf_counter() - start) * 1000:.1f} ms")
+        busy = time_portfolio_reads(client, 0.5)
+        while any(client.get(f"/jobs/{job_id}").json()["status"] not in jobs.FINISHED for job_id in submitted.values()):
+            time.sleep(0.02)
+        print(f"queued          all done after {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(f"busy            GET /portfolio {busy}")
+
+        samples = []
+        wall = time.perf_counter()
+        for _ in range(50):
+            for kind, params in kinds.items():
+                begin = time.perf_counter()
+                response = client.post("/jobs", json={"kind": kind, "params": params})
+                samples.append(time.perf_counter() - begin)
+                assert response.json()["cached"], response.text
+        print(f"cached          POST /jobs {summarize(samples, time.perf_counter() - wall)}")
+
+
+if __name__ == "__main__":
+    main()
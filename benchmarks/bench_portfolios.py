@@ -0,0 +1,133 @@
+"""Multi-portfolio pricing benchmark.
+
+Seeds a scratch database with many portfolios drawn from one shared symbol
+universe, then prices them against the fake provider and counts upstream
+calls. Upstream cost should follow the number of distinct symbols, not the
+number of portfolios:
+
+- refresh_all: one pass over every portfolio (the warm-up and stream refresher path)
+- cold_requests: GET /portfolio for a sample of portfolios with every cache empty
+- warm_requests: GET /portfolio and /history for random portfolios once priced
+
+    python benchmarks/bench_portfolios.py --portfolios 2000 --holdings 25 --universe 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_api import summarize  # noqa: E402
+
+
+def seed_portfolios(main, provider, portfolios, holdings, universe, rng):
+    """Bulk-insert `holdings` assets (and one BUY each) per portfolio from the first `universe` symbols."""
+    symbols = provider.symbols()[:universe]
+    codes = provider.scheme_codes()[:max(1, universe // 5)]
+    now = datetime.now()
+    assets, transactions = [], []
+    for portfolio_id in range(1, portfolios + 1):
+        picks = rng.sample(symbols, min(holdings, len(symbols)))
+        # One holding in five is a fund, like bench_api
+        picks = [rng.choice(codes) if i % 5 == 4 else symbol for i, symbol in enumerate(picks)]
+        for symbol in dict.fromkeys(picks):
+            mutual_fund = symbol.isdigit()
+            asset_type = "mutual_fund" if mutual_fund else ("crypto" if symbol.endswith('-USD') else "stock")
+            quantity = round(rng.uniform(1, 500), 3)
+            price = round(rng.uniform(5, 1000), 2)
+            when = (now - timedelta(days=rng.randint(1, 900))).isoformat()
+            assets.append(dict(portfolio_id=portfolio_id, symbol=symbol, asset_type=asset_type, quantity=quantity,
+                               buy_price=price, currency="INR" if mutual_fund else "USD",
+                               precision=main.get_precision(asset_type), buy_date=when, name=symbol))
+            transactions.append(dict(portfolio_id=portfolio_id, datetime=when, action="BUY", symbol=symbol, name=symbol,
+                                     asset_type=asset_type, quantity=quantity, price=price, value=quantity * price,
+                                     pl=None, notes=None, balance_after=0))
+    with main.engine.begin() as conn:
+        conn.execute(main.AssetDB.__table__.insert(), assets)
+        conn.execute(main.TransactionDB.__table__.insert(), transactions)
+    return assets
+
+
+def clear_caches(main):
+    main._quote_cache.clear()
+    main.shared.clear("quote:")
+    main._snapshot_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portfolios", type=int, default=2000)
+    parser.add_argument("--holdings", type=int, default=25, help="holdings per portfolio")
+    parser.add_argument("--universe", type=int, default=500, help="distinct symbols the portfolios draw from")
+    parser.add_argument("--cold", type=int, default=200, help="portfolios requested one by one with empty caches")
+    parser.add_argument("--iterations", type=int, default=200, help="warm requests per endpoint")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake upstream latency per call")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="portfolio-bench-"))  # main.py keeps portfolio.db in the working directory
+    os.environ["MARKET_DATA_PROVIDER"] = "fake"
+    os.environ["FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_UNIVERSE_SIZE"] = str(max(2000, args.universe))
+    os.environ["WARMUP"] = "0"
+    sys.path.insert(0, ROOT)
+    import main as app_main
+    import providers
+    from fastapi.testclient import TestClient
+
+    calls = {"quote": 0}
+
+    def count(upstream, call, seconds, error):
+        if upstream == "yfinance":
+            calls["quote"] += 1
+    providers.add_observer(count)
+
+    rng = random.Random(args.seed)
+    provider = providers.get_provider()
+    with TestClient(app_main.app) as client:
+        client.get("/mutualfund/list")  # load AMFI once, like a warm server
+        start = time.perf_counter()
+        assets = seed_portfolios(app_main, provider, args.portfolios, args.holdings, args.universe, rng)
+        print(f"seeded {args.portfolios} portfolios, {len(assets)} holdings in {time.perf_counter() - start:.1f} s")
+        distinct = {a['symbol'] for a in assets if a['asset_type'] != 'mutual_fund'}
+
+        clear_caches(app_main)
+        calls["quote"] = 0
+        start = time.perf_counter()
+        rebuilt = app_main.refresh_portfolio_snapshots()
+        elapsed = time.perf_counter() - start
+        print(f"refresh_all     {rebuilt} portfolios in {elapsed * 1000:.0f} ms, "
+              f"{calls['quote']} upstream calls for {len(distinct)} distinct symbols")
+
+        clear_caches(app_main)
+        calls["quote"] = 0
+        sample = rng.sample(range(1, args.portfolios + 1), min(args.cold, args.portfolios))
+        chosen = set(sample)
+        sampled = {a['symbol'] for a in assets if a['portfolio_id'] in chosen and a['asset_type'] != 'mutual_fund'}
+        samples = []
+        wall = time.perf_counter()
+        for portfolio_id in sample:
+            start = time.perf_counter()
+            client.get("/portfolio", params={"portfolio_id": portfolio_id})
+            samples.append(time.perf_counter() - start)
+        stats = summarize(samples, time.perf_counter() - wall)
+        print(f"cold_requests   {calls['quote']} upstream calls for {len(sampled)} distinct symbols "
+              f"across {len(sample)} portfolios  {stats}")
+
+        for path in ("/portfolio", "/history"):
+            samples = []
+            wall = time.perf_counter()
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                client.get(path, params={"portfolio_id": rng.choice(sample)})
+                samples.append(time.perf_counter() - start)
+            print(f"warm {path:<10} {summarize(samples, time.perf_counter() - wall)}")
+
+
+if __name__ == "__main__":
+    main()
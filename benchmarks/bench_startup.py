@@ -0,0 +1,102 @@
+"""Cold start benchmark.
+
+Starts the API under uvicorn in a scratch directory with the fake market data
+provider, then polls `/ready` and reports how long the process took to answer
+its first request and how long until every warm-up task had finished. Exits 1
+when the first response takes longer than the budget.
+
+    python benchmarks/bench_startup.py --holdings 500 --runs 5 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_database(workdir, holdings, env):
+    # Same seeding as bench_api, done in a child so this process never imports main
+    script = (
+        "import random, sys; sys.path[:0] = [%r, %r]\n"
+        "import main, providers, bench_api\n"
+        "main.on_startup()\n"
+        "bench_api.seed_portfolio(main, providers.get_provider(), %d, random.Random(7))\n"
+    ) % (ROOT, os.path.join(ROOT, "benchmarks"), holdings)
+    subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def start_once(workdir, env, timeout):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/ready"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=workdir, env=dict(env, PYTHONPATH=ROOT), stdout=subprocess.DEVNULL)
+    first = ready = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                status = get_json(url)
+            except OSError:
+                time.sleep(0.005)
+                continue
+            if first is None:
+                first = time.perf_counter() - started
+            if status["status"] == "ready":
+                ready = time.perf_counter() - started
+                return first, ready, status
+            time.sleep(0.02)
+        raise RuntimeError(f"server did not become ready within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=500, help="holdings in the seeded database")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake upstream latency per call")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="fail when the first response is slower")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="portfolio-startup-")
+    env = dict(os.environ, MARKET_DATA_PROVIDER="fake", FAKE_LATENCY_MS=str(args.latency_ms),
+               FAKE_UNIVERSE_SIZE=str(max(2000, args.holdings)))
+    if args.holdings:
+        seed_database(workdir, args.holdings, env)
+
+    firsts, readies = [], []
+    for run in range(args.runs):
+        first, ready, status = start_once(workdir, env, args.timeout)
+        firsts.append(first * 1000)
+        readies.append(ready * 1000)
+        print(f"run {run + 1}: first response {first * 1000:.0f} ms, ready {ready * 1000:.0f} ms "
+              f"(warm-up {status['warmup_ms']})")
+    worst = max(firsts)
+    print(f"\nfirst response: median {statistics.median(firsts):.0f} ms, worst {worst:.0f} ms "
+          f"(budget {args.budget_ms:.0f} ms); ready: median {statistics.median(readies):.0f} ms")
+    sys.exit(0 if worst <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Valuation core benchmark.
+
+Values N synthetic holdings with the vectorized core and with per-field
+`round_decimal`, checks that both give identical numbers and reports the time
+of each (and of the array core alone).
+
+    python benchmarks/bench_valuation.py --positions 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import valuation  # noqa: E402
+from main import get_precision, round_decimal  # noqa: E402
+
+ASSET_TYPES = ['stock', 'crypto', 'mutual_fund', 'gold', 'fixed_income']
+
+
+def holdings(n, seed):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        asset_type = rng.choice(ASSET_TYPES)
+        price = None if rng.random() < 0.02 else round(rng.uniform(0.01, 5000), rng.randint(2, 6))
+        rows.append((round(rng.uniform(0.001, 10000), rng.randint(0, 8)), round(rng.uniform(0.01, 5000), 4),
+                     price, get_precision(asset_type)))
+    return rows
+
+
+def decimal_path(rows):
+    out = []
+    for quantity, buy_price, price, precision in rows:
+        if price is None:
+            price = buy_price
+        value = round_decimal(price * quantity, precision)
+        cost = round_decimal(buy_price * quantity, precision)
+        out.append((round_decimal(quantity, precision), round_decimal(buy_price, 4),
+                    round_decimal(price, 4) if price else None, value, cost, round_decimal(value - cost, 2)))
+    return out
+
+
+def vector_path(rows, timing):
+    quantity, buy_price, price, precision = zip(*rows)
+    price = [float('nan') if p is None else p for p in price]
+    start = time.perf_counter()
+    figures = valuation.value_holdings(quantity, buy_price, price, precision)
+    timing['core_ms'] = (time.perf_counter() - start) * 1000
+    columns = {name: column.tolist() for name, column in figures.items()}
+    return list(zip(columns['quantity'], columns['buy_price'],
+                    [p if priced else None for p, priced in zip(columns['current_price'], columns['priced'])],
+                    columns['current_value'], columns['cost'], columns['profit_loss']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = holdings(args.positions, args.seed)
+    start = time.perf_counter()
+    expected = decimal_path(rows)
+    decimal_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    timing = {}
+    got = vector_path(rows, timing)
+    vector_ms = (time.perf_counter() - start) * 1000
+    identical = json.dumps(expected) == json.dumps(got)
+    print(f"{args.positions} positions: round_decimal {decimal_ms:.1f} ms, vectorized {vector_ms:.1f} ms "
+          f"(core {timing['core_ms']:.1f} ms, rest is list packing), identical={identical}")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Keyword taxonomies for mutual funds and ETFs.
+
+Each taxonomy is an ordered list of (label, keywords); the first label (in list
+order) with any keyword appearing in the text wins. A taxonomy compiles to one
+regex whose alternatives are sorted by label priority, wrapped in a lookahead
+so every start position is tried. At any position the regex reports the
+highest-priority keyword that matches there, so the minimum rank over all
+matches is exactly the first matching label.
+"""
+import re
+import threading
+
+MUTUAL_FUND_SECTORS = [
+    ("Thematic", ["pharma", "banking", "infra", "technology", "fmcg", "consumption", "digital"]),
+    ("Index/ETF", ["index", "etf", "nifty", "sensex"]),
+    ("Commodity", ["gold", "silver"]),
+    ("Debt", ["debt", "gilt", "bond", "income", "liquid", "money market", "overnight", "short duration", "medium duration", "long duration", "corporate bond"]),
+    ("Hybrid", ["hybrid", "balanced", "multi asset", "arbitrage", "advantage"]),
+    ("Equity", ["equity", "multi cap", "flexi cap", "large cap", "mid cap", "small cap", "elss", "tax saver", "focused", "value"]),
+]
+
+MUTUAL_FUND_INDUSTRIES = [
+    # Equity
+    ("Large & Mid Cap", ["large & mid cap", "large and mid cap"]),
+    ("Large Cap", ["large cap"]),
+    ("Mid Cap", ["mid cap"]),
+    ("Small Cap", ["small cap"]),
+    ("Multi Cap", ["multi cap"]),
+    ("Flexi Cap", ["flexi cap"]),
+    ("ELSS / Tax Saver", ["elss", "tax saver"]),
+    ("Focused", ["focused"]),
+    ("Value", ["value"]),
+    ("Dividend Yield", ["dividend yield"]),
+    # Debt
+    ("Gilt Fund", ["gilt"]),
+    ("Liquid Fund", ["liquid"]),
+    ("Overnight Fund", ["overnight"]),
+    ("Short Duration", ["short duration"]),
+    ("Medium Duration", ["medium duration"]),
+    ("Long Duration", ["long duration"]),
+    ("Corporate Bond", ["corporate bond"]),
+    # Hybrid
+    ("Balanced Advantage", ["balanced advantage", "dynamic asset allocation"]),
+    ("Aggressive Hybrid", ["aggressive hybrid"]),
+]
+
+# (sector, industry) for ETFs, matched against name + business summary
+ETF_CLASSES = [
+    (("Digital Assets", "Bitcoin ETF"), ["bitcoin"]),
+    (("Commodity", "Gold ETF"), ["gold"]),
+    (("ETF", "Technology ETF"), ["technology", "tech"]),
+    (("ETF", "Healthcare ETF"), ["healthcare", "health care", "pharma", "biotech"]),
+    (("ETF", "Energy ETF"), ["energy", "oil", "gas"]),
+    (("ETF", "Financial ETF"), ["financial", "bank", "finance", "insurance"]),
+    (("ETF", "Consumer ETF"), ["consumer", "retail", "staple", "discretionary"]),
+    (("ETF", "Industrial ETF"), ["industrial", "manufacturing", "industry"]),
+    (("ETF", "Real Estate ETF"), ["real estate", "reit"]),
+    (("ETF", "Utilities ETF"), ["utilities", "utility"]),
+    (("ETF", "Materials ETF"), ["materials", "mining", "chemical"]),
+    (("ETF", "Communication ETF"), ["communication", "media", "telecom"]),
+    (("ETF", "Infrastructure ETF"), ["infrastructure"]),
+    (("ETF", "Dividend ETF"), ["dividend"]),
+    (("ETF", "Bond ETF"), ["bond", "fixed income", "debt"]),
+    (("ETF", "Emerging Market ETF"), ["emerging market"]),
+]
+
+
+class Taxonomy:
+    def __init__(self, entries, default):
+        self.labels = [label for label, _ in entries]
+        self.default = default
+        self._rank = {}
+        for rank, (_, keywords) in enumerate(entries):
+            for keyword in keywords:
+                self._rank.setdefault(keyword.lower(), rank)
+        alternatives = sorted(self._rank, key=lambda k: (self._rank[k], -len(k)))
+        self.pattern = re.compile('(?=(' + '|'.join(re.escape(k) for k in alternatives) + '))')
+
+    def rank_of(self, matches):
+        best = None
+        for keyword in matches:
+            rank = self._rank[keyword]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return best
+
+    def classify(self, text):
+        rank = self.rank_of(m.group(1) for m in self.pattern.finditer(text.lower()))
+        return self.default if rank is None else self.labels[rank]
+
+    def label_indexes(self, texts):
+        """Index into labels for each text, len(labels) standing for the default (for categorical columns)."""
+        none = len(self.labels)
+        indexes = []
+        for text in texts:
+            rank = self.rank_of(m.group(1) for m in self.pattern.finditer(text.lower()))
+            indexes.append(none if rank is None else rank)
+        return indexes
+
+
+MUTUAL_FUND_SECTOR_TAXONOMY = Taxonomy(MUTUAL_FUND_SECTORS, "Other")
+MUTUAL_FUND_INDUSTRY_TAXONOMY = Taxonomy(MUTUAL_FUND_INDUSTRIES, "N/A")
+# An ETF no keyword matches keeps industry None, as /price has always reported it
+ETF_TAXONOMY = Taxonomy(ETF_CLASSES, ("ETF", None))
+
+_etf_memo = {}
+_etf_lock = threading.Lock()
+
+
+def classify_mutual_fund(scheme_name):
+    return {
+        "sector": MUTUAL_FUND_SECTOR_TAXONOMY.classify(scheme_name),
+        "industry": MUTUAL_FUND_INDUSTRY_TAXONOMY.classify(scheme_name),
+    }
+
+
+def classify_etf(symbol, name, description):
+    """(sector, industry) for an ETF, memoized per symbol."""
+    key = symbol.upper()
+    cached = _etf_memo.get(key)
+    if cached is None:
+        cached = ETF_TAXONOMY.classify((name or '') + ' ' + (description or ''))
+        with _etf_lock:
+            _etf_memo[key] = cached
+    return cached
@@ -0,0 +1,98 @@
+"""Response compression: brotli when the client accepts it and the `brotli`
+package is installed, gzip otherwise.
+
+Only complete (single-chunk) bodies are compressed. Streaming responses
+(NDJSON, Server-Sent Events) pass through untouched so lines are not held back.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional; gzip still works without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/javascript", b"image/svg+xml")
+
+
+def accepted_encodings(scope):
+    for key, value in scope.get("headers", ()):
+        if key == b"accept-encoding":
+            accepted = set()
+            for part in value.decode("latin-1").split(","):
+                token, *params = [p.strip() for p in part.split(";")]
+                q = 1.0
+                for param in params:
+                    name, _, weight = param.partition("=")
+                    if name.strip() == "q":
+                        try:
+                            q = float(weight)
+                        except ValueError:
+                            q = 0.0
+                if token and q > 0:
+                    accepted.add(token.lower())
+            return accepted
+    return set()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1000, gzip_level=5, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose(self, scope):
+        accepted = accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, encoding, body):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.choose(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        state = {"start": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            start = state["start"]
+            headers = [(k, v) for k, v in start.get("headers", ()) if k.lower() != b"content-length"]
+            header_map = {k.lower(): v for k, v in headers}
+            body = message.get("body", b"")
+            eligible = (
+                b"content-encoding" not in header_map
+                and header_map.get(b"content-type", b"").startswith(COMPRESSIBLE_TYPES)
+            )
+            if message.get("more_body") or not eligible or len(body) < self.minimum_size:
+                state["passthrough"] = True
+                if eligible:
+                    start = dict(start, headers=list(start.get("headers", ())) + [(b"vary", b"Accept-Encoding")])
+                await send(start)
+                await send(message)
+                return
+            compressed = self.compress(encoding, body)
+            headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding"),
+                        (b"content-length", str(len(compressed)).encode())]
+            await send(dict(start, headers=headers))
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,209 @@
+"""In-process queue for long-running analytics jobs.
+
+Jobs run on a small pool of worker threads, highest priority first and in
+submission order within a priority, so request threads only ever enqueue and
+poll. A running job reports progress with `Job.set_progress()`, which is also
+where it notices cancellation: once a job is cancelled the next call raises
+`Cancelled` inside it. Cancelling a queued job just marks it; workers skip it.
+
+The queue itself keeps only queued and running jobs. Every state change is
+handed to `save(job)` and progress to `heartbeat(job)` (at most every
+`progress_interval` seconds), so the caller can persist jobs and serve
+finished ones from storage. Before running a job a worker calls `claim(job)`;
+returning False (another process already took it) drops the job.
+"""
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Cancelled(Exception):
+    """Raised inside a job's handler once the job has been cancelled."""
+
+
+class Job:
+    def __init__(self, kind, params, portfolio_id=None, priority=0, input_hash=None, job_id=None, created_at=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.portfolio_id = portfolio_id
+        self.priority = priority
+        self.input_hash = input_hash
+        self.status = QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = created_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self._queue = None
+        self._reported_at = 0.0
+
+    def set_progress(self, fraction):
+        """Record progress (0..1) from inside the handler; raises Cancelled once the job is cancelled."""
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if self._queue is not None:
+            self._queue._progressed(self)
+        if self.cancel_requested:
+            raise Cancelled()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'portfolio_id': self.portfolio_id,
+            'params': self.params,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'result': self.result,
+        }
+
+
+class JobQueue:
+    def __init__(self, handlers, workers=2, save=None, heartbeat=None, claim=None, progress_interval=0.5):
+        self.handlers = handlers  # kind -> handler(job) returning the result
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self._save = save or (lambda job: None)
+        self._heartbeat = heartbeat or (lambda job: False)
+        self._claim = claim or (lambda job: True)
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = {}  # id -> queued or running Job
+        self._by_hash = {}  # input_hash -> queued or running Job
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads = []
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"job-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def submit(self, job, persist=True):
+        """Queue `job`; `persist=False` re-queues a job that storage already holds."""
+        if job.kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{job.kind}'")
+        if persist:
+            self._save(job)
+        with self._ready:
+            job._queue = self
+            self._jobs[job.id] = job
+            if job.input_hash:
+                self._by_hash[job.input_hash] = job
+            heapq.heappush(self._heap, (-job.priority, next(self._seq), job))
+            self._ready.notify()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, input_hash):
+        """A queued or running job with this input hash, if any."""
+        return self._by_hash.get(input_hash)
+
+    def cancel(self, job_id):
+        """Cancel a job held by this queue. Returns it, or None if it is not queued or running here."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel_requested = True
+            if job.status != QUEUED:
+                return job  # the handler stops at its next set_progress()
+            self._forget(job)
+        self._finish(job, CANCELLED)
+        return job
+
+    def _forget(self, job):
+        # Caller holds _lock
+        self._jobs.pop(job.id, None)
+        if job.input_hash and self._by_hash.get(job.input_hash) is job:
+            del self._by_hash[job.input_hash]
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self._save(job)
+
+    def _progressed(self, job):
+        now = time.monotonic()
+        if now - job._reported_at < self.progress_interval:
+            return
+        job._reported_at = now
+        try:
+            # Storage may carry a cancellation requested through another process
+            if self._heartbeat(job):
+                job.cancel_requested = True
+        except Exception as e:
+            print(f"Failed to record progress of job {job.id}: {e}")
+
+    def _next(self):
+        with self._ready:
+            while True:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, job = heapq.heappop(self._heap)
+                # Cancelled while queued: already finished and forgotten
+                if job.status == QUEUED and job.id in self._jobs:
+                    return job
+
+    def _work(self):
+        while True:
+            job = self._next()
+            try:
+                claimed = self._claim(job)
+            except Exception as e:
+                print(f"Failed to claim job {job.id}: {e}")
+                claimed = False
+            if not claimed:
+                with self._lock:
+                    self._forget(job)
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        with self._lock:
+            if job.cancel_requested:
+                return  # cancelled between leaving the heap and the claim; cancel() finished it
+            job.status = RUNNING
+        job.started_at = time.time()
+        job._reported_at = time.monotonic()
+        try:
+            result = self.handlers[job.kind](job)
+        except Cancelled:
+            status, result, error = CANCELLED, None, None
+        except Exception as e:
+            status, result, error = FAILED, None, str(e) or type(e).__name__
+        else:
+            status, error = DONE, None
+            job.progress = 1.0
+        with self._lock:
+            self._forget(job)
+        try:
+            self._finish(job, status, result, error)
+        except Exception as e:
+            print(f"Failed to save job {job.id}: {e}")
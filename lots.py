@@ -0,0 +1,210 @@
+"""Tax-lot accounting for the transaction ledger.
+
+Every BUY opens a lot, every SELL closes lots according to a matching method
+(FIFO, LIFO or specific identification). The book consumes the ledger once,
+in transaction-id order, and keeps a cursor so later calls only apply the new
+trades instead of replaying the whole history.
+"""
+from collections import OrderedDict
+from datetime import datetime
+
+FIFO = "fifo"
+LIFO = "lifo"
+SPECIFIC = "specific"
+METHODS = (FIFO, LIFO, SPECIFIC)
+
+EPSILON = 1e-6
+
+
+def parse_when(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '')).replace(tzinfo=None)
+    except ValueError:
+        return datetime.now()
+
+
+class Lot:
+    __slots__ = ("lot_id", "symbol", "quantity", "original_quantity", "price", "acquired")
+
+    def __init__(self, lot_id, symbol, quantity, price, acquired):
+        self.lot_id = lot_id
+        self.symbol = symbol
+        self.quantity = quantity
+        self.original_quantity = quantity
+        self.price = price
+        self.acquired = acquired
+
+    def to_dict(self):
+        return {
+            'lot_id': self.lot_id,
+            'symbol': self.symbol,
+            'quantity': self.quantity,
+            'original_quantity': self.original_quantity,
+            'price': self.price,
+            'cost': self.quantity * self.price,
+            'acquired': self.acquired.isoformat(),
+        }
+
+
+class LotBook:
+    """Open lots and realized gains for every symbol in the ledger."""
+
+    def __init__(self, method=FIFO, long_term_days=365):
+        if method not in METHODS:
+            raise ValueError(f"Unknown lot method '{method}'. Use one of: {', '.join(METHODS)}")
+        self.method = method
+        self.long_term_days = long_term_days
+        self.last_tx_id = 0
+        self.lots = {}          # symbol -> OrderedDict(lot_id -> Lot), oldest first
+        self.disposals = []     # one record per (sell, lot) match
+        self.realized = {}      # symbol -> {"short": x, "long": y}
+
+    # --- ledger replay ---
+
+    def apply(self, tx_id, when, action, symbol, quantity, price, selections=None):
+        """Apply a single ledger row. Rows must arrive in increasing id order."""
+        if tx_id <= self.last_tx_id:
+            return
+        self.last_tx_id = tx_id
+        if not symbol or quantity is None:
+            return
+        when = parse_when(when)
+        price = price or 0.0
+        if action == "BUY":
+            if quantity > EPSILON:
+                self._open(tx_id, symbol, quantity, price, when)
+            elif quantity < -EPSILON:
+                self._close(tx_id, symbol, -quantity, price, when, selections)
+        elif action == "SELL":
+            self._close(tx_id, symbol, quantity, price, when, selections)
+        elif action == "UPDATE":
+            # Manual edits overwrite the position with a single blended lot.
+            book = self.lots.pop(symbol, None)
+            acquired = min((lot.acquired for lot in book.values()), default=when) if book else when
+            if quantity > EPSILON:
+                self._open(tx_id, symbol, quantity, price, acquired)
+        elif action == "DELETE":
+            self.lots.pop(symbol, None)
+
+    def _open(self, lot_id, symbol, quantity, price, when):
+        book = self.lots.setdefault(symbol, OrderedDict())
+        newest = next(reversed(book.values()), None)
+        book[lot_id] = Lot(lot_id, symbol, quantity, price, when)
+        if newest is not None and when < newest.acquired:
+            # A backdated buy: keep the book in acquisition order for FIFO/LIFO
+            self.lots[symbol] = OrderedDict(sorted(book.items(), key=lambda item: (item[1].acquired, item[0])))
+
+    def _close(self, tx_id, symbol, quantity, price, when, selections):
+        matches, _ = self.match(symbol, quantity, selections)
+        book = self.lots.get(symbol)
+        totals = self.realized.setdefault(symbol, {"short": 0.0, "long": 0.0})
+        for lot, qty in matches:
+            term = self.term(lot.acquired, when)
+            gain = (price - lot.price) * qty
+            totals[term] += gain
+            self.disposals.append({
+                'sell_tx_id': tx_id,
+                'lot_id': lot.lot_id,
+                'symbol': symbol,
+                'quantity': qty,
+                'cost_basis': lot.price * qty,
+                'proceeds': price * qty,
+                'gain': gain,
+                'acquired': lot.acquired.isoformat(),
+                'disposed': when.isoformat(),
+                'term': term,
+            })
+            lot.quantity -= qty
+            if lot.quantity <= EPSILON:
+                del book[lot.lot_id]
+        if book is not None and not book:
+            del self.lots[symbol]
+
+    # --- matching ---
+
+    def match(self, symbol, quantity, selections=None, strict=False):
+        """Pick (lot, qty) pairs covering `quantity` without mutating the book.
+
+        `selections` is an ordered list of (lot_id, qty or None) used for
+        specific identification; any remainder falls back to the book method.
+        Returns the matches and the quantity no open lot could cover. With
+        `strict`, a selection that is not an open lot of `symbol` or asks for
+        more than the lot holds raises ValueError instead of being skipped.
+        """
+        book = self.lots.get(symbol) or {}
+        matches = []
+        remaining = quantity
+        taken = {}
+        for lot_id, qty in selections or ():
+            lot = book.get(lot_id)
+            if lot is None:
+                if strict:
+                    raise ValueError(f"Lot {lot_id} is not an open lot of {symbol}")
+                continue
+            available = lot.quantity - taken.get(lot_id, 0.0)
+            if strict and qty is not None and qty > available + EPSILON:
+                raise ValueError(f"Lot {lot_id} has only {available} of {symbol} left")
+            if remaining <= EPSILON:
+                continue
+            use = min(available, remaining if qty is None else min(qty, remaining))
+            if use > EPSILON:
+                matches.append((lot, use))
+                taken[lot_id] = taken.get(lot_id, 0.0) + use
+                remaining -= use
+        if remaining > EPSILON:
+            order = reversed(book.values()) if self.method == LIFO else book.values()
+            for lot in order:
+                available = lot.quantity - taken.get(lot.lot_id, 0.0)
+                if available <= EPSILON:
+                    continue
+                use = min(available, remaining)
+                matches.append((lot, use))
+                remaining -= use
+                if remaining <= EPSILON:
+                    break
+        return matches, max(remaining, 0.0)
+
+    def term(self, acquired, disposed):
+        return "long" if (disposed - acquired).days > self.long_term_days else "short"
+
+    # --- reporting ---
+
+    def open_lots(self, symbol=None):
+        books = [self.lots.get(symbol, {})] if symbol else self.lots.values()
+        return [lot for book in books for lot in book.values()]
+
+    def gains(self, prices=None, symbol=None, as_of=None):
+        """Realized and unrealized short/long-term gains per symbol.
+
+        `prices` maps symbol to its current price; symbols without a price are
+        reported with unrealized gains of None.
+        """
+        prices = prices or {}
+        as_of = as_of or datetime.now()
+        symbols = [symbol] if symbol else sorted(set(self.lots) | set(self.realized))
+        result = {}
+        for sym in symbols:
+            realized = self.realized.get(sym, {"short": 0.0, "long": 0.0})
+            price = prices.get(sym)
+            unrealized = {"short": 0.0, "long": 0.0} if price is not None else None
+            quantity = 0.0
+            cost = 0.0
+            for lot in self.lots.get(sym, {}).values():
+                quantity += lot.quantity
+                cost += lot.quantity * lot.price
+                if unrealized is not None:
+                    unrealized[self.term(lot.acquired, as_of)] += (price - lot.price) * lot.quantity
+            result[sym] = {
+                'quantity': quantity,
+                'cost_basis': cost,
+                'current_price': price,
+                'realized_short_term': realized["short"],
+                'realized_long_term': realized["long"],
+                'unrealized_short_term': unrealized["short"] if unrealized else None,
+                'unrealized_long_term': unrealized["long"] if unrealized else None,
+            }
+        return result
@@ -1,30 +1,66 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, Body
-from pydantic import BaseModel
-import yfinance as yf
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request, Response, BackgroundTasks
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import os
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, event, select, update, delete, text, Column, Integer, String, Float, DateTime, Index, UniqueConstraint
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from dataclasses import dataclass, fields as dataclass_fields
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import hashlib
 import sqlite3
-import requests
-import pandas as pd
-from io import StringIO
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import analytics
+import classification
+import compression
+import jobs
+import lots
+import profiling
+import metrics
+import providers
+import shared_cache
+import stream
+import valuation
+import amfi
+import asyncio
+import json
+import orjson
+import re
 
-app = FastAPI()
+def json_bytes(content):
+    """orjson-encode `content`, charging the time to the request's slow-log breakdown."""
+    start = time.perf_counter()
+    body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    timings = profiling.current_timings()
+    if timings is not None:
+        timings.add_serialization(time.perf_counter() - start)
+    return body
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content):
+        return json_bytes(content)
+
+app = FastAPI(default_response_class=TimedJSONResponse)
+# Sync endpoints mark the pool thread serving them, so ?profile=1 samples only that request's threads
+app.router.route_class = profiling.ServingThreadRoute
 
 @app.on_event("startup")
 def on_startup():
     ensure_schema()
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    # The database may have been replaced while the server was down; drop ETags and snapshots from before
+    shared.increment_all("data_version:")
     # Ensure available amount row exists
     db = SessionLocal()
-    if not db.query(AvailableDB).first():
-        db.add(AvailableDB(amount=0))
+    if not db.query(AvailableDB).filter(AvailableDB.portfolio_id == DEFAULT_PORTFOLIO).first():
+        db.add(AvailableDB(portfolio_id=DEFAULT_PORTFOLIO, amount=0))
         db.commit()
     db.close()
 
@@ -34,17 +70,85 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(compression.CompressionMiddleware, minimum_size=1000)
 
 DATABASE_URL = "sqlite:///./portfolio.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+# Reference data, quotes and invalidation counters shared by every worker process
+shared = shared_cache.SharedCache(os.environ.get("SHARED_CACHE_PATH", "./cache.db"))
+
+# --- Metrics ---
+registry = metrics.Registry()
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "Request latency by route template (streaming responses excluded)", ("route", "method"))
+HTTP_STREAM_FIRST_BYTE = registry.histogram("http_stream_first_byte_seconds", "Time to the first body chunk of SSE and NDJSON responses", ("route", "method"))
+HTTP_REQUESTS = registry.counter("http_requests_total", "Requests by route template, method and status", ("route", "method", "status"))
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being served")
+UPSTREAM_LATENCY = registry.histogram("upstream_request_duration_seconds", "Upstream call latency", ("upstream", "call"))
+UPSTREAM_CALLS = registry.counter("upstream_requests_total", "Upstream calls", ("upstream", "call"))
+UPSTREAM_ERRORS = registry.counter("upstream_errors_total", "Upstream calls that raised", ("upstream", "call"))
+CACHE_REQUESTS = registry.counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+DB_QUERIES = registry.histogram("db_query_duration_seconds", "SQL statement time by operation", ("operation",))
+
+def cache_hit_ratios():
+    totals = {}
+    for (cache, result), count in CACHE_REQUESTS.items().items():
+        hits, total = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (count if result == "hit" else 0.0), total + count)
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+registry.gauge("cache_hit_ratio", "Share of cache lookups served from cache", ("cache",), collect=cache_hit_ratios)
+registry.gauge("stream_subscribers", "Connected price stream clients", collect=lambda: {(): len(price_hub)})
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+app.add_middleware(profiling.ProfilingMiddleware, admin_token=ADMIN_TOKEN, slow_ms=SLOW_REQUEST_MS)
+app.add_middleware(metrics.RequestMetricsMiddleware, latency=HTTP_LATENCY, requests=HTTP_REQUESTS, in_flight=HTTP_IN_FLIGHT,
+                   first_byte=HTTP_STREAM_FIRST_BYTE)
+
+def observe_upstream(upstream, call, seconds, error):
+    UPSTREAM_CALLS.inc(upstream=upstream, call=call)
+    UPSTREAM_LATENCY.observe(seconds, upstream=upstream, call=call)
+    if error is not None:
+        UPSTREAM_ERRORS.inc(upstream=upstream, call=call)
+    timings = profiling.current_timings()
+    if timings is not None:
+        timings.add_upstream(seconds)
+
+providers.add_observer(observe_upstream)
+
+@event.listens_for(engine, "before_cursor_execute")
+def db_query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def db_query_end(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERIES.observe(elapsed, operation=statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other")
+    timings = profiling.current_timings()
+    if timings is not None:
+        timings.add_db(elapsed)
+
+@event.listens_for(engine, "handle_error")
+def db_query_failed(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+# Every holding, ledger row and cash balance belongs to a portfolio; requests without
+# ?portfolio_id= use the default one, which is where data from before portfolios lives
+DEFAULT_PORTFOLIO = 1
 
 class AssetDB(Base):
     __tablename__ = "assets"
+    # (portfolio_id, symbol) is unique and indexes every per-portfolio holdings query
+    __table_args__ = (UniqueConstraint("portfolio_id", "symbol", name="uq_assets_portfolio_symbol"),)
     id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, unique=True, index=True)
+    portfolio_id = Column(Integer, nullable=False, default=DEFAULT_PORTFOLIO)
+    symbol = Column(String, index=True)
     asset_type = Column(String, default="stock")
     quantity = Column(Float)
     buy_price = Column(Float)
@@ -77,7 +181,7 @@ class Asset(BaseModel):
     sector: Optional[str] = None
     industry: Optional[str] = None
     notes: Optional[str] = None
-    precision: Optional[int] = None
+    precision: Optional[int] = Field(None, ge=0)
     icon: Optional[str] = None
     fund_house: Optional[str] = None
     manager: Optional[str] = None
@@ -89,7 +193,10 @@ class Asset(BaseModel):
 
 class TransactionDB(Base):
     __tablename__ = "transactions"
+    # portfolio_id alone serves the lot-book replay (rowid order); with datetime it serves /history
+    __table_args__ = (Index("ix_transactions_portfolio_datetime", "portfolio_id", "datetime"),)
     id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, nullable=False, default=DEFAULT_PORTFOLIO, index=True)
     datetime = Column(String, default=lambda: datetime.now().isoformat())
     action = Column(String)
     symbol = Column(String)
@@ -101,12 +208,77 @@ class TransactionDB(Base):
     pl = Column(Float)
     notes = Column(String)
     balance_after = Column(Float)
+    # Date a BUY was made when the client gave one (a backdated purchase); its lot is acquired then
+    trade_date = Column(String, default=None)
+
+@dataclass(slots=True)
+class TransactionRecord:
+    # Row shape of GET /history, in column order; orjson encodes these natively
+    id: int
+    datetime: Optional[str]
+    action: Optional[str]
+    symbol: Optional[str]
+    name: Optional[str]
+    asset_type: Optional[str]
+    quantity: Optional[float]
+    price: Optional[float]
+    value: Optional[float]
+    pl: Optional[float]
+    notes: Optional[str]
+    balance_after: Optional[float]
 
 class AvailableDB(Base):
     __tablename__ = "available_amount"
     id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, nullable=False, default=DEFAULT_PORTFOLIO, unique=True, index=True)
     amount = Column(Float, default=0)
 
+class LotSelectionDB(Base):
+    # Specific-ID lot picks recorded for a SELL transaction (lot_id is the BUY transaction id)
+    __tablename__ = "lot_selections"
+    __table_args__ = (Index("ix_lot_selections_portfolio_sell", "portfolio_id", "sell_tx_id"),)
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, nullable=False, default=DEFAULT_PORTFOLIO)
+    sell_tx_id = Column(Integer, index=True)
+    lot_id = Column(Integer)
+    quantity = Column(Float)
+
+class SymbolMetadataDB(Base):
+    # Provider reference data that rarely changes, reused for METADATA_TTL; shared by all portfolios
+    __tablename__ = "symbol_metadata"
+    symbol = Column(String, primary_key=True)
+    name = Column(String)
+    quote_type = Column(String)
+    sector = Column(String)
+    industry = Column(String)
+    currency = Column(String)
+    exchange = Column(String)
+    inferred_exchange = Column(String)
+    market_cap = Column(Integer)
+    website = Column(String)
+    description = Column(String)
+    fetched_at = Column(String, index=True)
+
+class JobDB(Base):
+    # Background analytics jobs and their results; see jobs.py and the /jobs endpoints
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_portfolio_created", "portfolio_id", "created_at"),)
+    id = Column(String, primary_key=True)
+    portfolio_id = Column(Integer, nullable=False, default=DEFAULT_PORTFOLIO)
+    kind = Column(String, nullable=False)
+    params = Column(String)  # JSON
+    input_hash = Column(String, index=True)
+    priority = Column(Integer, default=0)
+    status = Column(String, index=True)
+    progress = Column(Float, default=0)
+    result = Column(String)  # JSON
+    error = Column(String)
+    owner = Column(Integer)  # pid of the worker process running it
+    cancel_requested = Column(Integer, default=0)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float)
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -120,6 +292,7 @@ def round_decimal(val, places=6):
                                         rounding=ROUND_HALF_UP))
 
 def ensure_schema():
+    """Exit if the assets table is missing columns; returns the names of the tables that exist."""
     db_path = './portfolio.db'
     expected_columns = {
         'id', 'symbol', 'quantity', 'buy_price', 'currency', 'buy_date', 'asset_type', 'exchange', 'sector', 'industry', 'notes',
@@ -127,17 +300,19 @@ def ensure_schema():
     }
 
     if not os.path.exists(db_path):
-        return
+        return set()
 
     conn = None
     try:
         conn = sqlite3.connect(db_path)
         c = conn.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table';")
+        tables = {row[0] for row in c.fetchall()}
         c.execute("PRAGMA table_info(assets);")
         cols = {row[1] for row in c.fetchall()}
         
         missing_cols = expected_columns - cols
-        if missing_cols:
+        if missing_cols and 'assets' in tables:
             conn.close()
             print("\n" + "="*60)
             print("FATAL: DATABASE SCHEMA MISMATCH")
@@ -155,6 +330,49 @@ def ensure_schema():
     finally:
         if conn:
             conn.close()
+    return tables
+
+PORTFOLIO_TABLES = (AssetDB, TransactionDB, AvailableDB, LotSelectionDB)
+
+def upgrade_schema():
+    """Create missing tables and bring old ones up to date. Every worker runs this at startup: the
+    first to take SQLite's write lock does the work, the others wait for it and then find nothing to do."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        # Read under the lock; another worker may have migrated since ensure_schema() looked
+        tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        # Only run DDL on a fresh or partially created database
+        if not set(Base.metadata.tables) <= tables:
+            Base.metadata.create_all(bind=conn)
+        add_portfolio_ids(conn, tables)
+        add_trade_dates(conn, tables)
+        conn.commit()
+
+def add_portfolio_ids(conn, tables):
+    """Bring tables created before portfolios existed up to date: their rows join the default
+    portfolio, assets.symbol stops being unique on its own, and the per-portfolio indexes are built."""
+    for model in PORTFOLIO_TABLES:
+        table = model.__table__
+        if table.name not in tables:
+            continue
+        columns = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))}
+        if 'portfolio_id' in columns:
+            continue
+        print(f"Adding portfolio_id to {table.name}")
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN portfolio_id INTEGER NOT NULL DEFAULT {DEFAULT_PORTFOLIO}"))
+        if table.name == 'assets':
+            conn.execute(text("DROP INDEX IF EXISTS ix_assets_symbol"))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_assets_portfolio_symbol ON assets (portfolio_id, symbol)"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def add_trade_dates(conn, tables):
+    if 'transactions' not in tables:
+        return
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(transactions)"))}
+    if 'trade_date' not in columns:
+        print("Adding trade_date to transactions")
+        conn.execute(text("ALTER TABLE transactions ADD COLUMN trade_date VARCHAR"))
 
 # Decimal precision by asset type
 def get_precision(asset_type):
@@ -168,51 +386,70 @@ def get_precision(asset_type):
         'commodity': 2,
     }.get(asset_type, 2)
 
+def asset_precision(asset):
+    """Decimal places a stored holding is valued at; rows saved without one use their type's default."""
+    return asset.precision if asset.precision is not None else get_precision(asset.asset_type)
+
 # --- AMFI Mutual Fund NAV Support ---
-AMFI_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
-_amfi_cache = {"data": None, "timestamp": None}
+_amfi_cache = {"data": None, "timestamp": None, "fetched_at": None}
+_amfi_lock = threading.Lock()
+
+def amfi_is_fresh():
+    return _amfi_cache["data"] is not None and _amfi_cache["timestamp"] > datetime.now() - timedelta(hours=1)
 
 def get_amfi_data():
     # Cache for 1 hour
-    if _amfi_cache["data"] is not None and _amfi_cache["timestamp"] > datetime.now() - timedelta(hours=1):
+    if amfi_is_fresh():
+        CACHE_REQUESTS.inc(cache="amfi", result="hit")
         return _amfi_cache["data"]
+    # One download at a time; callers arriving mid-download wait for it instead of starting another
+    with _amfi_lock:
+        if amfi_is_fresh():
+            CACHE_REQUESTS.inc(cache="amfi", result="hit")
+            return _amfi_cache["data"]
+        CACHE_REQUESTS.inc(cache="amfi", result="miss")
+        return load_amfi_data()
+
+def load_amfi_data():
     try:
-        response = requests.get(AMFI_URL)
-        # AMFI file is ; separated, skip first row (header), skip blank lines
-        lines = [line for line in response.text.splitlines() if line.strip() and not line.startswith('Open Ended') and not line.startswith('Scheme Code')]
-        data = '\n'.join(lines)
-        df = pd.read_csv(StringIO(data), sep=';', header=None, names=[
-            'Scheme Code', 'ISIN Div Payout/ ISIN Growth', 'ISIN Div Reinvestment', 'Scheme Name', 'Net Asset Value', 'Date'
-        ], dtype=str)
-        print(f"AMFI DataFrame loaded: {len(df)} rows")
-        print(df.head())
-        _amfi_cache["data"] = df
-        _amfi_cache["timestamp"] = datetime.now()
-        return df
+        # Only the worker that wins the refresh downloads; the others parse its copy
+        text, fetched_at = shared.fetch("amfi:nav", 3600, lambda: providers.get_provider().amfi_nav_text().encode())
+        # A stale copy means another worker is downloading right now; look again in a minute
+        timestamp = max(datetime.fromtimestamp(fetched_at), datetime.now() - timedelta(minutes=59))
+        if _amfi_cache["data"] is not None and _amfi_cache["fetched_at"] == fetched_at:
+            _amfi_cache["timestamp"] = timestamp
+            return _amfi_cache["data"]
+        table = amfi.NavTable.parse(text.decode())
+        print(f"AMFI NAV table loaded: {len(table)} schemes, {table.memory_bytes() / 1e6:.1f} MB")
+        # Data goes in last: readers outside the lock treat a non-empty "data" as complete
+        _amfi_cache["fetched_at"] = fetched_at
+        _amfi_cache["timestamp"] = timestamp
+        _amfi_cache["data"] = table
+        return table
     except Exception as e:
         print(f"AMFI data fetch/parse error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to load AMFI data: {e}")
 
 def find_mf_by_code(code):
-    df = get_amfi_data()
-    row = df[df['Scheme Code'].astype(str) == str(code)]
-    if not row.empty:
-        return row.iloc[0].to_dict()
-    return None
+    table = get_amfi_data()
+    row = table.find_code(code)
+    return table.row(row) if row is not None else None
+
+def find_mf_nav(code):
+    """NAV of a scheme as a float, or None if the scheme or its NAV is missing."""
+    table = get_amfi_data()
+    row = table.find_code(code)
+    return table.nav_value(row) if row is not None else None
 
 def find_mf_by_name(name):
-    df = get_amfi_data()
-    row = df[df['Scheme Name'].str.contains(name, case=False, na=False)]
-    if not row.empty:
-        return row.iloc[0].to_dict()
-    return None
+    table = get_amfi_data()
+    row = table.find_name(name)
+    return table.row(row) if row is not None else None
 
 @app.get("/mutualfund/list")
 def list_mutual_funds():
-    df = get_amfi_data()
-    # Only keep rows with a numeric Scheme Code and non-empty Scheme Name
-    df = df[df['Scheme Code'].str.isdigit() & df['Scheme Name'].notnull()]
-    return df[['Scheme Code', 'Scheme Name', 'Net Asset Value', 'Date']].to_dict(orient='records')
+    # Schemes with a numeric code and a name
+    return get_amfi_data().listing()
 
 @app.get("/mutualfund/nav")
 def get_mutual_fund_nav(code: str = Query(None), name: str = Query(None)):
@@ -229,8 +466,7 @@ def get_mutual_fund_nav(code: str = Query(None), name: str = Query(None)):
 @app.get("/mutualfund/price/{code}")
 def get_mutual_fund_price(code: str):
     print(f"Looking up mutual fund code: {code}")
-    df = get_amfi_data()
-    if df.empty:
+    if not len(get_amfi_data()):
         print("AMFI DataFrame is empty!")
         raise HTTPException(status_code=500, detail="AMFI data is empty.")
     mf = find_mf_by_code(code)
@@ -241,73 +477,454 @@ def get_mutual_fund_price(code: str):
 
 def classify_mutual_fund(scheme_name: str) -> dict:
     """Classifies a mutual fund's sector and industry based on its name."""
-    name = scheme_name.lower()
-    
-    sector = "Other"
-    industry = "N/A"
-
-    # Sector Keywords (priority matters)
-    sector_map = {
-        "Thematic": ["pharma", "banking", "infra", "technology", "fmcg", "consumption", "digital"],
-        "Index/ETF": ["index", "etf", "nifty", "sensex"],
-        "Commodity": ["gold", "silver"],
-        "Debt": ["debt", "gilt", "bond", "income", "liquid", "money market", "overnight", "short duration", "medium duration", "long duration", "corporate bond"],
-        "Hybrid": ["hybrid", "balanced", "multi asset", "arbitrage", "advantage"],
-        "Equity": ["equity", "multi cap", "flexi cap", "large cap", "mid cap", "small cap", "elss", "tax saver", "focused", "value"],
-    }
-
-    for s, keywords in sector_map.items():
-        if any(k in name for k in keywords):
-            sector = s
-            break
-
-    # Industry / Sub-category Keywords
-    industry_map = {
-        # Equity
-        "Large & Mid Cap": ["large & mid cap", "large and mid cap"],
-        "Large Cap": ["large cap"],
-        "Mid Cap": ["mid cap"],
-        "Small Cap": ["small cap"],
-        "Multi Cap": ["multi cap"],
-        "Flexi Cap": ["flexi cap"],
-        "ELSS / Tax Saver": ["elss", "tax saver"],
-        "Focused": ["focused"],
-        "Value": ["value"],
-        "Dividend Yield": ["dividend yield"],
-        # Debt
-        "Gilt Fund": ["gilt"],
-        "Liquid Fund": ["liquid"],
-        "Overnight Fund": ["overnight"],
-        "Short Duration": ["short duration"],
-        "Medium Duration": ["medium duration"],
-        "Long Duration": ["long duration"],
-        "Corporate Bond": ["corporate bond"],
-        # Hybrid
-        "Balanced Advantage": ["balanced advantage", "dynamic asset allocation"],
-        "Aggressive Hybrid": ["aggressive hybrid"],
-    }
-    
-    for i, keywords in industry_map.items():
-        if any(k in name for k in keywords):
-            industry = i
-            break
-            
-    return {"sector": sector, "industry": industry}
+    return classification.classify_mutual_fund(scheme_name)
 
 # Helper to get FX rate
 def get_fx(symbol_from, symbol_to):
-    if symbol_from == symbol_to:
+    # Same cached provider lookup as /fxrate, without a request back to this server
+    try:
+        return get_fx_rate(symbol_from, symbol_to)['rate']
+    except (HTTPException, providers.ProviderError):
         return 1.0
+
+# --- Price and snapshot caches ---
+PRICE_TTL = int(os.environ.get("PRICE_TTL", "60"))  # seconds a quote is reused
+_quote_cache = {}  # symbol -> (price, fetched_at)
+_snapshot_cache = {}  # portfolio_id -> priced snapshot
+_snapshot_locks = {}  # portfolio_id -> lock held while that portfolio is priced
+# Mirror of the shared "data_version:<portfolio_id>" counters as (value, epoch); the epoch
+# (counter creation time) keeps ETags from a previous shared cache from matching
+_data_version = {}
+
+def data_version_counter(portfolio_id):
+    return f"data_version:{portfolio_id}"
+
+def current_data_version(portfolio_id):
+    """Version of one portfolio's data, shared by all workers."""
+    value, created_at = shared.counter(data_version_counter(portfolio_id))
+    _data_version[portfolio_id] = (value, int(created_at))
+    return value
+
+def data_epoch(portfolio_id):
+    return _data_version[portfolio_id][1]
+
+@event.listens_for(SessionLocal, "after_flush")
+def mark_data_changed(session, flush_context):
+    changed = session.info.setdefault("data_changed", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        portfolio_id = getattr(obj, "portfolio_id", None)
+        if portfolio_id is not None:
+            changed.add(portfolio_id)
+
+@event.listens_for(SessionLocal, "after_commit")
+def bump_data_version(session):
+    # A committed write invalidates cached reads of the portfolios it touched, in every worker
+    for portfolio_id in session.info.pop("data_changed", ()):
+        shared.increment(data_version_counter(portfolio_id))
+
+@event.listens_for(SessionLocal, "after_rollback")
+def forget_data_change(session):
+    session.info.pop("data_changed", None)
+
+def quote_key(symbol):
+    return f"quote:{symbol}"
+
+def cached_quote(symbol):
+    """(price, fetched_at) for a fresh quote held by this worker or published by another, else None."""
+    cached = _quote_cache.get(symbol)
+    if cached and cached[1] > datetime.now() - timedelta(seconds=PRICE_TTL):
+        return cached
     try:
-        res = requests.get(f"http://localhost:8000/fxrate/{symbol_from}/{symbol_to}")
-        if res.status_code == 200:
-            return res.json().get('rate', 1.0)
-    except Exception:
+        entry = shared.get(quote_key(symbol))
+    except sqlite3.Error:
+        return None
+    if entry is not None and entry[1] > time.time() - PRICE_TTL:
+        cached = _quote_cache[symbol] = (orjson.loads(entry[0]), datetime.fromtimestamp(entry[1]))
+        return cached
+    return None
+
+def fetch_current_price(asset):
+    """Latest NAV for mutual funds, live (or last close) price for everything else."""
+    price = None
+    # --- Mutual Fund logic ---
+    if asset.asset_type == "mutual_fund":
+        price = find_mf_nav(asset.symbol)
+    else:
+        cached = cached_quote(asset.symbol)
+        if cached:
+            CACHE_REQUESTS.inc(cache="quote", result="hit")
+            return cached[0]
+        CACHE_REQUESTS.inc(cache="quote", result="miss")
+        try:
+            market = providers.get_provider()
+            # Try live price first
+            info = market.info(asset.symbol)
+            remember_symbol_metadata(asset.symbol, info, defer=True)
+            price = info.get('regularMarketPrice')
+            if price is None:
+                price = market.last_close(asset.symbol)
+        except Exception:
+            price = None
+        if price is not None:
+            _quote_cache[asset.symbol] = (price, datetime.now())
+    return price
+
+def has_cached_price(asset):
+    if asset.asset_type == "mutual_fund":
+        return amfi_is_fresh()
+    return has_cached_price_for(asset.symbol)
+
+def has_cached_price_for(symbol):
+    cached = _quote_cache.get(symbol)
+    return bool(cached) and cached[1] > datetime.now() - timedelta(seconds=PRICE_TTL)
+
+QUOTE_WORKERS = int(os.environ.get("QUOTE_WORKERS", "8"))
+QUOTE_SHARE_BATCH = 50  # fetched quotes published to other workers per write
+_quote_pool = ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="quote")
+
+def claim_quotes(assets):
+    """Adopt fresh quotes other workers published and claim the refresh of the rest.
+    Returns the symbols this worker should fetch; another worker is fetching the others."""
+    symbols = {quote_key(asset.symbol): asset.symbol for asset in assets}
+    if not symbols:
+        return set()
+    try:
+        now = time.time()
+        for key, (value, fetched_at) in shared.get_many(symbols).items():
+            if fetched_at > now - PRICE_TTL:
+                _quote_cache[symbols[key]] = (orjson.loads(value), datetime.fromtimestamp(fetched_at))
+        missing = [key for key, symbol in symbols.items() if not has_cached_price_for(symbol)]
+        return {symbols[key] for key in shared.claim_many(missing)}
+    except sqlite3.Error as e:
+        print(f"Shared quote cache unavailable: {e}")
+        return set(symbols.values())
+
+def share_quotes(outbox):
+    """Publish quotes this worker fetched. Failed symbols only give up their lease so another worker can retry."""
+    try:
+        shared.put_many({quote_key(s): orjson.dumps(p) for s, p in outbox.items() if p is not None})
+        shared.release_many([quote_key(s) for s, p in outbox.items() if p is None])
+    except sqlite3.Error as e:
+        print(f"Failed to share {len(outbox)} quotes: {e}")
+    outbox.clear()
+
+def resolve_into(future, asset):
+    try:
+        future.set_result(fetch_current_price(asset))
+    except Exception as e:
+        future.set_exception(e)
+
+def await_shared_quotes(waiting, claimed):
+    """Resolve the futures of symbols another worker is fetching as its quotes are published.
+    Symbols it gives up on (lease released without a quote, or expired) are fetched here."""
+    deadline = time.time() + shared.lease_seconds
+    seen = None
+    while waiting:
+        time.sleep(shared.poll_interval)
+        keys = [quote_key(asset.symbol) for asset, _ in waiting]
+        try:
+            now = time.time()
+            published = shared.published()
+            if published == seen and now < deadline:
+                continue
+            seen = published
+            found = {key: entry for key, entry in shared.get_many(keys).items() if entry[1] > now - PRICE_TTL}
+            missing = [key for key in keys if key not in found]
+            if now >= deadline:
+                retry = set(missing)
+            else:
+                # Only keys nobody holds a lease on are worth a write
+                orphaned = set(missing) - shared.leased(missing)
+                retry = shared.claim_many(orphaned) if orphaned else set()
+        except sqlite3.Error:
+            found, retry = {}, set(keys)
+        still = []
+        for asset, future in waiting:
+            key = quote_key(asset.symbol)
+            if key in found:
+                value, fetched_at = found[key]
+                price = orjson.loads(value)
+                _quote_cache[asset.symbol] = (price, datetime.fromtimestamp(fetched_at))
+                future.set_result(price)
+            elif key in retry:
+                claimed.add(asset.symbol)
+                _quote_pool.submit(profiling.bind(resolve_into), future, asset)
+            else:
+                still.append((asset, future))
+        waiting = still
+
+def price_assets(assets):
+    """Yield (index, asset, price) as prices resolve: cache hits first, then upstream fetches as they complete.
+    Quotes are fetched by one worker at a time and shared with the rest (see claim_quotes)."""
+    claimed = claim_quotes([a for a in assets if a.asset_type != "mutual_fund" and not has_cached_price(a)])
+    pending = {}
+    waiting = []
+    for index, asset in enumerate(assets):
+        if has_cached_price(asset):
+            yield index, asset, fetch_current_price(asset)
+        elif asset.asset_type == "mutual_fund" or asset.symbol in claimed:
+            # Bound to the request so upstream time lands in its slow-log breakdown and profile
+            pending[_quote_pool.submit(profiling.bind(fetch_current_price), asset)] = index
+        else:
+            future = Future()
+            waiting.append((asset, future))
+            pending[future] = index
+    if waiting:
+        threading.Thread(target=profiling.bind(await_shared_quotes), args=(waiting, claimed),
+                         name="quote-wait", daemon=True).start()
+    outbox = {}
+    for future in as_completed(pending):
+        index = pending[future]
+        try:
+            price = future.result()
+        except Exception:
+            price = None
+        if assets[index].symbol in claimed:
+            outbox[assets[index].symbol] = price
+            if len(outbox) >= QUOTE_SHARE_BATCH:
+                share_quotes(outbox)
+        yield index, assets[index], price
+    share_quotes(outbox)
+    flush_symbol_metadata()
+
+def quote_symbol(symbol):
+    """Live price of one listed symbol (last close when there is none), through the same quote
+    cache and refresh leases as portfolio pricing."""
+    price = None
+    for _, _, price in price_assets([AssetDB(symbol=symbol)]):
         pass
-    return 1.0
+    return price
+
+# --- Symbol metadata cache ---
+METADATA_TTL = int(os.environ.get("METADATA_TTL", str(7 * 24 * 3600)))  # seconds reference data is reused
+METADATA_REFRESH_INTERVAL = int(os.environ.get("METADATA_REFRESH_INTERVAL", "3600"))
+METADATA_FIELDS = ('name', 'quote_type', 'sector', 'industry', 'currency', 'exchange', 'inferred_exchange',
+                   'market_cap', 'website', 'description', 'fetched_at')
+_metadata_cache = {}  # symbol -> metadata dict, mirrors the symbol_metadata table
+_metadata_pending = {}  # symbol -> metadata learned while pricing, written in one batch
+_metadata_lock = threading.Lock()
+
+def metadata_from_info(symbol, info):
+    """Static fields of a provider `info` dict, with ETF and crypto sector/industry already classified."""
+    quote_type = info.get('quoteType')
+    description = info.get('longBusinessSummary') or ''
+    sector = info.get('sector') or None
+    industry = info.get('industry') or None
+    if quote_type == 'ETF':
+        etf_sector, etf_industry = classification.classify_etf(symbol, info.get('longName'), description)
+        sector = sector or etf_sector
+        industry = industry or etf_industry
+    elif quote_type == 'CRYPTOCURRENCY':
+        sector = 'Cryptocurrency'
+        industry = info.get('name') or info.get('longName') or symbol
+    market_cap = info.get('marketCap')
+    return {
+        'symbol': symbol,
+        'name': info.get('longName') or info.get('shortName') or info.get('name') or None,
+        'quote_type': quote_type,
+        'sector': sector,
+        'industry': industry,
+        'currency': info.get('currency'),
+        'exchange': info.get('exchange'),
+        'inferred_exchange': infer_exchange(symbol),
+        'market_cap': int(market_cap) if market_cap is not None else None,
+        'website': info.get('website'),
+        'description': description,
+        'fetched_at': datetime.now().isoformat(),
+    }
+
+def metadata_is_fresh(meta):
+    return datetime.fromisoformat(meta['fetched_at']) > datetime.now() - timedelta(seconds=METADATA_TTL)
+
+def save_symbol_metadata(entries):
+    """Upsert metadata rows. Writes through the engine rather than a session so the data version
+    (and with it every portfolio ETag) is left alone."""
+    if not entries:
+        return
+    stmt = sqlite_insert(SymbolMetadataDB.__table__)
+    stmt = stmt.on_conflict_do_update(index_elements=['symbol'], set_={f: stmt.excluded[f] for f in METADATA_FIELDS})
+    with _metadata_lock:
+        with engine.begin() as conn:
+            conn.execute(stmt, entries)
+        _metadata_cache.update((entry['symbol'], entry) for entry in entries)
+
+def cached_symbol_metadata(symbol):
+    """Fresh metadata from memory or the symbol_metadata table, else None. Never calls upstream."""
+    meta = _metadata_cache.get(symbol)
+    # A stale copy may have been refreshed in the table by another worker
+    if meta is None or not metadata_is_fresh(meta):
+        with engine.connect() as conn:
+            row = conn.execute(select(SymbolMetadataDB.__table__).where(SymbolMetadataDB.symbol == symbol)).mappings().first()
+        if row is not None:
+            meta = _metadata_cache[symbol] = dict(row)
+    if meta is not None and metadata_is_fresh(meta):
+        CACHE_REQUESTS.inc(cache="metadata", result="hit")
+        return meta
+    CACHE_REQUESTS.inc(cache="metadata", result="miss")
+    return None
+
+def remember_symbol_metadata(symbol, info, defer=False):
+    """Cache the metadata in an `info` response that was fetched anyway; skipped while the cached copy is fresh.
+    With `defer`, the row is only written by the next flush_symbol_metadata()."""
+    current = _metadata_cache.get(symbol)
+    if not info or (current is not None and metadata_is_fresh(current)):
+        return current
+    meta = metadata_from_info(symbol, info)
+    if defer:
+        with _metadata_lock:
+            _metadata_cache[symbol] = _metadata_pending[symbol] = meta
+        return meta
+    try:
+        save_symbol_metadata([meta])
+    except Exception as e:
+        print(f"Failed to cache metadata for {symbol}: {e}")
+    return meta
+
+def flush_symbol_metadata():
+    with _metadata_lock:
+        entries = list(_metadata_pending.values())
+        _metadata_pending.clear()
+    try:
+        save_symbol_metadata(entries)
+    except Exception as e:
+        print(f"Failed to cache metadata for {len(entries)} symbols: {e}")
+
+def preload_symbol_metadata(symbols):
+    """Pull rows for symbols not yet in memory from the symbol_metadata table in one query."""
+    missing = [s for s in symbols if s not in _metadata_cache]
+    if not missing:
+        return
+    with engine.connect() as conn:
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            for row in conn.execute(select(SymbolMetadataDB.__table__).where(SymbolMetadataDB.symbol.in_(chunk))).mappings():
+                _metadata_cache[row['symbol']] = dict(row)
+
+def get_symbol_metadata(symbol):
+    """Metadata for `symbol`, calling the provider only on a cache miss. None for unknown symbols."""
+    meta = cached_symbol_metadata(symbol)
+    if meta is not None:
+        return meta
+    return remember_symbol_metadata(symbol, providers.get_provider().info(symbol))
+
+def refresh_symbol_metadata(symbols):
+    """Re-fetch metadata for `symbols` in parallel and store it in one transaction. Returns the number refreshed."""
+    market = providers.get_provider()
+    pending = {_quote_pool.submit(profiling.bind(market.info), symbol): symbol for symbol in symbols}
+    entries = []
+    for future in as_completed(pending):
+        try:
+            info = future.result()
+        except Exception:
+            continue
+        if info:
+            entries.append(metadata_from_info(pending[future], info))
+    save_symbol_metadata(entries)
+    return len(entries)
+
+def stale_metadata_symbols():
+    """Cached symbols older than METADATA_TTL, plus held non-fund symbols that have no metadata yet."""
+    cutoff = (datetime.now() - timedelta(seconds=METADATA_TTL)).isoformat()
+    with engine.connect() as conn:
+        stale = set(conn.execute(select(SymbolMetadataDB.symbol).where(SymbolMetadataDB.fetched_at < cutoff)).scalars())
+        known = set(conn.execute(select(SymbolMetadataDB.symbol)).scalars())
+        held = set(conn.execute(select(AssetDB.symbol).where(AssetDB.asset_type != 'mutual_fund')).scalars())
+    return sorted(stale | (held - known))
+
+async def refresh_metadata_forever():
+    while True:
+        try:
+            # The table is shared, so one worker per interval does the refresh
+            elected = await run_in_threadpool(shared.claim, "job:metadata-refresh", METADATA_REFRESH_INTERVAL)
+            symbols = await run_in_threadpool(stale_metadata_symbols) if elected else None
+            if symbols:
+                await run_in_threadpool(refresh_symbol_metadata, symbols)
+        except Exception as e:
+            print(f"Background metadata refresh failed: {e}")
+        await asyncio.sleep(METADATA_REFRESH_INTERVAL)
+
+@app.on_event("startup")
+async def start_metadata_refresher():
+    asyncio.create_task(refresh_metadata_forever())
+
+# --- Tax lot engine ---
+LOT_METHOD = os.environ.get("LOT_METHOD", lots.FIFO).lower()
+LONG_TERM_DAYS = int(os.environ.get("LONG_TERM_DAYS", "365"))
+_lot_books = {}  # portfolio_id -> {method: LotBook}
+_lot_generation = {}  # portfolio_id -> shared "ledger_generation:<id>" counter its books were built at
+_lot_locks = {}  # portfolio_id -> lock held while its books are replayed or read
+
+def ledger_generation_counter(portfolio_id):
+    return f"ledger_generation:{portfolio_id}"
+
+def lot_lock(portfolio_id):
+    # One lock per portfolio, so replaying one ledger never blocks reads of another
+    return _lot_locks.setdefault(portfolio_id, threading.Lock())
+
+def reset_lot_books(portfolio_id):
+    # Existing ledger rows changed, so the next read (in any worker) replays the ledger from the start
+    shared.increment(ledger_generation_counter(portfolio_id))
+    with lot_lock(portfolio_id):
+        _lot_books.pop(portfolio_id, None)
+
+def get_lot_book(db, portfolio_id, method=None):
+    """Lot book of a portfolio for `method`, brought up to date with any transactions added since the last call."""
+    method = (method or LOT_METHOD).lower()
+    if method not in lots.METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown lot method. Use one of: {', '.join(lots.METHODS)}")
+    generation = shared.counter(ledger_generation_counter(portfolio_id))[0]
+    with lot_lock(portfolio_id):
+        if _lot_generation.get(portfolio_id) != generation:
+            _lot_books.pop(portfolio_id, None)
+            _lot_generation[portfolio_id] = generation
+        books = _lot_books.setdefault(portfolio_id, {})
+        book = books.get(method)
+        if book is None:
+            book = books[method] = lots.LotBook(method, LONG_TERM_DAYS)
+        rows = db.query(
+            TransactionDB.id, TransactionDB.datetime, TransactionDB.trade_date, TransactionDB.action,
+            TransactionDB.symbol, TransactionDB.quantity, TransactionDB.price
+        ).filter(TransactionDB.portfolio_id == portfolio_id, TransactionDB.id > book.last_tx_id).order_by(TransactionDB.id).all()
+        if rows:
+            selections = {}
+            for sel in db.query(LotSelectionDB).filter(
+                    LotSelectionDB.portfolio_id == portfolio_id, LotSelectionDB.sell_tx_id > book.last_tx_id).order_by(LotSelectionDB.id):
+                selections.setdefault(sel.sell_tx_id, []).append((sel.lot_id, sel.quantity))
+            for row in rows:
+                book.apply(row.id, row.trade_date or row.datetime, row.action, row.symbol, row.quantity, row.price, selections.get(row.id))
+        return book
+
+def parse_lot_ids(lot_ids):
+    # "12,15:2.5" -> [(12, None), (15, 2.5)]
+    selections = []
+    if not lot_ids:
+        return selections
+    try:
+        for part in lot_ids.split(','):
+            if not part.strip():
+                continue
+            lot_id, _, qty = part.partition(':')
+            selections.append((int(lot_id), float(qty) if qty else None))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="lot_ids must look like '12,15:2.5'.")
+    return selections
+
+def available_row(db, portfolio_id):
+    """Cash balance row of a portfolio, created at zero on its first trade."""
+    available = db.query(AvailableDB).filter(AvailableDB.portfolio_id == portfolio_id).first()
+    if available is None:
+        available = AvailableDB(portfolio_id=portfolio_id, amount=0)
+        db.add(available)
+    return available
+
+def record_lot_selections(db, tx, matches):
+    db.flush()
+    for lot, qty in matches:
+        db.add(LotSelectionDB(portfolio_id=tx.portfolio_id, sell_tx_id=tx.id, lot_id=lot.lot_id, quantity=qty))
 
 @app.post("/portfolio/add")
-def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(False)):
+def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(False),
+              portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     symbol = asset.symbol.strip()
     asset_type = asset.asset_type.lower()
     precision = asset.precision if asset.precision is not None else get_precision(asset_type)
@@ -315,7 +932,7 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
     buy_price = round_decimal(asset.buy_price, 4) if asset.buy_price is not None else 0
     buy_date = asset.buy_date or datetime.utcnow().isoformat()
     last_updated = datetime.utcnow().isoformat()
-    db_asset = db.query(AssetDB).filter(AssetDB.symbol == symbol).first()
+    db_asset = db.query(AssetDB).filter(AssetDB.portfolio_id == portfolio_id, AssetDB.symbol == symbol).first()
     name = None
     final_sector = asset.sector
     final_industry = asset.industry
@@ -326,28 +943,26 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
             mf = find_mf_by_name(asset.symbol)
         if mf:
             name = mf['Scheme Name']
-            classification = classify_mutual_fund(name)
-            final_sector = classification.get('sector')
-            final_industry = classification.get('industry')
-            nav = float(mf['Net Asset Value']) if mf['Net Asset Value'] else None
+            # Sector/Industry are classified for the whole AMFI file when it loads
+            final_sector = mf['Sector']
+            final_industry = mf['Industry']
+            nav = find_mf_nav(mf['Scheme Code'])
             if not buy_price:
                 buy_price = nav
         else:
             raise HTTPException(status_code=404, detail="Mutual fund not found in AMFI list.")
     else:
-        yf_name = None
         if not db_asset:
+            # A symbol seen before is a pure database write; only unknown ones go upstream
             try:
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
-                yf_name = info.get('longName') or info.get('shortName') or info.get('name') or None
+                meta = get_symbol_metadata(symbol)
+                name = meta['name'] if meta else None
             except Exception:
-                yf_name = None
-        name = yf_name
+                name = None
     if not buy_price:
         buy_price = round_decimal(asset.buy_price, 4)
     # --- Transaction and available amount logic ---
-    available = db.query(AvailableDB).first()
+    available = available_row(db, portfolio_id)
     available_amount = available.amount if available else 0
     tx_action = None
     tx_qty = qty
@@ -368,6 +983,7 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
                 tx_value = db_asset.quantity * db_asset.buy_price
                 tx_balance_after = available_amount
                 db.add(TransactionDB(
+                    portfolio_id=portfolio_id,
                     datetime=datetime.now().isoformat(),
                     action=tx_action,
                     symbol=symbol,
@@ -397,6 +1013,7 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
                 tx_value = db_asset.quantity * db_asset.buy_price
                 tx_balance_after = available_amount
                 db.add(TransactionDB(
+                    portfolio_id=portfolio_id,
                     datetime=datetime.now().isoformat(),
                     action=tx_action,
                     symbol=symbol,
@@ -423,6 +1040,7 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
         if qty < 1e-6:
             raise HTTPException(status_code=400, detail="Quantity must be greater than zero.")
         db_asset = AssetDB(
+            portfolio_id=portfolio_id,
             symbol=symbol,
             asset_type=asset_type,
             quantity=qty,
@@ -455,6 +1073,7 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
     # Record transaction if action is set
     if tx_action:
         db.add(TransactionDB(
+            portfolio_id=portfolio_id,
             datetime=datetime.now().isoformat(),
             action=tx_action,
             symbol=symbol,
@@ -465,18 +1084,20 @@ def add_asset(asset: Asset, db: Session = Depends(get_db), edit: bool = Query(Fa
             value=tx_value,
             pl=tx_pl,
             notes=tx_notes,
-            balance_after=tx_balance_after
+            balance_after=tx_balance_after,
+            trade_date=asset.buy_date if tx_action == "BUY" else None
         ))
     db.commit()
     return {"message": f"Added/updated {symbol} in portfolio.", "asset_type": asset_type}
 
 @app.post("/portfolio/remove")
-def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_db)):
+def remove_asset(symbol: str, quantity: float = None, lot_ids: str = Query(None), db: Session = Depends(get_db),
+                 portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     symbol = symbol.upper()
-    db_asset = db.query(AssetDB).filter(AssetDB.symbol == symbol).first()
+    db_asset = db.query(AssetDB).filter(AssetDB.portfolio_id == portfolio_id, AssetDB.symbol == symbol).first()
     if not db_asset:
         raise HTTPException(status_code=404, detail="Asset not found in portfolio.")
-    available = db.query(AvailableDB).first()
+    available = available_row(db, portfolio_id)
     available_amount = available.amount if available else 0
     if quantity is None:
         # Full delete
@@ -490,6 +1111,7 @@ def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_
         db.commit()
         tx_balance_after = available_amount
         db.add(TransactionDB(
+            portfolio_id=portfolio_id,
             datetime=datetime.now().isoformat(),
             action=tx_action,
             symbol=symbol,
@@ -511,18 +1133,23 @@ def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_
     # Calculate profit/loss for this sale
     sell_price = None
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        sell_price = info.get('regularMarketPrice')
+        market = providers.get_provider()
+        sell_price = market.info(symbol).get('regularMarketPrice')
         if sell_price is None:
-            data = ticker.history(period="1d")
-            if not data.empty:
-                sell_price = float(data['Close'].iloc[-1])
+            sell_price = market.last_close(symbol)
     except Exception:
         sell_price = db_asset.buy_price
     if sell_price is None:
         sell_price = db_asset.buy_price
-    pl = (sell_price - db_asset.buy_price) * quantity
+    # Realized P&L against the matched tax lots; anything the ledger can't cover uses the average cost
+    selections = parse_lot_ids(lot_ids)
+    book = get_lot_book(db, portfolio_id)
+    with lot_lock(portfolio_id):
+        try:
+            matches, unmatched = book.match(symbol, quantity, selections, strict=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    pl = sum((sell_price - lot.price) * qty for lot, qty in matches) + (sell_price - db_asset.buy_price) * unmatched
     # Update available amount for sell
     if available:
         available.amount += sell_price * quantity
@@ -533,7 +1160,8 @@ def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_
         db.delete(db_asset)
         db.commit()
         tx_action = "SELL"
-        db.add(TransactionDB(
+        tx = TransactionDB(
+            portfolio_id=portfolio_id,
             datetime=datetime.now().isoformat(),
             action=tx_action,
             symbol=symbol,
@@ -545,13 +1173,17 @@ def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_
             pl=pl,
             notes="Sold all",
             balance_after=tx_balance_after
-        ))
+        )
+        db.add(tx)
+        if selections:
+            record_lot_selections(db, tx, matches)
         db.commit()
         return {"message": f"Removed {symbol} from portfolio (sold all)."}
     db_asset.quantity = new_quantity
     db.commit()
     tx_action = "SELL"
-    db.add(TransactionDB(
+    tx = TransactionDB(
+        portfolio_id=portfolio_id,
         datetime=datetime.now().isoformat(),
         action=tx_action,
         symbol=symbol,
@@ -563,421 +1195,693 @@ def remove_asset(symbol: str, quantity: float = None, db: Session = Depends(get_
         pl=pl,
         notes="Partial sell",
         balance_after=tx_balance_after
-    ))
+    )
+    db.add(tx)
+    if selections:
+        record_lot_selections(db, tx, matches)
     db.commit()
     return {"message": f"Sold {quantity} of {symbol}. Remaining: {new_quantity}"}
 
-@app.get("/portfolio")
-def get_portfolio(db: Session = Depends(get_db)):
-    result = []
-    total_value = 0.0
-    total_cost = 0.0
-    assets = db.query(AssetDB).all()
+def position_row(asset, quantity, buy_price, current_price, current_value, profit_loss):
+    return {
+        'symbol': asset.symbol,
+        'name': asset.name,
+        'asset_type': asset.asset_type,
+        'quantity': quantity,
+        'buy_price': buy_price,
+        'current_price': current_price,
+        'current_value': current_value,
+        'profit_loss': profit_loss,
+        'currency': asset.currency,
+        'buy_date': asset.buy_date,
+        'exchange': asset.exchange,
+        'sector': asset.sector,
+        'industry': asset.industry,
+        'notes': asset.notes,
+        'precision': asset.precision,
+        'last_updated': asset.last_updated,
+        'icon': asset.icon,
+        'fund_house': asset.fund_house,
+        'manager': asset.manager,
+        'expense_ratio': asset.expense_ratio,
+        'maturity_date': asset.maturity_date,
+        'interest_rate': asset.interest_rate,
+        'purity': asset.purity,
+        'storage': asset.storage
+    }
+
+def build_position(asset, price):
+    """Response row and cost basis for one holding, for rows streamed as they are priced."""
+    if price is None:
+        price = asset.buy_price
+    precision = asset_precision(asset)
+    value = round_decimal(price * asset.quantity, precision)
+    cost = round_decimal(asset.buy_price * asset.quantity, precision)
+    return position_row(asset, round_decimal(asset.quantity, precision), round_decimal(asset.buy_price, 4),
+                        round_decimal(price, 4) if price else None, value, round_decimal(value - cost, 2)), cost
+
+def value_positions(assets, prices):
+    """Rows and cost bases for all holdings at once; rounds exactly like build_position."""
+    figures = valuation.value_holdings(
+        [asset.quantity for asset in assets],
+        [asset.buy_price for asset in assets],
+        [float('nan') if price is None else price for price in prices],
+        [asset_precision(asset) for asset in assets],
+    )
+    columns = {name: column.tolist() for name, column in figures.items()}
+    rows = [
+        position_row(asset, quantity, buy_price, current_price if priced else None, value, profit_loss)
+        for asset, quantity, buy_price, current_price, priced, value, profit_loss in zip(
+            assets, columns['quantity'], columns['buy_price'], columns['current_price'], columns['priced'],
+            columns['current_value'], columns['profit_loss'])
+    ]
+    return rows, columns['cost']
+
+def assemble_snapshot(rows, costs):
+    return {
+        'portfolio': rows,
+        'costs': costs,
+        **valuation.totals([row['current_value'] for row in rows], costs),
+    }
+
+def portfolio_assets(db, portfolio_id):
+    return db.query(AssetDB).filter(AssetDB.portfolio_id == portfolio_id).order_by(AssetDB.id).all()
+
+def build_portfolio_snapshot(db, portfolio_id):
+    assets = portfolio_assets(db, portfolio_id)
+    prices = [None] * len(assets)
+    for index, asset, price in price_assets(assets):
+        prices[index] = price
+    return assemble_snapshot(*value_positions(assets, prices))
+
+def snapshot_lock(portfolio_id):
+    # setdefault is atomic, so concurrent first requests for a portfolio share one lock
+    return _snapshot_locks.setdefault(portfolio_id, threading.Lock())
+
+def fresh_snapshot(portfolio_id):
+    snapshot = _snapshot_cache.get(portfolio_id)
+    if snapshot is not None and snapshot["version"] == current_data_version(portfolio_id) and \
+            snapshot["timestamp"] > datetime.now() - timedelta(seconds=PRICE_TTL):
+        return snapshot
+    return None
+
+def store_snapshot(portfolio_id, snapshot, version):
+    # Caller holds the portfolio's snapshot_lock
+    previous = _snapshot_cache.get(portfolio_id)
+    snapshot["version"] = version
+    snapshot["timestamp"] = datetime.now()
+    snapshot["summaries"] = {}
+    # Keep the previous price stamp when re-pricing changed nothing, so ETags stay valid
+    if previous is not None and previous["portfolio"] == snapshot["portfolio"]:
+        snapshot["priced_at"] = previous["priced_at"]
+    else:
+        snapshot["priced_at"] = int(snapshot["timestamp"].timestamp() * 1000)
+        publish_price_deltas(portfolio_id, previous, snapshot)
+    _snapshot_cache[portfolio_id] = snapshot
+    return snapshot
+
+def get_portfolio_snapshot(db, portfolio_id):
+    """Priced holdings of a portfolio, reused until a write bumps its data version or PRICE_TTL passes."""
+    with snapshot_lock(portfolio_id):
+        snapshot = fresh_snapshot(portfolio_id)
+        if snapshot is not None:
+            return snapshot
+        version = current_data_version(portfolio_id)
+        return store_snapshot(portfolio_id, build_portfolio_snapshot(db, portfolio_id), version)
+
+def refresh_portfolio_snapshot(portfolio_id):
+    db = SessionLocal()
+    try:
+        return get_portfolio_snapshot(db, portfolio_id)
+    finally:
+        db.close()
+
+def price_key(asset):
+    # Fund NAVs and market quotes are separate namespaces
+    return (asset.asset_type == "mutual_fund", asset.symbol)
+
+def price_distinct(assets):
+    """{price_key: price} for `assets`, pricing each distinct symbol once however many portfolios hold it."""
+    distinct = {}
     for asset in assets:
-        price = None
-        # --- Mutual Fund logic ---
-        if asset.asset_type == "mutual_fund":
-            mf = find_mf_by_code(asset.symbol)
-            if mf and pd.notnull(mf['Net Asset Value']):
-                price = float(mf['Net Asset Value'])
+        distinct.setdefault(price_key(asset), asset)
+    keys = list(distinct)
+    prices = {}
+    for index, asset, price in price_assets(list(distinct.values())):
+        prices[keys[index]] = price
+    return prices
+
+def refresh_portfolio_snapshots(portfolio_ids=None):
+    """Re-price many portfolios (all of them by default) in one pass: every distinct symbol is priced
+    once, then each portfolio's snapshot is rebuilt from those prices. Returns the number rebuilt."""
+    db = SessionLocal()
+    try:
+        if portfolio_ids is None:
+            portfolio_ids = [pid for (pid,) in db.query(AssetDB.portfolio_id).distinct()]
+        # Versions first: a write that lands while we price leaves the new snapshots stale, not wrong
+        versions = {pid: current_data_version(pid) for pid in portfolio_ids}
+        holdings = {pid: [] for pid in portfolio_ids}
+        for part in shared_cache.chunks(portfolio_ids):
+            for asset in db.query(AssetDB).filter(AssetDB.portfolio_id.in_(part)).order_by(AssetDB.id):
+                holdings[asset.portfolio_id].append(asset)
+    finally:
+        db.close()
+    prices = price_distinct([asset for assets in holdings.values() for asset in assets])
+    for pid, assets in holdings.items():
+        snapshot = assemble_snapshot(*value_positions(assets, [prices[price_key(asset)] for asset in assets]))
+        with snapshot_lock(pid):
+            current = _snapshot_cache.get(pid)
+            # A request may have priced a newer version meanwhile
+            if current is None or current["version"] <= versions[pid]:
+                store_snapshot(pid, snapshot, versions[pid])
+    return len(holdings)
+
+# --- Live price stream ---
+price_hub = stream.PriceHub()
+STREAM_FIELDS = ('symbol', 'quantity', 'current_price', 'current_value', 'profit_loss')
+
+def snapshot_totals(snapshot):
+    return {k: snapshot[k] for k in ('total_value', 'total_cost', 'total_profit_loss')}
+
+def stream_position(row):
+    return {f: row[f] for f in STREAM_FIELDS}
+
+def publish_price_deltas(portfolio_id, previous, snapshot):
+    """Push positions whose price, value or quantity changed since `previous` to the portfolio's subscribers."""
+    if not len(price_hub):
+        return
+    before = {row['symbol']: row for row in previous['portfolio']} if previous else {}
+    deltas = []
+    for row in snapshot['portfolio']:
+        old = before.pop(row['symbol'], None)
+        if old is None or any(old[f] != row[f] for f in STREAM_FIELDS):
+            deltas.append(stream_position(row))
+    deltas.extend({'symbol': symbol, 'removed': True} for symbol in before)
+    price_hub.publish(deltas, snapshot_totals(snapshot), portfolio_id)
+
+async def refresh_prices_forever():
+    # Re-price once per PRICE_TTL while anyone is listening; one refresh serves every subscriber
+    # of every portfolio, with each symbol fetched once
+    while True:
+        await asyncio.sleep(PRICE_TTL)
+        if not len(price_hub):
+            continue
+        try:
+            await run_in_threadpool(refresh_portfolio_snapshots, price_hub.portfolios())
+        except Exception as e:
+            print(f"Background price refresh failed: {e}")
+
+@app.on_event("startup")
+async def start_price_refresher():
+    asyncio.create_task(refresh_prices_forever())
+
+# --- Warm-up and readiness ---
+# The server answers as soon as the schema is checked; caches fill in the background
+WARMUP = os.environ.get("WARMUP", "1") != "0"
+WARM_FX_BASE = os.environ.get("WARM_FX_BASE", "INR").upper()  # the frontend's default display currency
+_started_at = time.time()
+_warmup = {"pending": set(), "timings_ms": {}, "errors": {}}
+
+def warm_amfi():
+    get_amfi_data()
+
+def warm_fx():
+    db = SessionLocal()
+    try:
+        currencies = {c for (c,) in db.query(AssetDB.currency).distinct() if c}
+    finally:
+        db.close()
+    for currency in currencies:
+        try:
+            get_fx_rate(currency, WARM_FX_BASE)
+        except HTTPException:
+            pass
+
+def warm_prices():
+    refresh_portfolio_snapshots()
+
+WARM_TASKS = {"amfi": warm_amfi, "fx": warm_fx, "prices": warm_prices}
+
+async def run_warmup(name, task):
+    start = time.perf_counter()
+    try:
+        await run_in_threadpool(task)
+    except Exception as e:
+        _warmup["errors"][name] = str(e)
+        print(f"Warm-up of {name} failed: {e}")
+    finally:
+        _warmup["timings_ms"][name] = round((time.perf_counter() - start) * 1000, 3)
+        _warmup["pending"].discard(name)
+
+@app.on_event("startup")
+async def start_warmup():
+    if not WARMUP:
+        return
+    _warmup["timings_ms"].clear()
+    _warmup["errors"].clear()
+    _warmup["pending"].update(WARM_TASKS)
+    for name, task in WARM_TASKS.items():
+        asyncio.create_task(run_warmup(name, task))
+
+def priced_portfolios():
+    """Portfolios priced within PRICE_TTL (without checking their data version, which costs a read each)."""
+    cutoff = datetime.now() - timedelta(seconds=PRICE_TTL)
+    return sum(1 for snapshot in list(_snapshot_cache.values()) if snapshot["timestamp"] > cutoff)
+
+@app.get("/ready")
+def readiness():
+    """Which caches are warm; `status` is `ready` once every warm-up task has finished."""
+    return {
+        "status": "warming" if _warmup["pending"] else "ready",
+        "uptime_s": round(time.time() - _started_at, 3),
+        "caches": {
+            "amfi": amfi_is_fresh(),
+            "fx_pairs": len(_fx_cache),
+            "prices": priced_portfolios(),
+            "quotes": len(_quote_cache),
+            "symbol_metadata": len(_metadata_cache),
+        },
+        "warmup_ms": dict(_warmup["timings_ms"]),
+        "warmup_errors": dict(_warmup["errors"]),
+    }
+
+@app.get("/stream/prices")
+async def stream_prices(request: Request, symbols: str = Query(None), portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    """Server-Sent Events: `hello` with the client id, then `prices` events with changed positions and totals."""
+    wanted = [s.strip() for s in symbols.split(',') if s.strip()] if symbols else None
+    # Subscribed before the snapshot is read so no update in between is missed
+    sub = price_hub.subscribe(wanted, portfolio_id)
+    try:
+        snapshot = _snapshot_cache.get(portfolio_id)
+        if snapshot is None:
+            snapshot = await run_in_threadpool(refresh_portfolio_snapshot, portfolio_id)
+        price_hub.prime(sub, [stream_position(row) for row in snapshot['portfolio']], snapshot_totals(snapshot))
+    except BaseException:
+        # No stream will start, so nothing else would remove the subscriber (and stop the re-pricer)
+        price_hub.unsubscribe(sub)
+        raise
+
+    async def events():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'client_id': sub.client_id})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    await asyncio.wait_for(sub.event.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                message = price_hub.drain(sub)
+                if message:
+                    yield message
+        finally:
+            price_hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/stream/prices/{client_id}/symbols")
+def set_stream_symbols(client_id: str, symbols: List[str] = Body(...)):
+    """Change the symbols a stream of this worker follows. With several workers the request may reach
+    another one and get a 404; such clients change their symbols by reconnecting with `?symbols=`."""
+    # An empty list follows every symbol again
+    if not price_hub.set_symbols(client_id, [s.strip() for s in symbols if s.strip()]):
+        raise HTTPException(status_code=404, detail="Stream client not found")
+    return {"client_id": client_id, "symbols": symbols}
+
+def snapshot_etag(portfolio_id, snapshot):
+    return f'W/"p{data_epoch(portfolio_id)}.{portfolio_id}.{snapshot["version"]}-{snapshot["priced_at"]}"'
+
+def data_etag(portfolio_id):
+    version = current_data_version(portfolio_id)
+    return f'W/"d{data_epoch(portfolio_id)}.{portfolio_id}.{version}"'
+
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match holds `*` or a list of entity tags; it matches on weak comparison (W/ ignored)."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(tag == "*" or tag.removeprefix("W/") == opaque for tag in ENTITY_TAG.findall(if_none_match))
+
+def not_modified(request, etag):
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def etag_json(content, etag):
+    # Pre-encoded bodies (bytes) are sent as they are
+    if isinstance(content, bytes):
+        return Response(content, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return TimedJSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def ndjson_line(record):
+    return orjson.dumps(record) + b'\n'
+
+def stream_portfolio(snapshot=None, assets=None, version=None, portfolio_id=DEFAULT_PORTFOLIO):
+    """NDJSON lines: one per position as soon as it is priced, then a totals record."""
+    if snapshot is not None:
+        for row in snapshot['portfolio']:
+            yield ndjson_line({'type': 'position', **row})
+        yield ndjson_line({'type': 'totals', **snapshot_totals(snapshot)})
+        return
+    rows = [None] * len(assets)
+    costs = [None] * len(assets)
+    for index, asset, price in price_assets(assets):
+        rows[index], costs[index] = build_position(asset, price)
+        yield ndjson_line({'type': 'position', **rows[index]})
+    snapshot = assemble_snapshot(rows, costs)
+    yield ndjson_line({'type': 'totals', **snapshot_totals(snapshot)})
+    with snapshot_lock(portfolio_id):
+        if current_data_version(portfolio_id) == version:
+            store_snapshot(portfolio_id, snapshot, version)
+
+@app.get("/portfolio")
+def get_portfolio(request: Request, stream: bool = Query(False), db: Session = Depends(get_db),
+                  portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    snapshot = fresh_snapshot(portfolio_id)
+    CACHE_REQUESTS.inc(cache="snapshot", result="hit" if snapshot is not None else "miss")
+    if stream:
+        if snapshot is not None:
+            lines = stream_portfolio(snapshot)
         else:
+            version = current_data_version(portfolio_id)
+            lines = stream_portfolio(assets=portfolio_assets(db, portfolio_id), version=version, portfolio_id=portfolio_id)
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+    # A live snapshot answers revalidations without touching the database or upstreams
+    if snapshot is None:
+        snapshot = get_portfolio_snapshot(db, portfolio_id)
+    etag = snapshot_etag(portfolio_id, snapshot)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # Encoded once per snapshot; every other request for it reuses the bytes
+    body = snapshot.get('body')
+    if body is None:
+        body = snapshot['body'] = json_bytes({
+            'portfolio': snapshot['portfolio'],
+            'total_value': snapshot['total_value'],
+            'total_cost': snapshot['total_cost'],
+            'total_profit_loss': snapshot['total_profit_loss']
+        })
+    return etag_json(body, etag)
+
+SUMMARY_GROUPS = ('symbol', 'sector', 'industry', 'asset_type', 'currency', 'exchange')
+
+@app.get("/portfolio/summary")
+def get_portfolio_summary(group_by: str = Query("sector"), base_currency: str = Query(None), db: Session = Depends(get_db),
+                          portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    if group_by not in SUMMARY_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(SUMMARY_GROUPS)}")
+    snapshot = get_portfolio_snapshot(db, portfolio_id)
+    key = (group_by, base_currency.upper() if base_currency else None)
+    cached = snapshot["summaries"].get(key)
+    CACHE_REQUESTS.inc(cache="summary", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        return cached
+    rows = snapshot['portfolio']
+    # One FX lookup per distinct currency, not per holding
+    rates = {}
+    if base_currency:
+        for cur in {row['currency'] for row in rows}:
             try:
-                ticker = yf.Ticker(asset.symbol)
-                info = ticker.info
-                # Try live price first
-                price = info.get('regularMarketPrice')
-                if price is None:
-                    data = ticker.history(period="1d")
-                    if not data.empty:
-                        price = float(data['Close'].iloc[-1])
+                rates[cur] = get_fx_rate(cur or key[1], key[1])['rate']
             except Exception:
-                price = None
-        if price is None:
-            price = asset.buy_price
-        value = round_decimal(price * asset.quantity, asset.precision)
-        cost = round_decimal(asset.buy_price * asset.quantity, asset.precision)
+                rates[cur] = 1.0
+    groups = {}
+    total_value = 0.0
+    for row, cost in zip(rows, snapshot['costs']):
+        rate = rates.get(row['currency'], 1.0)
+        value = row['current_value'] * rate
+        cost = cost * rate
         total_value += value
-        total_cost += cost
-        result.append({
-            'symbol': asset.symbol,
-            'name': asset.name,
-            'asset_type': asset.asset_type,
-            'quantity': round_decimal(asset.quantity, asset.precision),
-            'buy_price': round_decimal(asset.buy_price, 4),
-            'current_price': round_decimal(price, 4) if price else None,
-            'current_value': value,
-            'profit_loss': round_decimal(value - cost, 2),
-            'currency': asset.currency,
-            'buy_date': asset.buy_date,
-            'exchange': asset.exchange,
-            'sector': asset.sector,
-            'industry': asset.industry,
-            'notes': asset.notes,
-            'precision': asset.precision,
-            'last_updated': asset.last_updated,
-            'icon': asset.icon,
-            'fund_house': asset.fund_house,
-            'manager': asset.manager,
-            'expense_ratio': asset.expense_ratio,
-            'maturity_date': asset.maturity_date,
-            'interest_rate': asset.interest_rate,
-            'purity': asset.purity,
-            'storage': asset.storage
-        })
-    return {
-        'portfolio': result,
+        group = groups.get(row[group_by] or 'Other')
+        if group is None:
+            group = groups[row[group_by] or 'Other'] = [0.0, 0.0, 0]
+        group[0] += value
+        group[1] += cost
+        group[2] += 1
+    summary = {
+        'group_by': group_by,
+        'base_currency': key[1],
         'total_value': round_decimal(total_value, 2),
-        'total_cost': round_decimal(total_cost, 2),
-        'total_profit_loss': round_decimal(total_value - total_cost, 2)
+        'groups': [
+            {
+                'key': name,
+                'value': round_decimal(value, 2),
+                'cost': round_decimal(cost, 2),
+                'profit_loss': round_decimal(value - cost, 2),
+                'weight': round_decimal(value / total_value, 6) if total_value else 0.0,
+                'count': count,
+            }
+            for name, (value, cost, count) in sorted(groups.items(), key=lambda g: -g[1][0])
+        ],
     }
+    snapshot["summaries"][key] = summary
+    return summary
 
 # --- Exchange inference helper ---
+# Yahoo ticker suffix -> exchange. Every suffix is a single dot segment, so a symbol's
+# exchange is one dict lookup on the text after its last dot.
+EXCHANGE_SUFFIXES = {
+    '.NS': 'NSE', '.BSE': 'BSE', '.BO': 'BSE', '.NSE': 'NSE', '.MCX': 'MCX', '.NFO': 'NSE', '.CDS': 'NSE', '.BFO': 'BSE',
+    '.AX': 'ASX', '.L': 'LSE', '.TO': 'TSX', '.V': 'TSXV', '.HE': 'OMXH', '.ST': 'OMX', '.CO': 'OMXC', '.OL': 'OSE', '.MI': 'Borsa Italiana', '.VI': 'VIE', '.NZ': 'NZX', '.JK': 'IDX', '.IS': 'BIST', '.TA': 'TASE', '.IR': 'TASE', '.CA': 'CSE', '.PL': 'WSE', '.SG': 'SGX', '.TW': 'TWSE', '.TWO': 'TPEX', '.BK': 'SET', '.JO': 'JSE', '.IL': 'TASE', '.IC': 'ICE', '.AT': 'ATHEX', '.BR': 'Euronext', '.LS': 'Euronext', '.AS': 'Euronext', '.DU': 'XETRA', '.DE': 'XETRA', '.BE': 'XETRA', '.MU': 'XETRA', '.XETRA': 'XETRA', '.SR': 'Tadawul', '.QA': 'QE', '.OM': 'MSM', '.KW': 'Boursa Kuwait', '.AE': 'ADX', '.AD': 'ADX', '.SM': 'BME', '.MC': 'BME', '.PA': 'Euronext', '.F': 'Frankfurt', '.SA': 'B3', '.MX': 'BMV', '.HK': 'HKEX', '.SH': 'SSE', '.SZ': 'SZSE', '.SS': 'SSE', '.BINANCE': 'Binance', '.COIN': 'Coinbase', '.KRAKEN': 'Kraken', '.KRX': 'KRX', '.KOSDAQ': 'KOSDAQ', '.KOSPI': 'KRX', '.AMC': 'AMC Mutual Fund',
+}
+
 def infer_exchange(symbol, fallback=None):
-    suffix_map = {
-        '.NS': 'NSE', '.BSE': 'BSE', '.BO': 'BSE', '.NSE': 'NSE', '.MCX': 'MCX', '.NFO': 'NSE', '.CDS': 'NSE', '.BFO': 'BSE',
-        '.AX': 'ASX', '.L': 'LSE', '.TO': 'TSX', '.V': 'TSXV', '.HE': 'OMXH', '.ST': 'OMX', '.CO': 'OMXC', '.OL': 'OSE', '.MI': 'Borsa Italiana', '.VI': 'VIE', '.NZ': 'NZX', '.JK': 'IDX', '.IS': 'BIST', '.TA': 'TASE', '.IR': 'TASE', '.CA': 'CSE', '.PL': 'WSE', '.SG': 'SGX', '.TW': 'TWSE', '.TWO': 'TPEX', '.BK': 'SET', '.JO': 'JSE', '.IL': 'TASE', '.IC': 'ICE', '.AT': 'ATHEX', '.BR': 'Euronext', '.LS': 'Euronext', '.AS': 'Euronext', '.DU': 'XETRA', '.DE': 'XETRA', '.BE': 'XETRA', '.MU': 'XETRA', '.XETRA': 'XETRA', '.SR': 'Tadawul', '.QA': 'QE', '.OM': 'MSM', '.KW': 'Boursa Kuwait', '.AE': 'ADX', '.AD': 'ADX', '.SM': 'BME', '.MC': 'BME', '.PA': 'Euronext', '.F': 'Frankfurt', '.SA': 'B3', '.MX': 'BMV', '.HK': 'HKEX', '.SH': 'SSE', '.SZ': 'SZSE', '.SS': 'SSE', '.BINANCE': 'Binance', '.COIN': 'Coinbase', '.KRAKEN': 'Kraken', '.KRX': 'KRX', '.KOSDAQ': 'KOSDAQ', '.KOSPI': 'KRX', '.AMC': 'AMC Mutual Fund',
-    }
-    for suf, exch in suffix_map.items():
-        if symbol.upper().endswith(suf):
-            return exch
-    return fallback or 'Unknown'
+    dot = symbol.rfind('.')
+    exchange = EXCHANGE_SUFFIXES.get(symbol[dot:].upper()) if dot >= 0 else None
+    return exchange or fallback or 'Unknown'
 
 @app.get("/price/{symbol}")
 def get_price(symbol: str):
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        # Try live price first
-        price = info.get('regularMarketPrice')
-        data = None
-        if price is None:
-            data = ticker.history(period="1d")
-            if not data.empty:
-                price = float(data['Close'].iloc[-1])
+        market = providers.get_provider()
+        meta = cached_symbol_metadata(symbol)
+        price = None
+        if meta is not None:
+            # Static fields are cached, so only the live price is needed
+            price = quote_symbol(symbol)
         if price is None:
-            # Try to get quoteType for better error handling
-            quote_type = None
-            try:
-                quote_type = info.get('quoteType') if info else None
-            except Exception:
-                quote_type = None
-            name = info.get('longName') if info else symbol
-            description = info.get('longBusinessSummary') if info else ''
-            if quote_type == 'CRYPTOCURRENCY':
-                coin_name = info.get('name') or name or symbol
-                return {
-                    "symbol": symbol,
-                    "price": None,
-                    "currency": info.get('currency') if info else 'USD',
-                    "name": name,
-                    "sector": "Cryptocurrency",
-                    "industry": coin_name,
-                    "marketCap": info.get('marketCap') if info else None,
-                    "exchange": info.get('exchange') or infer_exchange(symbol),
-                    "website": info.get('website') if info else None,
-                    "description": description,
-                    "info_available": bool(info)
-                }
-            elif quote_type == 'ETF':
-                # Infer sector/industry from name/description
-                sector = 'ETF'
-                industry = 'N/A'
-                desc = (name or '') + ' ' + (description or '')
-                desc_lower = desc.lower()
-                if 'bitcoin' in desc_lower:
-                    sector = 'Digital Assets'
-                    industry = 'Bitcoin ETF'
-                elif 'gold' in desc_lower:
-                    sector = 'Commodity'
-                    industry = 'Gold ETF'
-                else:
-                    # Keyword-based industry inference
-                    etf_industries = [
-                        (['technology', 'tech'], 'Technology ETF'),
-                        (['healthcare', 'health care', 'pharma', 'biotech'], 'Healthcare ETF'),
-                        (['energy', 'oil', 'gas'], 'Energy ETF'),
-                        (['financial', 'bank', 'finance', 'insurance'], 'Financial ETF'),
-                        (['consumer', 'retail', 'staple', 'discretionary'], 'Consumer ETF'),
-                        (['industrial', 'manufacturing', 'industry'], 'Industrial ETF'),
-                        (['real estate', 'reit'], 'Real Estate ETF'),
-                        (['utilities', 'utility'], 'Utilities ETF'),
-                        (['materials', 'mining', 'chemical'], 'Materials ETF'),
-                        (['communication', 'media', 'telecom'], 'Communication ETF'),
-                        (['infrastructure'], 'Infrastructure ETF'),
-                        (['dividend'], 'Dividend ETF'),
-                        (['bond', 'fixed income', 'debt'], 'Bond ETF'),
-                        (['emerging market'], 'Emerging Market ETF'),
-                    ]
-                    for keywords, label in etf_industries:
-                        if any(k in desc_lower for k in keywords):
-                            industry = label
-                            break
-                return {
-                    "symbol": symbol,
-                    "price": None,
-                    "currency": info.get('currency') if info else 'USD',
-                    "name": name,
-                    "sector": sector,
-                    "industry": industry,
-                    "marketCap": info.get('marketCap') if info else None,
-                    "exchange": info.get('exchange') or infer_exchange(symbol),
-                    "website": info.get('website') if info else None,
-                    "description": description,
-                    "info_available": bool(info)
-                }
-            else:
-                raise HTTPException(status_code=404, detail="Symbol not found or no price data.")
-        # Determine asset type for defaults
-        quote_type = None
-        try:
-            quote_type = info.get('quoteType') if info else None
-        except Exception:
-            quote_type = None
-        name = info.get('longName') if info else symbol
-        description = info.get('longBusinessSummary') if info else ''
-        sector = info.get('sector') if info and info.get('sector') else None
-        industry = info.get('industry') if info and info.get('industry') else None
-        if quote_type == 'ETF':
-            # Infer sector/industry from name/description
-            desc = (name or '') + ' ' + (description or '')
-            desc_lower = desc.lower()
-            if not sector:
-                if 'bitcoin' in desc_lower:
-                    sector = 'Digital Assets'
-                elif 'gold' in desc_lower:
-                    sector = 'Commodity'
-                else:
-                    sector = 'ETF'
-            if not industry:
-                if 'bitcoin' in desc_lower:
-                    industry = 'Bitcoin ETF'
-                elif 'gold' in desc_lower:
-                    industry = 'Gold ETF'
-                else:
-                    etf_industries = [
-                        (['technology', 'tech'], 'Technology ETF'),
-                        (['healthcare', 'health care', 'pharma', 'biotech'], 'Healthcare ETF'),
-                        (['energy', 'oil', 'gas'], 'Energy ETF'),
-                        (['financial', 'bank', 'finance', 'insurance'], 'Financial ETF'),
-                        (['consumer', 'retail', 'staple', 'discretionary'], 'Consumer ETF'),
-                        (['industrial', 'manufacturing', 'industry'], 'Industrial ETF'),
-                        (['real estate', 'reit'], 'Real Estate ETF'),
-                        (['utilities', 'utility'], 'Utilities ETF'),
-                        (['materials', 'mining', 'chemical'], 'Materials ETF'),
-                        (['communication', 'media', 'telecom'], 'Communication ETF'),
-                        (['infrastructure'], 'Infrastructure ETF'),
-                        (['dividend'], 'Dividend ETF'),
-                        (['bond', 'fixed income', 'debt'], 'Bond ETF'),
-                        (['emerging market'], 'Emerging Market ETF'),
-                    ]
-                    for keywords, label in etf_industries:
-                        if any(k in desc_lower for k in keywords):
-                            industry = label
-                            break
-        else:
-            industry = 'N/A'
-        if quote_type == 'CRYPTOCURRENCY':
-            sector = 'Cryptocurrency'
-            industry = info.get('name') or name or symbol
-        return {
+            info = market.info(symbol)
+            meta = metadata_from_info(symbol, info) if info else None
+            if meta is not None:
+                save_symbol_metadata([meta])
+            # Try live price first
+            price = info.get('regularMarketPrice')
+            if price is None:
+                price = market.last_close(symbol)
+        quote_type = meta['quote_type'] if meta else None
+        response = {
             "symbol": symbol,
-            "price": float(price),
-            "currency": info.get('currency') if info else None,
-            "name": name,
-            "sector": sector,
-            "industry": industry,
-            "marketCap": info.get('marketCap') if info else None,
-            "exchange": info.get('exchange') or infer_exchange(symbol),
-            "website": info.get('website') if info else None,
-            "description": description,
-            "info_available": bool(info)
+            "price": float(price) if price is not None else None,
+            "currency": meta['currency'] if meta else None,
+            "name": meta['name'] if meta else symbol,
+            "sector": meta['sector'] if meta else None,
+            # Only ETFs and crypto get an industry; for equities it is reported as N/A
+            "industry": meta['industry'] if quote_type in ('ETF', 'CRYPTOCURRENCY') else 'N/A',
+            "marketCap": meta['market_cap'] if meta else None,
+            "exchange": (meta['exchange'] or meta['inferred_exchange']) if meta else infer_exchange(symbol),
+            "website": meta['website'] if meta else None,
+            "description": meta['description'] if meta else '',
+            "info_available": meta is not None
         }
+        if price is None:
+            if quote_type not in ('ETF', 'CRYPTOCURRENCY'):
+                raise HTTPException(status_code=404, detail="Symbol not found or no price data.")
+            response["currency"] = response["currency"] or 'USD'
+        return response
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch info: {str(e)}")
 
+FX_TTL = int(os.environ.get("FX_TTL", "900"))  # seconds an FX rate is reused
+_fx_cache = {}  # (from, to) -> (rate, fetched_at)
+
+def lookup_fx_rate(from_currency, to_currency):
+    market = providers.get_provider()
+    rate = market.last_close(f"{from_currency}{to_currency}=X")
+    if rate is not None:
+        return float(rate)
+    # Try the reverse pair if not found
+    rate = market.last_close(f"{to_currency}{from_currency}=X")
+    if rate is not None and rate != 0:
+        return 1/float(rate)
+    return None
+
 @app.get('/fxrate/{from_currency}/{to_currency}')
 def get_fx_rate(from_currency: str, to_currency: str):
-    if from_currency.upper() == to_currency.upper():
+    from_currency, to_currency = from_currency.upper(), to_currency.upper()
+    if from_currency == to_currency:
         return {"rate": 1.0}
-    symbol = f"{from_currency.upper()}{to_currency.upper()}=X"
-    ticker = yf.Ticker(symbol)
-    data = ticker.history(period='1d')
-    if not data.empty:
-        rate = data['Close'].iloc[-1]
-        return {"rate": float(rate)}
-    # Try the reverse pair if not found
-    symbol_rev = f"{to_currency.upper()}{from_currency.upper()}=X"
-    ticker_rev = yf.Ticker(symbol_rev)
-    data_rev = ticker_rev.history(period='1d')
-    if not data_rev.empty:
-        rate = data_rev['Close'].iloc[-1]
-        if rate != 0:
-            return {"rate": 1/float(rate)}
-    raise HTTPException(status_code=404, detail="FX rate not found")
+    cached = _fx_cache.get((from_currency, to_currency))
+    if cached is not None and cached[1] > datetime.now() - timedelta(seconds=FX_TTL):
+        CACHE_REQUESTS.inc(cache="fx", result="hit")
+        return {"rate": cached[0]}
+    CACHE_REQUESTS.inc(cache="fx", result="miss")
+
+    def load():
+        rate = lookup_fx_rate(from_currency, to_currency)
+        if rate is None:
+            raise HTTPException(status_code=404, detail="FX rate not found")
+        return orjson.dumps(rate)
+    value, fetched_at = shared.fetch(f"fx:{from_currency}:{to_currency}", FX_TTL, load)
+    rate = orjson.loads(value)
+    _fx_cache[(from_currency, to_currency)] = (rate, datetime.fromtimestamp(fetched_at))
+    return {"rate": rate}
+
+# Complete ISO 4217 currency list (static for now)
+CURRENCIES = [
+    {"code": "USD", "label": "US Dollar", "symbol": "$"},
+    {"code": "INR", "label": "Indian Rupee", "symbol": "₹"},
+    {"code": "EUR", "label": "Euro", "symbol": "€"},
+    {"code": "GBP", "label": "British Pound", "symbol": "£"},
+    {"code": "JPY", "label": "Japanese Yen", "symbol": "¥"},
+    {"code": "KRW", "label": "Korean Won", "symbol": "₩"},
+    {"code": "HKD", "label": "Hong Kong Dollar", "symbol": "HK$"},
+    {"code": "CNY", "label": "Chinese Yuan", "symbol": "¥"},
+    {"code": "AUD", "label": "Australian Dollar", "symbol": "A$"},
+    {"code": "CAD", "label": "Canadian Dollar", "symbol": "C$"},
+    {"code": "CHF", "label": "Swiss Franc", "symbol": "Fr"},
+    {"code": "SGD", "label": "Singapore Dollar", "symbol": "S$"},
+    {"code": "BTC", "label": "Bitcoin", "symbol": "₿"},
+    {"code": "ETH", "label": "Ethereum", "symbol": "Ξ"},
+    {"code": "ZAR", "label": "South African Rand", "symbol": "R"},
+    {"code": "BRL", "label": "Brazilian Real", "symbol": "R$"},
+    {"code": "RUB", "label": "Russian Ruble", "symbol": "₽"},
+    {"code": "MXN", "label": "Mexican Peso", "symbol": "$"},
+    {"code": "SEK", "label": "Swedish Krona", "symbol": "kr"},
+    {"code": "NOK", "label": "Norwegian Krone", "symbol": "kr"},
+    {"code": "DKK", "label": "Danish Krone", "symbol": "kr"},
+    {"code": "PLN", "label": "Polish Zloty", "symbol": "zł"},
+    {"code": "TRY", "label": "Turkish Lira", "symbol": "₺"},
+    {"code": "IDR", "label": "Indonesian Rupiah", "symbol": "Rp"},
+    {"code": "THB", "label": "Thai Baht", "symbol": "฿"},
+    {"code": "MYR", "label": "Malaysian Ringgit", "symbol": "RM"},
+    {"code": "PHP", "label": "Philippine Peso", "symbol": "₱"},
+    {"code": "ILS", "label": "Israeli Shekel", "symbol": "₪"},
+    {"code": "NZD", "label": "New Zealand Dollar", "symbol": "$"},
+    {"code": "SAR", "label": "Saudi Riyal", "symbol": "ر.س"},
+    {"code": "EGP", "label": "Egyptian Pound", "symbol": "ج.م"},
+    {"code": "AED", "label": "UAE Dirham", "symbol": "د.إ"},
+    {"code": "KWD", "label": "Kuwaiti Dinar", "symbol": "د.ك"},
+    {"code": "QAR", "label": "Qatari Riyal", "symbol": "ر.ق"},
+    {"code": "BHD", "label": "Bahraini Dinar", "symbol": "ب.د"},
+    {"code": "OMR", "label": "Omani Rial", "symbol": "ر.ع."},
+    {"code": "JOD", "label": "Jordanian Dinar", "symbol": "د.ا"},
+    {"code": "PKR", "label": "Pakistani Rupee", "symbol": "₨"},
+    {"code": "LKR", "label": "Sri Lankan Rupee", "symbol": "₨"},
+    {"code": "BDT", "label": "Bangladeshi Taka", "symbol": "৳"},
+    {"code": "VND", "label": "Vietnamese Dong", "symbol": "₫"},
+    {"code": "NGN", "label": "Nigerian Naira", "symbol": "₦"},
+    {"code": "COP", "label": "Colombian Peso", "symbol": "$"},
+    {"code": "ARS", "label": "Argentine Peso", "symbol": "$"},
+    {"code": "CLP", "label": "Chilean Peso", "symbol": "$"},
+    {"code": "CZK", "label": "Czech Koruna", "symbol": "Kč"},
+    {"code": "HUF", "label": "Hungarian Forint", "symbol": "Ft"},
+    {"code": "RON", "label": "Romanian Leu", "symbol": "lei"},
+    {"code": "UAH", "label": "Ukrainian Hryvnia", "symbol": "₴"},
+    {"code": "HRK", "label": "Croatian Kuna", "symbol": "kn"},
+    {"code": "BGN", "label": "Bulgarian Lev", "symbol": "лв"},
+    {"code": "ISK", "label": "Icelandic Krona", "symbol": "kr"},
+    {"code": "GHS", "label": "Ghanaian Cedi", "symbol": "₵"},
+    {"code": "KES", "label": "Kenyan Shilling", "symbol": "KSh"},
+    {"code": "TZS", "label": "Tanzanian Shilling", "symbol": "TSh"},
+    {"code": "UGX", "label": "Ugandan Shilling", "symbol": "USh"},
+    {"code": "MAD", "label": "Moroccan Dirham", "symbol": "د.م."},
+    {"code": "DZD", "label": "Algerian Dinar", "symbol": "دج"},
+    {"code": "TND", "label": "Tunisian Dinar", "symbol": "د.ت"},
+    {"code": "XOF", "label": "West African CFA franc", "symbol": "CFA"},
+    {"code": "XAF", "label": "Central African CFA franc", "symbol": "FCFA"},
+    {"code": "XCD", "label": "East Caribbean Dollar", "symbol": "$"},
+    {"code": "BSD", "label": "Bahamian Dollar", "symbol": "$"},
+    {"code": "BBD", "label": "Barbadian Dollar", "symbol": "$"},
+    {"code": "TTD", "label": "Trinidad and Tobago Dollar", "symbol": "$"},
+    {"code": "JMD", "label": "Jamaican Dollar", "symbol": "$"},
+    {"code": "DOP", "label": "Dominican Peso", "symbol": "$"},
+    {"code": "PEN", "label": "Peruvian Sol", "symbol": "S/."},
+    {"code": "UYU", "label": "Uruguayan Peso", "symbol": "$U"},
+    {"code": "BOB", "label": "Bolivian Boliviano", "symbol": "Bs."},
+    {"code": "PYG", "label": "Paraguayan Guarani", "symbol": "₲"},
+    {"code": "VEF", "label": "Venezuelan Bolívar", "symbol": "Bs."},
+    {"code": "CRC", "label": "Costa Rican Colon", "symbol": "₡"},
+    {"code": "GTQ", "label": "Guatemalan Quetzal", "symbol": "Q"},
+    {"code": "HNL", "label": "Honduran Lempira", "symbol": "L"},
+    {"code": "NIO", "label": "Nicaraguan Córdoba", "symbol": "C$"},
+    {"code": "BZD", "label": "Belize Dollar", "symbol": "$"},
+    {"code": "SVC", "label": "Salvadoran Colón", "symbol": "₡"},
+    {"code": "HTG", "label": "Haitian Gourde", "symbol": "G"},
+    {"code": "SRD", "label": "Surinamese Dollar", "symbol": "$"},
+    {"code": "ANG", "label": "Netherlands Antillean Guilder", "symbol": "ƒ"},
+    {"code": "AWG", "label": "Aruban Florin", "symbol": "ƒ"},
+    {"code": "BMD", "label": "Bermudian Dollar", "symbol": "$"},
+    {"code": "KYD", "label": "Cayman Islands Dollar", "symbol": "$"},
+    {"code": "XPF", "label": "CFP Franc", "symbol": "₣"},
+    {"code": "FJD", "label": "Fijian Dollar", "symbol": "$"},
+    {"code": "PGK", "label": "Papua New Guinean Kina", "symbol": "K"},
+    {"code": "WST", "label": "Samoan Tala", "symbol": "T"},
+    {"code": "TOP", "label": "Tongan Paʻanga", "symbol": "T$"},
+    {"code": "VUV", "label": "Vanuatu Vatu", "symbol": "Vt"},
+    {"code": "SBD", "label": "Solomon Islands Dollar", "symbol": "$"},
+    {"code": "KZT", "label": "Kazakhstani Tenge", "symbol": "₸"},
+    {"code": "UZS", "label": "Uzbekistani Soʻm", "symbol": "soʻm"},
+    {"code": "GEL", "label": "Georgian Lari", "symbol": "₾"},
+    {"code": "AZN", "label": "Azerbaijani Manat", "symbol": "₼"},
+    {"code": "AMD", "label": "Armenian Dram", "symbol": "֏"},
+    {"code": "KGS", "label": "Kyrgyzstani Som", "symbol": "с"},
+    {"code": "TJS", "label": "Tajikistani Somoni", "symbol": "ЅМ"},
+    {"code": "MNT", "label": "Mongolian Tögrög", "symbol": "₮"},
+    {"code": "MOP", "label": "Macanese Pataca", "symbol": "MOP$"},
+    {"code": "TWD", "label": "New Taiwan Dollar", "symbol": "NT$"},
+    {"code": "BND", "label": "Brunei Dollar", "symbol": "$"},
+    {"code": "MMK", "label": "Burmese Kyat", "symbol": "K"},
+    {"code": "LAK", "label": "Lao Kip", "symbol": "₭"},
+    {"code": "KHR", "label": "Cambodian Riel", "symbol": "៛"},
+    {"code": "KPW", "label": "North Korean Won", "symbol": "₩"},
+    {"code": "MVR", "label": "Maldivian Rufiyaa", "symbol": "Rf"},
+    {"code": "SCR", "label": "Seychellois Rupee", "symbol": "₨"},
+    {"code": "MUR", "label": "Mauritian Rupee", "symbol": "₨"},
+    {"code": "NPR", "label": "Nepalese Rupee", "symbol": "₨"},
+    {"code": "AFN", "label": "Afghan Afghani", "symbol": "؋"},
+    {"code": "IRR", "label": "Iranian Rial", "symbol": "﷼"},
+    {"code": "IQD", "label": "Iraqi Dinar", "symbol": "ع.د"},
+    {"code": "SYP", "label": "Syrian Pound", "symbol": "£"},
+    {"code": "LBP", "label": "Lebanese Pound", "symbol": "ل.ل"},
+    {"code": "SDG", "label": "Sudanese Pound", "symbol": "ج.س."},
+    {"code": "LYD", "label": "Libyan Dinar", "symbol": "ل.د"},
+    {"code": "MRU", "label": "Mauritanian Ouguiya", "symbol": "UM"},
+    {"code": "SOS", "label": "Somali Shilling", "symbol": "Sh"},
+    {"code": "MGA", "label": "Malagasy Ariary", "symbol": "Ar"},
+    {"code": "ZMW", "label": "Zambian Kwacha", "symbol": "ZK"},
+    {"code": "BWP", "label": "Botswana Pula", "symbol": "P"},
+    {"code": "NAD", "label": "Namibian Dollar", "symbol": "$"},
+    {"code": "SZL", "label": "Swazi Lilangeni", "symbol": "E"},
+    {"code": "LSL", "label": "Lesotho Loti", "symbol": "L"},
+    {"code": "MWK", "label": "Malawian Kwacha", "symbol": "MK"},
+    {"code": "ZWL", "label": "Zimbabwean Dollar", "symbol": "$"},
+    {"code": "BIF", "label": "Burundian Franc", "symbol": "FBu"},
+    {"code": "RWF", "label": "Rwandan Franc", "symbol": "FRw"},
+    {"code": "DJF", "label": "Djiboutian Franc", "symbol": "Fdj"},
+    {"code": "KMF", "label": "Comorian Franc", "symbol": "CF"},
+    {"code": "CDF", "label": "Congolese Franc", "symbol": "FC"},
+    {"code": "XDR", "label": "IMF Special Drawing Rights", "symbol": "SDR"},
+    # ... add more as needed
+]
+# Static, so encoded once at startup
+CURRENCIES_BODY = orjson.dumps(CURRENCIES)
 
 @app.get('/currencies')
 def get_currencies():
-    # Complete ISO 4217 currency list (static for now)
-    return [
-        {"code": "USD", "label": "US Dollar", "symbol": "$"},
-        {"code": "INR", "label": "Indian Rupee", "symbol": "₹"},
-        {"code": "EUR", "label": "Euro", "symbol": "€"},
-        {"code": "GBP", "label": "British Pound", "symbol": "£"},
-        {"code": "JPY", "label": "Japanese Yen", "symbol": "¥"},
-        {"code": "KRW", "label": "Korean Won", "symbol": "₩"},
-        {"code": "HKD", "label": "Hong Kong Dollar", "symbol": "HK$"},
-        {"code": "CNY", "label": "Chinese Yuan", "symbol": "¥"},
-        {"code": "AUD", "label": "Australian Dollar", "symbol": "A$"},
-        {"code": "CAD", "label": "Canadian Dollar", "symbol": "C$"},
-        {"code": "CHF", "label": "Swiss Franc", "symbol": "Fr"},
-        {"code": "SGD", "label": "Singapore Dollar", "symbol": "S$"},
-        {"code": "BTC", "label": "Bitcoin", "symbol": "₿"},
-        {"code": "ETH", "label": "Ethereum", "symbol": "Ξ"},
-        {"code": "ZAR", "label": "South African Rand", "symbol": "R"},
-        {"code": "BRL", "label": "Brazilian Real", "symbol": "R$"},
-        {"code": "RUB", "label": "Russian Ruble", "symbol": "₽"},
-        {"code": "MXN", "label": "Mexican Peso", "symbol": "$"},
-        {"code": "SEK", "label": "Swedish Krona", "symbol": "kr"},
-        {"code": "NOK", "label": "Norwegian Krone", "symbol": "kr"},
-        {"code": "DKK", "label": "Danish Krone", "symbol": "kr"},
-        {"code": "PLN", "label": "Polish Zloty", "symbol": "zł"},
-        {"code": "TRY", "label": "Turkish Lira", "symbol": "₺"},
-        {"code": "IDR", "label": "Indonesian Rupiah", "symbol": "Rp"},
-        {"code": "THB", "label": "Thai Baht", "symbol": "฿"},
-        {"code": "MYR", "label": "Malaysian Ringgit", "symbol": "RM"},
-        {"code": "PHP", "label": "Philippine Peso", "symbol": "₱"},
-        {"code": "ILS", "label": "Israeli Shekel", "symbol": "₪"},
-        {"code": "NZD", "label": "New Zealand Dollar", "symbol": "$"},
-        {"code": "SAR", "label": "Saudi Riyal", "symbol": "ر.س"},
-        {"code": "EGP", "label": "Egyptian Pound", "symbol": "ج.م"},
-        {"code": "AED", "label": "UAE Dirham", "symbol": "د.إ"},
-        {"code": "KWD", "label": "Kuwaiti Dinar", "symbol": "د.ك"},
-        {"code": "QAR", "label": "Qatari Riyal", "symbol": "ر.ق"},
-        {"code": "BHD", "label": "Bahraini Dinar", "symbol": "ب.د"},
-        {"code": "OMR", "label": "Omani Rial", "symbol": "ر.ع."},
-        {"code": "JOD", "label": "Jordanian Dinar", "symbol": "د.ا"},
-        {"code": "PKR", "label": "Pakistani Rupee", "symbol": "₨"},
-        {"code": "LKR", "label": "Sri Lankan Rupee", "symbol": "₨"},
-        {"code": "BDT", "label": "Bangladeshi Taka", "symbol": "৳"},
-        {"code": "VND", "label": "Vietnamese Dong", "symbol": "₫"},
-        {"code": "NGN", "label": "Nigerian Naira", "symbol": "₦"},
-        {"code": "COP", "label": "Colombian Peso", "symbol": "$"},
-        {"code": "ARS", "label": "Argentine Peso", "symbol": "$"},
-        {"code": "CLP", "label": "Chilean Peso", "symbol": "$"},
-        {"code": "CZK", "label": "Czech Koruna", "symbol": "Kč"},
-        {"code": "HUF", "label": "Hungarian Forint", "symbol": "Ft"},
-        {"code": "RON", "label": "Romanian Leu", "symbol": "lei"},
-        {"code": "UAH", "label": "Ukrainian Hryvnia", "symbol": "₴"},
-        {"code": "HRK", "label": "Croatian Kuna", "symbol": "kn"},
-        {"code": "BGN", "label": "Bulgarian Lev", "symbol": "лв"},
-        {"code": "ISK", "label": "Icelandic Krona", "symbol": "kr"},
-        {"code": "GHS", "label": "Ghanaian Cedi", "symbol": "₵"},
-        {"code": "KES", "label": "Kenyan Shilling", "symbol": "KSh"},
-        {"code": "TZS", "label": "Tanzanian Shilling", "symbol": "TSh"},
-        {"code": "UGX", "label": "Ugandan Shilling", "symbol": "USh"},
-        {"code": "MAD", "label": "Moroccan Dirham", "symbol": "د.م."},
-        {"code": "DZD", "label": "Algerian Dinar", "symbol": "دج"},
-        {"code": "TND", "label": "Tunisian Dinar", "symbol": "د.ت"},
-        {"code": "XOF", "label": "West African CFA franc", "symbol": "CFA"},
-        {"code": "XAF", "label": "Central African CFA franc", "symbol": "FCFA"},
-        {"code": "XCD", "label": "East Caribbean Dollar", "symbol": "$"},
-        {"code": "BSD", "label": "Bahamian Dollar", "symbol": "$"},
-        {"code": "BBD", "label": "Barbadian Dollar", "symbol": "$"},
-        {"code": "TTD", "label": "Trinidad and Tobago Dollar", "symbol": "$"},
-        {"code": "JMD", "label": "Jamaican Dollar", "symbol": "$"},
-        {"code": "DOP", "label": "Dominican Peso", "symbol": "$"},
-        {"code": "PEN", "label": "Peruvian Sol", "symbol": "S/."},
-        {"code": "UYU", "label": "Uruguayan Peso", "symbol": "$U"},
-        {"code": "BOB", "label": "Bolivian Boliviano", "symbol": "Bs."},
-        {"code": "PYG", "label": "Paraguayan Guarani", "symbol": "₲"},
-        {"code": "VEF", "label": "Venezuelan Bolívar", "symbol": "Bs."},
-        {"code": "CRC", "label": "Costa Rican Colon", "symbol": "₡"},
-        {"code": "GTQ", "label": "Guatemalan Quetzal", "symbol": "Q"},
-        {"code": "HNL", "label": "Honduran Lempira", "symbol": "L"},
-        {"code": "NIO", "label": "Nicaraguan Córdoba", "symbol": "C$"},
-        {"code": "BZD", "label": "Belize Dollar", "symbol": "$"},
-        {"code": "SVC", "label": "Salvadoran Colón", "symbol": "₡"},
-        {"code": "HTG", "label": "Haitian Gourde", "symbol": "G"},
-        {"code": "SRD", "label": "Surinamese Dollar", "symbol": "$"},
-        {"code": "ANG", "label": "Netherlands Antillean Guilder", "symbol": "ƒ"},
-        {"code": "AWG", "label": "Aruban Florin", "symbol": "ƒ"},
-        {"code": "BMD", "label": "Bermudian Dollar", "symbol": "$"},
-        {"code": "KYD", "label": "Cayman Islands Dollar", "symbol": "$"},
-        {"code": "TTD", "label": "Trinidad and Tobago Dollar", "symbol": "$"},
-        {"code": "XPF", "label": "CFP Franc", "symbol": "₣"},
-        {"code": "FJD", "label": "Fijian Dollar", "symbol": "$"},
-        {"code": "PGK", "label": "Papua New Guinean Kina", "symbol": "K"},
-        {"code": "WST", "label": "Samoan Tala", "symbol": "T"},
-        {"code": "TOP", "label": "Tongan Paʻanga", "symbol": "T$"},
-        {"code": "VUV", "label": "Vanuatu Vatu", "symbol": "Vt"},
-        {"code": "SBD", "label": "Solomon Islands Dollar", "symbol": "$"},
-        {"code": "KZT", "label": "Kazakhstani Tenge", "symbol": "₸"},
-        {"code": "UZS", "label": "Uzbekistani Soʻm", "symbol": "soʻm"},
-        {"code": "GEL", "label": "Georgian Lari", "symbol": "₾"},
-        {"code": "AZN", "label": "Azerbaijani Manat", "symbol": "₼"},
-        {"code": "AMD", "label": "Armenian Dram", "symbol": "֏"},
-        {"code": "KGS", "label": "Kyrgyzstani Som", "symbol": "с"},
-        {"code": "TJS", "label": "Tajikistani Somoni", "symbol": "ЅМ"},
-        {"code": "MNT", "label": "Mongolian Tögrög", "symbol": "₮"},
-        {"code": "MOP", "label": "Macanese Pataca", "symbol": "MOP$"},
-        {"code": "TWD", "label": "New Taiwan Dollar", "symbol": "NT$"},
-        {"code": "HKD", "label": "Hong Kong Dollar", "symbol": "HK$"},
-        {"code": "SGD", "label": "Singapore Dollar", "symbol": "S$"},
-        {"code": "BND", "label": "Brunei Dollar", "symbol": "$"},
-        {"code": "MMK", "label": "Burmese Kyat", "symbol": "K"},
-        {"code": "LAK", "label": "Lao Kip", "symbol": "₭"},
-        {"code": "KHR", "label": "Cambodian Riel", "symbol": "៛"},
-        {"code": "KPW", "label": "North Korean Won", "symbol": "₩"},
-        {"code": "MVR", "label": "Maldivian Rufiyaa", "symbol": "Rf"},
-        {"code": "SCR", "label": "Seychellois Rupee", "symbol": "₨"},
-        {"code": "MUR", "label": "Mauritian Rupee", "symbol": "₨"},
-        {"code": "NPR", "label": "Nepalese Rupee", "symbol": "₨"},
-        {"code": "AFN", "label": "Afghan Afghani", "symbol": "؋"},
-        {"code": "IRR", "label": "Iranian Rial", "symbol": "﷼"},
-        {"code": "IQD", "label": "Iraqi Dinar", "symbol": "ع.د"},
-        {"code": "SYP", "label": "Syrian Pound", "symbol": "£"},
-        {"code": "LBP", "label": "Lebanese Pound", "symbol": "ل.ل"},
-        {"code": "SDG", "label": "Sudanese Pound", "symbol": "ج.س."},
-        {"code": "DZD", "label": "Algerian Dinar", "symbol": "دج"},
-        {"code": "LYD", "label": "Libyan Dinar", "symbol": "ل.د"},
-        {"code": "MRU", "label": "Mauritanian Ouguiya", "symbol": "UM"},
-        {"code": "SOS", "label": "Somali Shilling", "symbol": "Sh"},
-        {"code": "MGA", "label": "Malagasy Ariary", "symbol": "Ar"},
-        {"code": "ZMW", "label": "Zambian Kwacha", "symbol": "ZK"},
-        {"code": "BWP", "label": "Botswana Pula", "symbol": "P"},
-        {"code": "NAD", "label": "Namibian Dollar", "symbol": "$"},
-        {"code": "SZL", "label": "Swazi Lilangeni", "symbol": "E"},
-        {"code": "LSL", "label": "Lesotho Loti", "symbol": "L"},
-        {"code": "MWK", "label": "Malawian Kwacha", "symbol": "MK"},
-        {"code": "ZWL", "label": "Zimbabwean Dollar", "symbol": "$"},
-        {"code": "BIF", "label": "Burundian Franc", "symbol": "FBu"},
-        {"code": "RWF", "label": "Rwandan Franc", "symbol": "FRw"},
-        {"code": "DJF", "label": "Djiboutian Franc", "symbol": "Fdj"},
-        {"code": "KMF", "label": "Comorian Franc", "symbol": "CF"},
-        {"code": "CDF", "label": "Congolese Franc", "symbol": "FC"},
-        {"code": "XOF", "label": "West African CFA franc", "symbol": "CFA"},
-        {"code": "XAF", "label": "Central African CFA franc", "symbol": "FCFA"},
-        {"code": "XPF", "label": "CFP Franc", "symbol": "₣"},
-        {"code": "XCD", "label": "East Caribbean Dollar", "symbol": "$"},
-        {"code": "XDR", "label": "IMF Special Drawing Rights", "symbol": "SDR"},
-        # ... add more as needed
-    ]
+    return Response(CURRENCIES_BODY, media_type="application/json", headers={"Cache-Control": "public, max-age=86400"})
 
 @app.get("/search/{query}")
 def search_symbols(query: str):
     """Searches for stock, ETF, and crypto symbols using Yahoo Finance's API."""
     if not query or len(query) < 2:
         return []
-        
-    url = f"https://query1.finance.yahoo.com/v1/finance/search?q={query}"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'}
-    
     try:
-        response = requests.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        data = providers.get_provider().search(query)
         
         results = []
         for quote in data.get('quotes', []):
@@ -992,52 +1896,459 @@ def search_symbols(query: str):
                     "type": quote.get('quoteType', 'N/A'),
                 })
         return results
-    except requests.exceptions.RequestException as e:
+    except providers.ProviderError as e:
         print(f"Error fetching search results for '{query}': {e}")
         return []
 
+# --- Batch symbol resolution ---
+QUOTE_TYPE_ASSETS = {'EQUITY': 'stock', 'ETF': 'etf', 'CRYPTOCURRENCY': 'crypto', 'MUTUALFUND': 'mutual_fund'}
+ISIN_PATTERN = re.compile(r'^[A-Z]{2}[A-Z0-9]{9}[0-9]$')
+MAX_RESOLVE = 1000
+_isin_symbols = {}  # non-fund ISIN -> Yahoo symbol found by search
+
+def isin_to_symbol(isin):
+    for quote in providers.get_provider().search(isin).get('quotes', []):
+        if quote.get('symbol'):
+            return quote['symbol']
+    return None
+
+def resolved_fund(item, code, name):
+    return {"input": item, "resolved": True, "symbol": code, "asset_type": "mutual_fund",
+            "exchange": None, "currency": "INR", "name": name}
+
+def resolved_symbol(item, symbol, meta):
+    if meta is None:
+        return {"input": item, "resolved": False, "symbol": symbol, "asset_type": None,
+                "exchange": infer_exchange(symbol) if symbol else None, "currency": None, "name": None}
+    quote_type = meta['quote_type']
+    return {"input": item, "resolved": True, "symbol": symbol,
+            "asset_type": QUOTE_TYPE_ASSETS.get(quote_type, quote_type.lower() if quote_type else None),
+            "exchange": meta['exchange'] or meta['inferred_exchange'], "currency": meta['currency'], "name": meta['name']}
+
+@app.post("/symbols/resolve")
+def resolve_symbols(items: List[str] = Body(...)):
+    """Resolve tickers, ISINs and AMFI scheme codes to symbol, asset type, exchange, currency and name.
+
+    Funds come from the AMFI file and everything else from the symbol metadata cache;
+    only cache misses go upstream, fetched in parallel and stored in one transaction.
+    """
+    if len(items) > MAX_RESOLVE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RESOLVE} items per request")
+    keys = [item.strip().upper() for item in items]
+    funds = {}  # key -> (scheme code, scheme name)
+    fund_keys = [key for key in keys if key.isdigit() or ISIN_PATTERN.match(key)]
+    if fund_keys:
+        try:
+            table = get_amfi_data()
+        except HTTPException:
+            table = None
+        for key in fund_keys if table is not None else ():
+            row = table.find(key)
+            if row is not None:
+                funds[key] = (table.code_text(row), table.name(row))
+    # Non-fund ISINs are looked up through symbol search, once each
+    isins = {key for key in keys if ISIN_PATTERN.match(key) and key not in funds and key not in _isin_symbols}
+    if isins:
+        pending = {_quote_pool.submit(profiling.bind(isin_to_symbol), isin): isin for isin in isins}
+        for future in as_completed(pending):
+            try:
+                symbol = future.result()
+            except Exception:
+                symbol = None
+            if symbol:
+                _isin_symbols[pending[future]] = symbol
+    symbols = {}
+    for key in keys:
+        if key in funds or key.isdigit():
+            continue
+        symbol = _isin_symbols.get(key) if ISIN_PATTERN.match(key) else key
+        if symbol:
+            symbols[key] = symbol
+    unique = set(symbols.values())
+    preload_symbol_metadata(unique)
+    misses = [symbol for symbol in unique if cached_symbol_metadata(symbol) is None]
+    if misses:
+        refresh_symbol_metadata(misses)
+    results = []
+    for item, key in zip(items, keys):
+        if key in funds:
+            results.append(resolved_fund(item, *funds[key]))
+        elif key in symbols:
+            results.append(resolved_symbol(item, symbols[key], _metadata_cache.get(symbols[key])))
+        else:
+            results.append(resolved_symbol(item, None, None))
+    return results
+
+@app.get("/lots")
+def get_lots(symbol: str = Query(None), method: str = Query(None), db: Session = Depends(get_db),
+             portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    book = get_lot_book(db, portfolio_id, method)
+    with lot_lock(portfolio_id):
+        open_lots = [lot.to_dict() for lot in book.open_lots(symbol)]
+    return {"method": book.method, "lots": open_lots}
+
+@app.get("/gains")
+def get_gains(symbol: str = Query(None), method: str = Query(None), details: bool = Query(False), db: Session = Depends(get_db),
+              portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    book = get_lot_book(db, portfolio_id, method)
+    # The snapshot /portfolio serves: prices come from its cache, with any misses fetched in parallel
+    prices = {row['symbol']: row['current_price'] for row in get_portfolio_snapshot(db, portfolio_id)['portfolio']}
+    with lot_lock(portfolio_id):
+        gains = book.gains(prices, symbol)
+        disposals = [d for d in book.disposals if symbol is None or d['symbol'] == symbol] if details else None
+    totals = {}
+    for key in ('realized_short_term', 'realized_long_term', 'unrealized_short_term', 'unrealized_long_term'):
+        totals[key] = round_decimal(sum(g[key] or 0 for g in gains.values()), 2)
+    result = {"method": book.method, "long_term_days": book.long_term_days, "symbols": gains, "totals": totals}
+    if details:
+        result["disposals"] = disposals
+    return result
+
+# --- Analytics jobs ---
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", str(7 * 24 * 3600)))  # seconds finished jobs are kept
+JOB_MAX_PRIORITY = 10
+CLOSES_TTL = int(os.environ.get("CLOSES_TTL", str(6 * 3600)))  # seconds daily close history is reused
+_closes_cache = {}  # (symbol, days) -> (closes, fetched_at)
+# History fetches get their own pool so a large job never queues ahead of request-path quotes
+_closes_pool = ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="closes")
+_job_submit_lock = threading.Lock()
+
+def daily_closes(symbol, days):
+    """[(date, close), ...] for `symbol` over `days`, shared by every job and worker for CLOSES_TTL."""
+    cached = _closes_cache.get((symbol, days))
+    if cached is not None and cached[1] > time.time() - CLOSES_TTL:
+        CACHE_REQUESTS.inc(cache="closes", result="hit")
+        return cached[0]
+    CACHE_REQUESTS.inc(cache="closes", result="miss")
+    value, fetched_at = shared.fetch(f"closes:{symbol}:{days}", CLOSES_TTL,
+                                     lambda: orjson.dumps(providers.get_provider().history(symbol, days)))
+    closes = [tuple(row) for row in orjson.loads(value)]
+    _closes_cache[(symbol, days)] = (closes, fetched_at)
+    return closes
+
+def held_quantities(portfolio_id):
+    """(symbol, asset_type, quantity) rows of a portfolio's holdings, by symbol."""
+    with engine.connect() as conn:
+        return conn.execute(select(AssetDB.symbol, AssetDB.asset_type, AssetDB.quantity)
+                            .where(AssetDB.portfolio_id == portfolio_id).order_by(AssetDB.symbol)).all()
+
+def held_closes(job, days, share):
+    """Aligned daily closes of the job's portfolio, fetched in parallel with progress up to `share`.
+    Returns (dates, symbols, closes, quantities, excluded). Funds have no Yahoo history, so they and
+    any symbol without closes are left out and listed in `excluded`."""
+    rows = held_quantities(job.portfolio_id)
+    held = {symbol: quantity for symbol, asset_type, quantity in rows if asset_type != 'mutual_fund' and quantity}
+    histories = dict.fromkeys(held, ())
+    pending = {_closes_pool.submit(daily_closes, symbol, days): symbol for symbol in held}
+    try:
+        for done, future in enumerate(as_completed(pending), 1):
+            try:
+                histories[pending[future]] = future.result()
+            except Exception as e:
+                print(f"Failed to fetch price history for {pending[future]}: {e}")
+            job.set_progress(share * done / len(pending))
+    finally:
+        for future in pending:
+            future.cancel()
+    dates, symbols, closes = analytics.align(histories)
+    if not symbols:
+        raise ValueError("No price history for any holding")
+    excluded = sorted({symbol for symbol, _, _ in rows} - set(symbols))
+    return dates, symbols, closes, [held[symbol] for symbol in symbols], excluded
+
+def run_valuation_history(job):
+    dates, symbols, closes, quantities, excluded = held_closes(job, job.params['days'], 0.9)
+    return {**analytics.value_history(dates, closes, quantities), 'symbols': symbols, 'excluded': excluded}
+
+def run_risk(job):
+    dates, symbols, closes, quantities, excluded = held_closes(job, job.params['days'], 0.9)
+    return {**analytics.risk(dates, symbols, closes, quantities, job.params['confidence']), 'excluded': excluded}
+
+def run_simulation(job):
+    params = job.params
+    _, _, closes, quantities, excluded = held_closes(job, params['days'], 0.3)
+    result = analytics.simulate(closes, quantities, params['horizon_days'], params['paths'], params['seed'],
+                                lambda fraction: job.set_progress(0.3 + 0.7 * fraction))
+    return {**result, 'excluded': excluded}
+
+# kind -> (handler, default parameters); a request may override any default and nothing else
+JOB_KINDS = {
+    'valuation_history': (run_valuation_history, {'days': 365}),
+    'risk': (run_risk, {'days': 365, 'confidence': 0.95}),
+    'simulation': (run_simulation, {'days': 365, 'horizon_days': 252, 'paths': 10000, 'seed': 0}),
+}
+JOB_PARAM_LIMITS = {'days': (5, 3650), 'confidence': (0.5, 0.999), 'horizon_days': (1, 2520),
+                    'paths': (100, 200000), 'seed': (0, 2 ** 32 - 1)}
+JOB_STATE = ('status', 'progress', 'result', 'error', 'started_at', 'finished_at')
+
+class JobRequest(BaseModel):
+    kind: str
+    params: dict = {}
+    priority: int = 0
+
+def job_params(kind, params):
+    """The request's parameters with defaults filled in and types fixed, so equal requests hash equal."""
+    defaults = JOB_KINDS[kind][1]
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown parameters for {kind}: {', '.join(sorted(unknown))}")
+    resolved = {}
+    for name, default in defaults.items():
+        try:
+            value = type(default)(params.get(name, default))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"{name} must be a number")
+        low, high = JOB_PARAM_LIMITS[name]
+        if not low <= value <= high:
+            raise HTTPException(status_code=400, detail=f"{name} must be between {low} and {high}")
+        resolved[name] = value
+    return resolved
+
+def job_input_hash(kind, portfolio_id, params):
+    # Holdings, parameters and the day's closes decide a result; cash and ledger edits do not
+    key = {'kind': kind, 'portfolio_id': portfolio_id, 'params': params, 'as_of': date.today().isoformat(),
+           'holdings': [list(row) for row in held_quantities(portfolio_id)]}
+    return hashlib.sha256(orjson.dumps(key, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def save_job(job):
+    """Upsert a job. Writes through the engine rather than a session so the data version is left alone."""
+    row = {
+        'id': job.id, 'portfolio_id': job.portfolio_id, 'kind': job.kind, 'params': orjson.dumps(job.params).decode(),
+        'input_hash': job.input_hash, 'priority': job.priority, 'status': job.status, 'progress': job.progress,
+        'result': None if job.result is None else orjson.dumps(job.result).decode(), 'error': job.error,
+        'created_at': job.created_at, 'started_at': job.started_at, 'finished_at': job.finished_at,
+    }
+    stmt = sqlite_insert(JobDB.__table__)
+    stmt = stmt.on_conflict_do_update(index_elements=['id'], set_={f: stmt.excluded[f] for f in JOB_STATE})
+    with engine.begin() as conn:
+        conn.execute(stmt, row)
+
+def claim_job(job):
+    """Take a queued job for this process; False when another worker took or cancelled it first."""
+    with engine.begin() as conn:
+        claimed = conn.execute(update(JobDB).where(JobDB.id == job.id, JobDB.status == jobs.QUEUED)
+                               .values(status=jobs.RUNNING, owner=os.getpid(), started_at=time.time())).rowcount
+    return claimed == 1
+
+def job_heartbeat(job):
+    """Record a running job's progress; True when a cancel for it arrived through another worker."""
+    with engine.begin() as conn:
+        return bool(conn.execute(update(JobDB).where(JobDB.id == job.id).values(progress=job.progress)
+                                 .returning(JobDB.cancel_requested)).scalar())
+
+job_queue = jobs.JobQueue({kind: handler for kind, (handler, _) in JOB_KINDS.items()}, workers=JOB_WORKERS,
+                          save=save_job, heartbeat=job_heartbeat, claim=claim_job)
+registry.gauge("jobs_active", "Analytics jobs queued or running in this worker", collect=lambda: {(): len(job_queue)})
+
+def job_record(row):
+    record = {f: row[f] for f in ('id', 'kind', 'portfolio_id', 'priority', 'status', 'progress',
+                                  'created_at', 'started_at', 'finished_at', 'error')}
+    record['params'] = orjson.loads(row['params']) if row['params'] else {}
+    record['cancel_requested'] = bool(row['cancel_requested'])
+    record['result'] = orjson.loads(row['result']) if row['result'] else None
+    return record
+
+def load_job(job_id):
+    """A job's state: live from this worker's queue, else as last saved (possibly by another worker)."""
+    job = job_queue.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    with engine.connect() as conn:
+        row = conn.execute(select(JobDB.__table__).where(JobDB.id == job_id)).mappings().first()
+    return job_record(row) if row is not None else None
+
+def find_job_by_input(input_hash):
+    """The newest job with this input that finished or may still finish, else None."""
+    job = job_queue.find(input_hash)
+    if job is not None:
+        return job.to_dict()
+    with engine.connect() as conn:
+        row = conn.execute(select(JobDB.__table__)
+                           .where(JobDB.input_hash == input_hash, JobDB.status.in_((jobs.DONE, jobs.QUEUED, jobs.RUNNING)))
+                           .order_by(JobDB.created_at.desc()).limit(1)).mappings().first()
+    return job_record(row) if row is not None else None
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_jobs():
+    """Queue again the jobs a previous run left unfinished (a running one starts over, or ends cancelled if
+    that was asked for) and drop finished jobs past JOB_RETENTION. Returns the number queued again.
+    Jobs another live worker process is running are left to it."""
+    with engine.begin() as conn:
+        conn.execute(delete(JobDB).where(JobDB.status.in_(jobs.FINISHED), JobDB.finished_at < time.time() - JOB_RETENTION))
+        rows = conn.execute(select(JobDB.__table__).where(JobDB.status.in_((jobs.QUEUED, jobs.RUNNING)))
+                            .order_by(JobDB.created_at)).mappings().all()
+        orphaned = [row for row in rows if row['status'] == jobs.RUNNING and
+                    (row['owner'] is None or row['owner'] == os.getpid() or not process_alive(row['owner']))]
+        cancelled = [row['id'] for row in orphaned if row['cancel_requested']]
+        if cancelled:
+            conn.execute(update(JobDB).where(JobDB.id.in_(cancelled), JobDB.status == jobs.RUNNING)
+                         .values(status=jobs.CANCELLED, finished_at=time.time()))
+        restarted = [row['id'] for row in orphaned if not row['cancel_requested']]
+        if restarted:
+            conn.execute(update(JobDB).where(JobDB.id.in_(restarted), JobDB.status == jobs.RUNNING)
+                         .values(status=jobs.QUEUED, progress=0, owner=None, started_at=None))
+    requeue = [row for row in rows if row['status'] == jobs.QUEUED or row['id'] in restarted]
+    for row in requeue:
+        job_queue.submit(jobs.Job(row['kind'], orjson.loads(row['params']), row['portfolio_id'], row['priority'],
+                                  row['input_hash'], row['id'], row['created_at']), persist=False)
+    return len(requeue)
+
+@app.on_event("startup")
+def start_jobs():
+    recovered = recover_jobs()
+    if recovered:
+        print(f"Re-queued {recovered} unfinished jobs")
+    job_queue.start()
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest, response: Response, portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    """Queue an analytics job. A request with the same input (kind, parameters, holdings and day) gets the
+    existing job back instead, with its result straight away once it has finished."""
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{request.kind}'; expected one of {', '.join(JOB_KINDS)}")
+    if abs(request.priority) > JOB_MAX_PRIORITY:
+        raise HTTPException(status_code=400, detail=f"priority must be between -{JOB_MAX_PRIORITY} and {JOB_MAX_PRIORITY}")
+    params = job_params(request.kind, request.params)
+    input_hash = job_input_hash(request.kind, portfolio_id, params)
+    with _job_submit_lock:
+        existing = find_job_by_input(input_hash)
+        if existing is None:
+            CACHE_REQUESTS.inc(cache="jobs", result="miss")
+            job = job_queue.submit(jobs.Job(request.kind, params, portfolio_id, request.priority, input_hash))
+            return {**job.to_dict(), 'cached': False}
+    CACHE_REQUESTS.inc(cache="jobs", result="hit")
+    if existing['status'] == jobs.DONE:
+        response.status_code = 200
+    return {**existing, 'cached': True}
+
+@app.get("/jobs")
+def list_jobs(status: str = Query(None), limit: int = Query(50, ge=1, le=500), portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    """A portfolio's jobs, newest first, without their results."""
+    query = select(*(c for c in JobDB.__table__.c if c.name != 'result')).where(JobDB.portfolio_id == portfolio_id)
+    if status:
+        query = query.where(JobDB.status == status)
+    with engine.connect() as conn:
+        rows = conn.execute(query.order_by(JobDB.created_at.desc()).limit(limit)).mappings().all()
+    listed = []
+    for row in rows:
+        live = job_queue.get(row['id'])
+        record = live.to_dict() if live is not None else job_record({**row, 'result': None})
+        del record['result']
+        listed.append(record)
+    return listed
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job. A running job stops at its next progress report."""
+    if job_queue.cancel(job_id) is None:
+        # Queued or running in another worker process, or already finished
+        with engine.begin() as conn:
+            conn.execute(update(JobDB).where(JobDB.id == job_id, JobDB.status == jobs.QUEUED)
+                         .values(status=jobs.CANCELLED, cancel_requested=1, finished_at=time.time()))
+            conn.execute(update(JobDB).where(JobDB.id == job_id, JobDB.status == jobs.RUNNING).values(cancel_requested=1))
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN or request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/debug/slow-requests", dependencies=[Depends(require_admin)])
+def get_slow_requests():
+    return list(profiling.recent_slow_requests)
+
+@app.post("/symbols/metadata/refresh", dependencies=[Depends(require_admin)])
+def refresh_metadata(background_tasks: BackgroundTasks, symbols: Optional[List[str]] = Body(None)):
+    """Re-fetch cached symbol metadata in the background: the given symbols, or everything stale."""
+    targets = [s.strip() for s in symbols if s.strip()] if symbols else stale_metadata_symbols()
+    background_tasks.add_task(refresh_symbol_metadata, targets)
+    return {"queued": len(targets)}
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(registry.render(), media_type=metrics.CONTENT_TYPE)
+
 #@app.get("/")
 #def read_index():
 #    return FileResponse(os.path.join(os.path.dirname(__file__), "index.html")) 
 
 # Transaction endpoints
-@app.get("/history")
-def get_history():
-    db = SessionLocal()
-    txs = db.query(TransactionDB).order_by(TransactionDB.datetime.desc()).all()
-    db.close()
-    return [t.__dict__ for t in txs]
+_history_cache = {}  # portfolio_id -> (etag, encoded body)
+HISTORY_COLUMNS = [TransactionDB.__table__.c[f.name] for f in dataclass_fields(TransactionRecord)]
+
+@app.get("/history", response_model=List[TransactionRecord])
+def get_history(request: Request, portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    etag = data_etag(portfolio_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    cached = _history_cache.get(portfolio_id)
+    if cached is not None and cached[0] == etag:
+        CACHE_REQUESTS.inc(cache="history", result="hit")
+        return etag_json(cached[1], etag)
+    CACHE_REQUESTS.inc(cache="history", result="miss")
+    # Plain column tuples: no ORM identity map or instance state to build and strip
+    with engine.connect() as conn:
+        rows = conn.execute(select(*HISTORY_COLUMNS).where(TransactionDB.portfolio_id == portfolio_id)
+                            .order_by(TransactionDB.datetime.desc())).all()
+    body = json_bytes([TransactionRecord(*row) for row in rows])
+    _history_cache[portfolio_id] = (etag, body)
+    return etag_json(body, etag)
 
 @app.post("/transaction")
-def add_transaction(tx: dict):
+def add_transaction(tx: dict, portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     db = SessionLocal()
-    t = TransactionDB(**tx)
+    t = TransactionDB(**{**tx, "portfolio_id": portfolio_id})
     db.add(t)
     db.commit()
     db.close()
+    reset_lot_books(portfolio_id)
     return {"status": "ok"}
 
 @app.get("/available")
-def get_available():
+def get_available(request: Request, portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
+    etag = data_etag(portfolio_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     db = SessionLocal()
-    a = db.query(AvailableDB).first()
+    a = db.query(AvailableDB).filter(AvailableDB.portfolio_id == portfolio_id).first()
     db.close()
-    return {"amount": a.amount if a else 0}
+    return etag_json({"amount": a.amount if a else 0}, etag)
 
 @app.post("/available")
-def set_available(amount: float, notes: str = ""):
+def set_available(amount: float, notes: str = "", portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     db = SessionLocal()
-    a = db.query(AvailableDB).first()
+    a = db.query(AvailableDB).filter(AvailableDB.portfolio_id == portfolio_id).first()
     prev_amount = a.amount if a else 0
     action = "ADD" if amount > prev_amount else "ADJUST"
     if a:
         a.amount = amount
     else:
-        a = AvailableDB(amount=amount)
+        a = AvailableDB(portfolio_id=portfolio_id, amount=amount)
         db.add(a)
     db.commit()
     # Record transaction for audit
     db.add(TransactionDB(
+        portfolio_id=portfolio_id,
         datetime=datetime.now().isoformat(),
         action=action,
         symbol=None,
@@ -1055,27 +2366,31 @@ def set_available(amount: float, notes: str = ""):
     return {"amount": amount}
 
 @app.delete("/transaction/{tx_id}")
-def delete_transaction(tx_id: int):
+def delete_transaction(tx_id: int, portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     db = SessionLocal()
-    tx = db.query(TransactionDB).filter(TransactionDB.id == tx_id).first()
+    tx = db.query(TransactionDB).filter(TransactionDB.portfolio_id == portfolio_id, TransactionDB.id == tx_id).first()
     if not tx:
         db.close()
         raise HTTPException(status_code=404, detail="Transaction not found")
     db.delete(tx)
+    db.query(LotSelectionDB).filter(LotSelectionDB.sell_tx_id == tx_id).delete()
     db.commit()
     db.close()
+    reset_lot_books(portfolio_id)
     return {"status": "deleted"}
 
 @app.patch("/transaction/{tx_id}")
-def edit_transaction(tx_id: int, fields: dict = Body(...)):
+def edit_transaction(tx_id: int, fields: dict = Body(...), portfolio_id: int = Query(DEFAULT_PORTFOLIO, ge=1)):
     db = SessionLocal()
-    tx = db.query(TransactionDB).filter(TransactionDB.id == tx_id).first()
+    tx = db.query(TransactionDB).filter(TransactionDB.portfolio_id == portfolio_id, TransactionDB.id == tx_id).first()
     if not tx:
         db.close()
         raise HTTPException(status_code=404, detail="Transaction not found")
     for k, v in fields.items():
-        if hasattr(tx, k):
+        # A transaction stays in its portfolio
+        if hasattr(tx, k) and k != "portfolio_id":
             setattr(tx, k, v)
     db.commit()
     db.close()
+    reset_lot_books(portfolio_id)
     return {"status": "updated"} 
\ No newline at end of file
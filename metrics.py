@@ -0,0 +1,225 @@
+"""Minimal Prometheus-style metrics: counters, gauges and histograms with labels,
+rendered in the text exposition format (version 0.0.4).
+"""
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Responses that stay open on purpose (SSE, NDJSON); their lifetime is not their latency
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def items(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', labels, None, value) for labels, value in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect  # optional callable returning {label tuple: value} at scrape time
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = dict(self._values)
+        if self._collect:
+            items.update(self._collect())
+        return [('', labels, None, value) for labels, value in sorted(items.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        out = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                out.append(('_bucket', labels, f'le="{_format_value(bound)}"', cumulative))
+            out.append(('_sum', labels, None, total))
+            out.append(('_count', labels, None, count))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        return '\n'.join(m.render() for m in self._metrics) + '\n'
+
+
+def is_streaming(start_message):
+    """Whether an `http.response.start` message opens a streaming response."""
+    for key, value in start_message.get("headers", ()):
+        if key.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() in STREAMING_TYPES
+    return False
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each request until its last body chunk is sent,
+    labelled by the matched route template rather than the raw path.
+
+    Streaming responses are left out of `latency`: they go to `first_byte`
+    (when given) with the time until their first body chunk."""
+
+    def __init__(self, app, latency, requests, in_flight, first_byte=None):
+        self.app = app
+        self.latency = latency
+        self.requests = requests
+        self.in_flight = in_flight
+        self.first_byte = first_byte
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        response = {"code": 500, "streaming": False, "first_byte": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["code"] = message["status"]
+                response["streaming"] = is_streaming(message)
+            elif message["type"] == "http.response.body" and response["first_byte"] is None and message.get("body"):
+                response["first_byte"] = time.perf_counter()
+            await send(message)
+
+        start = time.perf_counter()
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            if not response["streaming"]:
+                self.latency.observe(time.perf_counter() - start, route=path, method=method)
+            elif self.first_byte is not None and response["first_byte"] is not None:
+                self.first_byte.observe(response["first_byte"] - start, route=path, method=method)
+            self.requests.inc(route=path, method=method, status=str(response["code"]))
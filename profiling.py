@@ -0,0 +1,290 @@
+"""Per-request time breakdown, slow-request log and on-demand sampling profiles.
+
+Every HTTP request gets a `Timings` accumulator in a context variable; upstream
+calls, SQL statements and JSON rendering add their time to it. Requests slower
+than the threshold are logged with that breakdown; streaming responses (SSE,
+NDJSON) stay open on purpose and are not. Adding `?profile=1` (with the admin
+token) samples the stacks of the threads working for the request while it
+runs and returns the merged call tree instead of the normal body.
+
+A thread works for a request while it runs a sync endpoint (see
+`ServingThreadRoute`) or a function wrapped with `bind()`; the event loop
+thread counts only while it runs the request's own task.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+import metrics
+
+logger = logging.getLogger("portfolio.slow_requests")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+recent_slow_requests = deque(maxlen=100)
+
+# Leaf frames that mean a thread is parked rather than working
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+IDLE_FUNCTIONS = {("thread.py", "_worker")}
+
+
+class Timings:
+    __slots__ = ("upstream", "upstream_calls", "db", "db_queries", "serialization", "threads", "_lock")
+
+    def __init__(self):
+        self.upstream = 0.0
+        self.upstream_calls = 0
+        self.db = 0.0
+        self.db_queries = 0
+        self.serialization = 0.0
+        self.threads = {}  # ident -> nesting depth of the threads working for this request
+        self._lock = threading.Lock()
+
+    def enter(self, ident):
+        with self._lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def leave(self, ident):
+        with self._lock:
+            if self.threads[ident] > 1:
+                self.threads[ident] -= 1
+            else:
+                del self.threads[ident]
+
+    def working(self, ident):
+        return ident in self.threads
+
+    def add_upstream(self, seconds):
+        with self._lock:
+            self.upstream += seconds
+            self.upstream_calls += 1
+
+    def add_db(self, seconds):
+        with self._lock:
+            self.db += seconds
+            self.db_queries += 1
+
+    def add_serialization(self, seconds):
+        with self._lock:
+            self.serialization += seconds
+
+    def breakdown(self, total):
+        # Upstream calls may overlap, so their sum can exceed the wall time
+        return {
+            'total_ms': round(total * 1000, 3),
+            'upstream_ms': round(self.upstream * 1000, 3),
+            'upstream_calls': self.upstream_calls,
+            'db_ms': round(self.db * 1000, 3),
+            'db_queries': self.db_queries,
+            'serialization_ms': round(self.serialization * 1000, 3),
+            'other_ms': round(max(total - self.upstream - self.db - self.serialization, 0.0) * 1000, 3),
+        }
+
+
+def current_timings():
+    return _current.get()
+
+
+def serving(fn):
+    """Wrap `fn` so the thread running it counts as working for the current request."""
+    @functools.wraps(fn)
+    def tagged(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        timings.enter(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings.leave(ident)
+    return tagged
+
+
+def bind(fn):
+    """`fn` bound to the caller's context, for handing request work to another thread."""
+    return functools.partial(contextvars.copy_context().run, serving(fn))
+
+
+class ServingThreadRoute(APIRoute):
+    """Route that marks the pool thread running a sync endpoint as serving the request."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = serving(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class StackSampler:
+    """Samples Python stacks at a fixed interval: the threads working for `timings`, plus the thread
+    that created the sampler (the event loop's) while `task` is running on `loop`. Without `timings`,
+    every thread but its own."""
+
+    def __init__(self, interval=0.005, timings=None, loop=None, task=None):
+        self.interval = interval
+        self.timings = timings
+        self.loop = loop
+        self.task = task
+        self.loop_thread = threading.get_ident() if loop is not None else None
+        self.tree = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or not self.belongs(ident):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((os.path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+                    frame = frame.f_back
+                leaf_file, leaf_func, _ = stack[0]
+                if leaf_file in IDLE_FILES or (leaf_file, leaf_func) in IDLE_FUNCTIONS:
+                    continue
+                self._add(names.get(ident, str(ident)), reversed(stack))
+            self.samples += 1
+
+    def belongs(self, ident):
+        if self.timings is None:
+            return True
+        if ident == self.loop_thread:
+            # The loop serves every request; only count it while it runs this one
+            return asyncio.current_task(self.loop) is self.task
+        return self.timings.working(ident)
+
+    def _add(self, thread_name, frames):
+        node = self.tree.setdefault(thread_name, {"samples": 0, "children": {}})
+        node["samples"] += 1
+        for filename, func, line in frames:
+            node = node["children"].setdefault(f"{func} ({filename}:{line})", {"samples": 0, "children": {}})
+            node["samples"] += 1
+
+    def call_tree(self, min_share=0.01):
+        """Nested call tree with estimated wall time per frame; tiny branches are pruned."""
+        per_sample = self.elapsed / self.samples if self.samples else self.interval
+        floor = max(1, int(self.samples * min_share))
+
+        def convert(name, node):
+            children = [convert(n, c) for n, c in node["children"].items() if c["samples"] >= floor]
+            children.sort(key=lambda c: -c["samples"])
+            return {"frame": name, "samples": node["samples"],
+                    "wall_ms": round(node["samples"] * per_sample * 1000, 3), "children": children}
+        return [convert(name, node) for name, node in self.tree.items()]
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, admin_token=None, slow_ms=1000.0, interval=0.005):
+        self.app = app
+        self.admin_token = admin_token
+        self.slow_ms = slow_ms
+        self.interval = interval
+
+    def is_admin(self, scope):
+        if not self.admin_token:
+            return False
+        for key, value in scope.get("headers", ()):
+            if key == b"x-admin-token":
+                return value.decode() == self.admin_token
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        query = scope.get("query_string", b"")
+        if b"profile=" in query and parse_qs(query.decode()).get("profile", [""])[0] in ("1", "true"):
+            await self.profile(scope, receive, send)
+            return
+        timings = Timings()
+        token = _current.set(timings)
+        streaming = {"value": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                streaming["value"] = metrics.is_streaming(message)
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - start
+            if total * 1000 >= self.slow_ms and not streaming["value"]:
+                self.record_slow(scope, timings.breakdown(total))
+
+    def record_slow(self, scope, breakdown):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'method': scope.get("method"),
+            'path': scope.get("path"),
+            'route': getattr(scope.get("route"), "path", None),
+            **breakdown,
+        }
+        recent_slow_requests.append(entry)
+        logger.warning("slow request %s", json.dumps(entry))
+
+    async def profile(self, scope, receive, send):
+        if not self.is_admin(scope):
+            await self.respond(send, 403, {"detail": "Profiling requires a valid X-Admin-Token"})
+            return
+        response = {"status": None, "bytes": 0}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+
+        timings = Timings()
+        token = _current.set(timings)
+        try:
+            with StackSampler(self.interval, timings, asyncio.get_running_loop(), asyncio.current_task()) as sampler:
+                start = time.perf_counter()
+                await self.app(scope, receive, capture)
+                total = time.perf_counter() - start
+        finally:
+            _current.reset(token)
+        await self.respond(send, 200, {
+            'path': scope.get("path"),
+            'response_status': response["status"],
+            'response_bytes': response["bytes"],
+            'breakdown': timings.breakdown(total),
+            'sample_interval_ms': self.interval * 1000,
+            'samples': sampler.samples,
+            'call_tree': sampler.call_tree(),
+        })
+
+    @staticmethod
+    async def respond(send, status, payload):
+        body = json.dumps(payload).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,296 @@
+"""Market data providers.
+
+Every upstream call the backend makes (Yahoo quotes and daily history via
+yfinance, the AMFI NAV file and Yahoo symbol search) goes through the active provider, so the API can
+run against a deterministic local fake for benchmarks and offline work.
+
+Select the provider with MARKET_DATA_PROVIDER=yahoo|fake. The fake is tuned
+with FAKE_LATENCY_MS, FAKE_FAILURE_RATE, FAKE_UNIVERSE_SIZE and FAKE_SEED.
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+AMFI_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+YAHOO_SEARCH_URL = "https://query1.finance.yahoo.com/v1/finance/search"
+YAHOO_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'}
+
+
+class ProviderError(Exception):
+    pass
+
+
+def _yfinance():
+    # yfinance pulls in pandas and its HTTP stack; load it on the first Yahoo call, not at startup
+    import yfinance
+    return yfinance
+
+
+class MarketDataProvider:
+    name = "base"
+
+    def info(self, symbol):
+        """Quote and reference fields for `symbol` in yfinance `Ticker.info` shape."""
+        raise NotImplementedError
+
+    def last_close(self, symbol):
+        """Most recent daily close, or None when there is no price history."""
+        raise NotImplementedError
+
+    def history(self, symbol, days):
+        """Daily closes over the last `days` calendar days as [(YYYY-MM-DD, close), ...], oldest first."""
+        raise NotImplementedError
+
+    def amfi_nav_text(self):
+        """The raw AMFI NAVAll.txt file."""
+        raise NotImplementedError
+
+    def search(self, query):
+        """Yahoo search response (a dict with a 'quotes' list); raises ProviderError when the search fails."""
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    name = "yahoo"
+
+    def info(self, symbol):
+        return _yfinance().Ticker(symbol).info
+
+    def last_close(self, symbol):
+        data = _yfinance().Ticker(symbol).history(period="1d")
+        if data.empty:
+            return None
+        return float(data['Close'].iloc[-1])
+
+    def history(self, symbol, days):
+        start = (date.today() - timedelta(days=days)).isoformat()
+        data = _yfinance().Ticker(symbol).history(start=start, interval="1d")
+        if data.empty:
+            return []
+        return [(ts.strftime('%Y-%m-%d'), float(close)) for ts, close in data['Close'].dropna().items()]
+
+    def amfi_nav_text(self):
+        import requests
+        return requests.get(AMFI_URL).text
+
+    def search(self, query):
+        import requests
+        try:
+            response = requests.get(YAHOO_SEARCH_URL, params={'q': query}, headers=YAHOO_HEADERS, timeout=5)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise ProviderError(f"Yahoo search failed: {e}") from e
+
+
+class FakeProvider(MarketDataProvider):
+    """Deterministic offline market data.
+
+    The universe has `universe_size` equities/ETFs/crypto named FAKE0000..,
+    plus the same number of mutual fund schemes with AMFI codes from 100000.
+    Prices depend only on the seed and the symbol. Calls sleep `latency_ms` and
+    fail with probability `failure_rate`.
+    """
+    name = "fake"
+
+    SECTORS = ["Technology", "Healthcare", "Financial Services", "Energy", "Industrials", "Consumer Defensive"]
+    EXCHANGES = [("", "NMS", "USD"), (".NS", "NSI", "INR"), (".L", "LSE", "GBP"), (".DE", "GER", "EUR")]
+    FUND_HOUSES = ["Axis", "HDFC", "ICICI Prudential", "SBI", "Nippon India", "Kotak"]
+    FUND_TYPES = ["Large Cap Fund", "Mid Cap Fund", "Small Cap Fund", "Flexi Cap Fund", "Liquid Fund",
+                  "Gilt Fund", "Balanced Advantage Fund", "Nifty 50 Index Fund", "Corporate Bond Fund"]
+
+    def __init__(self, latency_ms=0.0, failure_rate=0.0, universe_size=2000, seed=42):
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.universe_size = universe_size
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def symbols(self):
+        return [self.symbol_at(i) for i in range(self.universe_size)]
+
+    def symbol_at(self, i):
+        suffix = self.EXCHANGES[i % len(self.EXCHANGES)][0]
+        if i % 10 == 9:
+            return f"FK{i:04d}-USD"
+        return f"FAKE{i:04d}{suffix}"
+
+    def scheme_codes(self):
+        return [str(100000 + i) for i in range(self.universe_size)]
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate:
+            with self._lock:
+                failed = self._random.random() < self.failure_rate
+            if failed:
+                raise ProviderError("Simulated upstream failure")
+
+    def _index(self, symbol):
+        base = symbol.upper().split('.')[0].replace('-USD', '')
+        for prefix in ("FAKE", "FK"):
+            if base.startswith(prefix) and base[len(prefix):].isdigit():
+                i = int(base[len(prefix):])
+                if i < self.universe_size and self.symbol_at(i).upper() == symbol.upper():
+                    return i
+        return None
+
+    def _price(self, key):
+        digest = hashlib.sha256(f"{self.seed}:{key}".encode()).digest()
+        return round(5 + int.from_bytes(digest[:4], 'big') % 100000 / 100.0, 2)
+
+    def info(self, symbol):
+        self._call()
+        i = self._index(symbol)
+        if i is None:
+            return {}
+        suffix, exchange, currency = self.EXCHANGES[i % len(self.EXCHANGES)]
+        if symbol.endswith('-USD'):
+            return {
+                'symbol': symbol, 'quoteType': 'CRYPTOCURRENCY', 'name': f"Fake Coin {i}",
+                'longName': f"Fake Coin {i} USD", 'currency': 'USD', 'exchange': 'CCC',
+                'regularMarketPrice': self._price(symbol), 'marketCap': i * 1000000,
+            }
+        etf = i % 7 == 3
+        return {
+            'symbol': symbol,
+            'quoteType': 'ETF' if etf else 'EQUITY',
+            'longName': f"Fake {'Sector ETF' if etf else 'Corp'} {i}",
+            'shortName': f"Fake {i}",
+            'longBusinessSummary': f"Tracks {self.SECTORS[i % len(self.SECTORS)].lower()} companies." if etf else '',
+            'sector': None if etf else self.SECTORS[i % len(self.SECTORS)],
+            'industry': None if etf else f"{self.SECTORS[i % len(self.SECTORS)]} Services",
+            'currency': currency,
+            'exchange': exchange,
+            'regularMarketPrice': self._price(symbol),
+            'marketCap': i * 1000000,
+            'website': f"https://example.com/{i}",
+        }
+
+    def last_close(self, symbol):
+        self._call()
+        if symbol.endswith('=X'):
+            return round(0.5 + self._price(symbol) / 1000.0, 4)
+        return self._price(symbol) if self._index(symbol) is not None else None
+
+    def history(self, symbol, days):
+        """A seeded random walk that ends at today's price; weekdays only, except for crypto."""
+        self._call()
+        i = self._index(symbol)
+        if i is None:
+            return []
+        crypto = symbol.endswith('-USD')
+        today = date.today()
+        dates = [today - timedelta(days=n) for n in range(days, -1, -1)]
+        dates = [d for d in dates if crypto or d.weekday() < 5]
+        walk = random.Random(f"{self.seed}:history:{symbol}")
+        volatility = (0.03 if crypto else 0.008) + (i % 5) * 0.002
+        price = self._price(symbol)
+        closes = [price]
+        for _ in dates[1:]:
+            # Walk backwards from today so the last close matches last_close()
+            price = max(0.01, price / (1 + walk.gauss(0.0003, volatility)))
+            closes.append(round(price, 2))
+        return [(d.isoformat(), close) for d, close in zip(dates, reversed(closes))]
+
+    def amfi_nav_text(self):
+        self._call()
+        today = datetime.now().strftime('%d-%b-%Y')
+        lines = ["Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date", ""]
+        for h, house in enumerate(self.FUND_HOUSES):
+            lines.append(f"{house} Mutual Fund")
+            lines.append("")
+            for i in range(h, self.universe_size, len(self.FUND_HOUSES)):
+                fund = self.FUND_TYPES[i % len(self.FUND_TYPES)]
+                lines.append(f"{100000 + i};INF{i:09d};-;{house} {fund} - Direct Plan - Growth {i};"
+                             f"{self._price(100000 + i):.4f};{today}")
+            lines.append("")
+        return '\n'.join(lines)
+
+    def search(self, query):
+        self._call()
+        q = query.upper()
+        quotes = []
+        for i in range(self.universe_size):
+            symbol = self.symbol_at(i)
+            if q in symbol.upper():
+                info = self.info_fields(i, symbol)
+                quotes.append(info)
+                if len(quotes) >= 10:
+                    break
+        return {'quotes': quotes}
+
+    def info_fields(self, i, symbol):
+        quote_type = 'CRYPTOCURRENCY' if symbol.endswith('-USD') else ('ETF' if i % 7 == 3 else 'EQUITY')
+        return {'symbol': symbol, 'quoteType': quote_type, 'longname': f"Fake {i}",
+                'shortname': f"Fake {i}", 'exchange': self.EXCHANGES[i % len(self.EXCHANGES)][1]}
+
+
+# Which upstream service each provider call hits, for instrumentation
+UPSTREAMS = {'info': 'yfinance', 'last_close': 'yfinance', 'history': 'yfinance', 'amfi_nav_text': 'amfi', 'search': 'yahoo_search'}
+_observers = []
+
+
+def add_observer(callback):
+    """Register callback(upstream, call, seconds, error) invoked after every provider call."""
+    _observers.append(callback)
+
+
+class ObservedProvider:
+    """Wraps a provider and reports each upstream call to the registered observers."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+
+    def __getattr__(self, attr):
+        value = getattr(self.inner, attr)
+        upstream = UPSTREAMS.get(attr)
+        if upstream is None or not callable(value):
+            return value
+
+        def observed(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return value(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                for callback in _observers:
+                    callback(upstream, attr, elapsed, error)
+        return observed
+
+
+_provider = {"current": None}
+
+
+def provider_from_env():
+    name = os.environ.get("MARKET_DATA_PROVIDER", "yahoo").lower()
+    if name == "fake":
+        return FakeProvider(
+            latency_ms=float(os.environ.get("FAKE_LATENCY_MS", "0")),
+            failure_rate=float(os.environ.get("FAKE_FAILURE_RATE", "0")),
+            universe_size=int(os.environ.get("FAKE_UNIVERSE_SIZE", "2000")),
+            seed=int(os.environ.get("FAKE_SEED", "42")),
+        )
+    if name == "yahoo":
+        return YahooProvider()
+    raise ValueError(f"Unknown MARKET_DATA_PROVIDER '{name}'")
+
+
+def get_provider():
+    if _provider["current"] is None:
+        _provider["current"] = ObservedProvider(provider_from_env())
+    return _provider["current"]
+
+
+def set_provider(provider):
+    _provider["current"] = ObservedProvider(provider)
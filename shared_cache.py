@@ -0,0 +1,202 @@
+"""Cache tier shared by every worker process on the host.
+
+Entries live in a small SQLite database in WAL mode, so readers never block
+and never wait for a writer: each read sees the last committed value. Values
+are bytes; callers pick the encoding.
+
+Refreshes are elected. A worker that finds an entry missing or stale tries to
+claim the key's lease; exactly one claim succeeds until the lease is released
+or expires. The winner fetches upstream and publishes the value, the others
+keep serving the stale copy or, when there is none, poll for the winner's.
+Leases expire on their own, so a worker that dies mid-refresh only delays the
+key by `lease_seconds`.
+
+Counters give workers a cheap way to agree on invalidation (the data version
+behind ETags and snapshots, ledger rewrites for the lot books), one counter
+per portfolio.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL, created_at REAL NOT NULL);
+"""
+PUBLISHED = "published"
+CHUNK = 500  # keys per IN (...) query, well under SQLite's variable limit
+
+
+def chunks(items, size=CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class SharedCache:
+    def __init__(self, path, lease_seconds=30.0, poll_interval=0.05):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._ready = False
+
+    @property
+    def owner(self):
+        # Threads of one worker compete for leases like separate workers do
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # One connection per thread; a forked worker opens its own
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if not self._ready:
+                with self._schema_lock:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+        return conn
+
+    # --- entries ---
+    def get(self, key):
+        """(value, fetched_at) or None."""
+        return self.connection().execute("SELECT value, fetched_at FROM entries WHERE key = ?", (key,)).fetchone()
+
+    def get_many(self, keys):
+        """{key: (value, fetched_at)} for the keys that have an entry."""
+        found = {}
+        conn = self.connection()
+        for part in chunks(keys):
+            rows = conn.execute(f"SELECT key, value, fetched_at FROM entries WHERE key IN ({','.join('?' * len(part))})", part)
+            found.update((key, (value, fetched_at)) for key, value, fetched_at in rows)
+        return found
+
+    def put_many(self, items, fetched_at=None):
+        """Publish {key: value} in one transaction and give up our leases on those keys."""
+        if not items:
+            return
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, fetched_at) VALUES (?, ?, ?)",
+                             [(key, value, fetched_at) for key, value in items.items()])
+            conn.executemany("DELETE FROM leases WHERE key = ? AND owner = ?", [(key, self.owner) for key in items])
+            self._bump_published(conn)
+
+    def put(self, key, value, fetched_at=None):
+        self.put_many({key: value}, fetched_at)
+
+    def clear(self, prefix=""):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff"))
+
+    # --- leases ---
+    def claim_many(self, keys, seconds=None):
+        """Keys whose lease this thread now holds; the rest are being refreshed by someone else."""
+        now = time.time()
+        expires = now + (self.lease_seconds if seconds is None else seconds)
+        owner = self.owner
+        won = set()
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for key in keys:
+                cursor = conn.execute(
+                    "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                    (key, owner, expires, now))
+                if cursor.rowcount:
+                    won.add(key)
+        return won
+
+    def leased(self, keys):
+        """Keys someone currently holds an unexpired lease on (read only)."""
+        held = set()
+        conn = self.connection()
+        now = time.time()
+        for part in chunks(keys):
+            rows = conn.execute(f"SELECT key FROM leases WHERE expires_at >= ? AND key IN ({','.join('?' * len(part))})", [now] + part)
+            held.update(key for (key,) in rows)
+        return held
+
+    def claim(self, key, seconds=None):
+        return key in self.claim_many([key], seconds)
+
+    def release_many(self, keys):
+        if not keys:
+            return
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM leases WHERE key = ? AND owner = ?", [(key, self.owner) for key in keys])
+            self._bump_published(conn)
+
+    def published(self):
+        """Changes whenever entries are published or leases given up; waiters poll this one row."""
+        return self.counter(PUBLISHED)[0]
+
+    def _bump_published(self, conn):
+        conn.execute("INSERT INTO counters (name, value, created_at) VALUES (?, 1, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1", (PUBLISHED, time.time()))
+
+    def fetch(self, key, ttl, load, wait=None):
+        """(value, fetched_at) for `key`, calling `load()` -> bytes only if this thread wins the refresh.
+
+        A stale value is returned as is while another worker refreshes it. With nothing cached,
+        losers poll for up to `wait` seconds (the lease time by default) before loading themselves.
+        """
+        entry = self.get(key)
+        if entry is not None and entry[1] > time.time() - ttl:
+            return entry
+        deadline = time.time() + (self.lease_seconds if wait is None else wait)
+        while True:
+            # Reading the lease first keeps losers from queueing for the write lock on every poll
+            if not self.leased([key]) and self.claim(key):
+                try:
+                    value = load()
+                except BaseException:
+                    self.release_many([key])
+                    raise
+                fetched_at = time.time()
+                self.put(key, value, fetched_at)
+                return value, fetched_at
+            if entry is not None:
+                return entry
+            if time.time() >= deadline:
+                return load(), time.time()
+            time.sleep(self.poll_interval)
+            entry = self.get(key)
+            if entry is not None and entry[1] > time.time() - ttl:
+                return entry
+
+    # --- counters ---
+    def counter(self, name):
+        """(value, created_at) of a counter, creating it at zero."""
+        conn = self.connection()
+        row = conn.execute("SELECT value, created_at FROM counters WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO counters (name, value, created_at) VALUES (?, 0, ?)", (name, time.time()))
+            row = conn.execute("SELECT value, created_at FROM counters WHERE name = ?", (name,)).fetchone()
+        return row
+
+    def increment(self, name):
+        self.counter(name)
+        conn = self.connection()
+        with conn:
+            return conn.execute("UPDATE counters SET value = value + 1 WHERE name = ? RETURNING value", (name,)).fetchone()[0]
+
+    def increment_all(self, prefix):
+        """Bump every existing counter whose name starts with `prefix`, in one statement."""
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name >= ? AND name < ?", (prefix, prefix + "\uffff"))
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Typography, Button, Box, Snackbar, Alert, AppBar, Toolbar, Paper, Grid, Autocomplete, Chip, TextField } from '@mui/material';
 import PortfolioTable from './components/PortfolioTable';
 import Analytics from './components/Analytics';
@@ -25,22 +25,91 @@ function App() {
   const [fxRates, setFxRates] = useState({ INR: 1 });
   const [currencies, setCurrencies] = useState([]);
   const [search, setSearch] = useState('');
+  const [streaming, setStreaming] = useState(false);
+  const etagRef = useRef(null);
+  const loadedRef = useRef(false);
+  const portfolioRef = useRef(portfolio);
+
+  // First load streams positions as NDJSON so rows render as soon as each price resolves;
+  // arrivals are collected in a Map and rendered at most once per animation frame
+  const streamPortfolio = async () => {
+    setStreaming(true);
+    try {
+      const res = await fetch(`${API}/portfolio?stream=true`);
+      if (!res.ok) throw new Error(res.statusText);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      const rows = new Map();
+      let frame = null;
+      const render = () => {
+        frame = null;
+        setPortfolio(Array.from(rows.values()));
+      };
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(line => {
+          if (!line) return;
+          const { type, ...record } = JSON.parse(line);
+          if (type === 'position') rows.set(record.symbol, record);
+          else if (type === 'totals') setTotals(record);
+        });
+        if (frame === null) frame = requestAnimationFrame(render);
+      }
+      if (frame !== null) cancelAnimationFrame(frame);
+      render();
+      loadedRef.current = true;
+    } finally {
+      setStreaming(false);
+    }
+  };
+
+  // Later refreshes revalidate the snapshot: 304 keeps the rows, 200 brings a compressed body and a new ETag
+  const refreshPortfolio = async () => {
+    const headers = etagRef.current ? { 'If-None-Match': etagRef.current } : {};
+    const res = await fetch(`${API}/portfolio`, { headers, cache: 'no-store' });
+    if (res.status === 304) return;
+    if (!res.ok) throw new Error(res.statusText);
+    const data = await res.json();
+    etagRef.current = res.headers.get('ETag');
+    setPortfolio(data.portfolio);
+    setTotals({ total_value: data.total_value, total_cost: data.total_cost, total_profit_loss: data.total_profit_loss });
+  };
 
   const fetchPortfolio = async () => {
     try {
-      const res = await axios.get(`${API}/portfolio`);
-      setPortfolio(res.data.portfolio);
-      setTotals({
-        total_value: res.data.total_value,
-        total_cost: res.data.total_cost,
-        total_profit_loss: res.data.total_profit_loss,
-      });
+      if (loadedRef.current) await refreshPortfolio();
+      else await streamPortfolio();
     } catch (e) {
       setSnackbar({ open: true, message: 'Failed to fetch portfolio', severity: 'error' });
     }
   };
 
   useEffect(() => { fetchPortfolio(); }, []);
+  useEffect(() => { portfolioRef.current = portfolio; }, [portfolio]);
+
+  // Live price deltas pushed by the server whenever it re-prices the portfolio
+  useEffect(() => {
+    const source = new EventSource(`${API}/stream/prices`);
+    source.addEventListener('prices', (event) => {
+      const { positions, totals: newTotals } = JSON.parse(event.data);
+      // Decided outside the updater: updaters must stay pure (StrictMode may run them twice)
+      const held = new Set(portfolioRef.current.map(row => row.symbol));
+      if (positions.some(p => p.removed || !held.has(p.symbol))) {
+        fetchPortfolio();
+      } else {
+        const updates = {};
+        positions.forEach(p => { updates[p.symbol] = p; });
+        setPortfolio(prev => prev.map(row => (updates[row.symbol] ? { ...row, ...updates[row.symbol] } : row)));
+      }
+      if (newTotals) setTotals(newTotals);
+    });
+    return () => source.close();
+  }, []);
 
   useEffect(() => {
     async function fetchCurrencies() {
@@ -209,6 +278,7 @@ function App() {
           <Grid item xs={12} md={5}>
             <Analytics
               portfolio={portfolio}
+              streaming={streaming}
               totals={totals}
               baseCurrency={baseCurrency}
               setBaseCurrency={setBaseCurrency}
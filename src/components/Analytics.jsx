@@ -5,12 +5,24 @@ import EmojiEventsIcon from '@mui/icons-material/EmojiEvents';
 import TrendingUpIcon from '@mui/icons-material/TrendingUp';
 import TrendingDownIcon from '@mui/icons-material/TrendingDown';
 import PieChartIcon from '@mui/icons-material/PieChart';
+import axios from 'axios';
 
-function Analytics({ portfolio, totals, baseCurrency, setBaseCurrency, fxRates, currencies }) {
+const API = 'http://localhost:8000';
+
+function Analytics({ portfolio, streaming, totals, baseCurrency, setBaseCurrency, fxRates, currencies }) {
   const pieRef = useRef();
   const barRef = useRef();
   const sectorPieRef = useRef();
   const [converted, setConverted] = useState([]);
+  const [sectorGroups, setSectorGroups] = useState([]);
+
+  // Sector allocation is aggregated server-side in the base currency; wait for a streamed load to finish
+  useEffect(() => {
+    if (!portfolio.length || streaming) return;
+    axios.get(`${API}/portfolio/summary`, { params: { group_by: 'sector', base_currency: baseCurrency } })
+      .then(res => setSectorGroups(res.data.groups))
+      .catch(() => setSectorGroups([]));
+  }, [portfolio, baseCurrency, streaming]);
 
   // Convert all asset values to base currency using provided fxRates
   useEffect(() => {
@@ -66,15 +78,8 @@ function Analytics({ portfolio, totals, baseCurrency, setBaseCurrency, fxRates,
         scales: { y: { beginAtZero: true } }
       }
     });
-    // Compute sector allocation
-    const sectorMap = {};
-    converted.forEach(a => {
-      const sector = a.sector || 'Other';
-      if (!sectorMap[sector]) sectorMap[sector] = 0;
-      sectorMap[sector] += a.value_converted;
-    });
-    const sectorLabels = Object.keys(sectorMap);
-    const sectorValues = Object.values(sectorMap);
+    const sectorLabels = sectorGroups.map(g => g.key);
+    const sectorValues = sectorGroups.map(g => g.value);
     // Sector allocation pie
     if (sectorPieRef.current) {
       if (window.sectorPieChart) window.sectorPieChart.destroy();
@@ -90,7 +95,7 @@ function Analytics({ portfolio, totals, baseCurrency, setBaseCurrency, fxRates,
         options: { responsive: true, maintainAspectRatio: false, plugins: { legend: { position: 'bottom' } } }
       });
     }
-  }, [converted, baseCurrency]);
+  }, [converted, sectorGroups, baseCurrency]);
 
   if (!converted.length) return <Paper sx={{ mt: 4, p: 2 }}>No assets in portfolio.</Paper>;
   let best = converted[0], worst = converted[0];
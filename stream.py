@@ -0,0 +1,109 @@
+"""Fan-out of price updates to Server-Sent Events subscribers.
+
+Each update is encoded once per symbol and then shared by every subscriber.
+Subscribers never queue more than one pending entry per symbol: a slow client
+just receives the latest value when it catches up, so memory per client is
+bounded by the number of symbols it follows and publishers never block.
+"""
+import asyncio
+import json
+import threading
+import uuid
+
+
+class Subscriber:
+    def __init__(self, client_id, symbols, loop, portfolio_id=None):
+        self.client_id = client_id
+        self.portfolio_id = portfolio_id
+        self.symbols = set(symbols) if symbols else None  # None follows every symbol
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.pending = {}       # symbol -> encoded position delta
+        self.totals = None      # latest encoded portfolio totals
+        self.dropped = 0        # deltas overwritten before the client read them
+
+    def wants(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+
+class PriceHub:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def portfolios(self):
+        """Portfolio ids with at least one subscriber."""
+        with self._lock:
+            return {sub.portfolio_id for sub in self._subscribers.values()}
+
+    def subscribe(self, symbols=None, portfolio_id=None):
+        # Random ids: unguessable, and never equal to a client of another worker process
+        sub = Subscriber(uuid.uuid4().hex, symbols, asyncio.get_running_loop(), portfolio_id)
+        with self._lock:
+            self._subscribers[sub.client_id] = sub
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.pop(sub.client_id, None)
+
+    def set_symbols(self, client_id, symbols):
+        with self._lock:
+            sub = self._subscribers.get(client_id)
+            if sub is None:
+                return False
+            sub.symbols = set(symbols) if symbols else None
+            return True
+
+    def prime(self, sub, positions, totals):
+        """Seed a new subscriber with the current state before live updates."""
+        encoded_totals = json.dumps(totals)
+        with self._lock:
+            for p in positions:
+                if sub.wants(p['symbol']):
+                    sub.pending[p['symbol']] = json.dumps(p)
+            sub.totals = encoded_totals
+            sub.event.set()
+
+    def publish(self, positions, totals, portfolio_id=None):
+        """Queue `positions` (dicts with a 'symbol' key) and `totals` for every subscriber of `portfolio_id`.
+
+        Safe to call from any thread.
+        """
+        encoded = [(p['symbol'], json.dumps(p)) for p in positions]
+        encoded_totals = json.dumps(totals)
+        closed = []
+        with self._lock:
+            for sub in self._subscribers.values():
+                if sub.portfolio_id != portfolio_id:
+                    continue
+                touched = False
+                for symbol, payload in encoded:
+                    if sub.wants(symbol):
+                        if symbol in sub.pending:
+                            sub.dropped += 1
+                        sub.pending[symbol] = payload
+                        touched = True
+                if touched or sub.totals != encoded_totals:
+                    sub.totals = encoded_totals
+                    try:
+                        sub.loop.call_soon_threadsafe(sub.event.set)
+                    except RuntimeError:
+                        # Event loop already closed; the stream is gone
+                        closed.append(sub.client_id)
+            for client_id in closed:
+                self._subscribers.pop(client_id, None)
+
+    def drain(self, sub):
+        """Take everything pending for `sub` as one SSE `prices` event."""
+        with self._lock:
+            pending, sub.pending = sub.pending, {}
+            totals, sub.totals = sub.totals, None
+            sub.event.clear()
+        if not pending and totals is None:
+            return None
+        body = '{"positions":[' + ','.join(pending.values()) + '],"totals":' + (totals or 'null') + '}'
+        return f"event: prices\ndata: {body}\n\n"
@@ -0,0 +1,94 @@
+"""Vectorized holding valuation.
+
+`round_half_up` rounds whole NumPy arrays exactly like `round_decimal` does one
+float at a time: ROUND_HALF_UP applied to the exact binary value of each float.
+Each value is scaled by 10**places with an error-free product (Dekker), so the
+scaled value is known exactly as product + error and the round-up decision is
+made on the exact fraction. Dividing the rounded integer by an exact power of
+ten is correctly rounded, just like converting the quantized Decimal back to
+float. Magnitudes beyond 2**53 (where integers stop being exact) and places
+beyond 10**22 fall back to Decimal.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Exact for every exponent we use (10**22 is the largest power of ten a double holds exactly)
+POWERS_OF_TEN = np.array([float(10 ** i) for i in range(23)])
+EXACT_LIMIT = 2.0 ** 53
+_SPLITTER = 2.0 ** 27 + 1  # Veltkamp split into two 26-bit halves
+
+
+def _split(a):
+    t = _SPLITTER * a
+    high = t - (t - a)
+    return high, a - high
+
+
+def _two_product(a, b):
+    """a * b as (rounded product, rounding error); their sum is exact."""
+    product = a * b
+    a_high, a_low = _split(a)
+    b_high, b_low = _split(b)
+    error = ((a_high * b_high - product) + a_high * b_low + a_low * b_high) + a_low * b_low
+    return product, error
+
+
+def _round_exact(value, places):
+    return float(Decimal(float(value)).quantize(Decimal(1).scaleb(-int(places)), rounding=ROUND_HALF_UP))
+
+
+def round_half_up(values, places):
+    values = np.asarray(values, dtype=np.float64)
+    places = np.broadcast_to(np.asarray(places, dtype=np.int64), values.shape)
+    # Places outside the table (possible on stored rows) are rounded with Decimal below
+    out_of_range = (places < 0) | (places >= len(POWERS_OF_TEN))
+    scale = POWERS_OF_TEN[np.clip(places, 0, len(POWERS_OF_TEN) - 1)]
+    product, error = _two_product(values, scale)
+    magnitude = np.abs(product)
+    whole = np.floor(magnitude)
+    # Exact fraction is (magnitude - whole) + error, with the error taken towards the magnitude;
+    # the sum's sign is exact, and an exact tie (zero) rounds away from zero like ROUND_HALF_UP
+    error = np.where(product < 0, -error, error)
+    up = ((magnitude - whole) - 0.5) + error >= 0
+    result = np.copysign(whole + up, values) / scale
+    inexact = np.flatnonzero(~(magnitude < EXACT_LIMIT) | out_of_range)
+    if inexact.size:
+        result = result.reshape(-1)
+        for i in inexact:
+            result[i] = _round_exact(values.flat[i], places.flat[i])
+        result = result.reshape(values.shape)
+    return result
+
+
+def value_holdings(quantity, buy_price, price, precision):
+    """Rounded per-holding figures as arrays. `price` is NaN where no quote was found,
+    in which case the holding is valued at its buy price."""
+    quantity = np.asarray(quantity, dtype=np.float64)
+    buy_price = np.asarray(buy_price, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+    precision = np.asarray(precision, dtype=np.int64)
+    price = np.where(np.isnan(price), buy_price, price)
+    value = round_half_up(price * quantity, precision)
+    cost = round_half_up(buy_price * quantity, precision)
+    return {
+        'quantity': round_half_up(quantity, precision),
+        'buy_price': round_half_up(buy_price, 4),
+        'current_price': round_half_up(price, 4),
+        'priced': price != 0,
+        'current_value': value,
+        'cost': cost,
+        'profit_loss': round_half_up(value - cost, 2),
+    }
+
+
+def _sequential_sum(values):
+    # Left-to-right like sum(); np.sum adds pairwise and can differ in the last bit
+    return np.cumsum(np.concatenate(([0.0], np.asarray(values, dtype=np.float64))))[-1]
+
+
+def totals(values, costs):
+    total_value = _sequential_sum(values)
+    total_cost = _sequential_sum(costs)
+    rounded = round_half_up([total_value, total_cost, total_value - total_cost], 2).tolist()
+    return {'total_value': rounded[0], 'total_cost': rounded[1], 'total_profit_loss': rounded[2]}